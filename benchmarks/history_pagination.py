@@ -0,0 +1,107 @@
+"""Benchmark history paging on a large images table.
+
+Seeds a throwaway database (1M rows by default) and compares keyset paging
+(Database.get_images_page) with LIMIT/OFFSET at increasing depths.
+
+    python -m benchmarks.history_pagination [--rows 1000000] [--db path]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.db import Database
+
+PROVIDERS = ["openai", "stability", "gemini"]
+WORDS = ["cat", "dog", "castle", "forest", "neon", "city", "portrait", "sunset", "robot", "ocean",
+         "mountain", "watercolor", "cyberpunk", "dragon", "flower", "space", "vintage", "studio"]
+
+
+def seed(db: Database, rows: int, batch: int = 50000):
+    """Insert `rows` synthetic images spread over the last year."""
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / rows
+    rng = random.Random(42)
+
+    for offset in range(0, rows, batch):
+        with db._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO images (prompt, filename, filepath, provider, created_at, width, height) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        " ".join(rng.choices(WORDS, k=6)),
+                        f"img_{i}.png",
+                        f"/images/img_{i}.png",
+                        rng.choice(PROVIDERS),
+                        (start + step * i).strftime("%Y-%m-%d %H:%M:%S"),
+                        1024,
+                        1024,
+                    )
+                    for i in range(offset, min(rows, offset + batch))
+                )
+            )
+
+
+def timed(func, repeat: int = 5) -> float:
+    """Best wall time of `func` in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--db", help="database path (default: a temporary file)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "history_bench.db")
+    db = Database(db_path)
+    existing = db._connection().execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    if existing < args.rows:
+        print(f"Seeding {args.rows - existing} rows into {db_path}...")
+        start = time.perf_counter()
+        seed(db, args.rows - existing)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+    conn = db._connection()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM images WHERE (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?", ("9999", 0, args.page_size)
+    ).fetchall()
+    print("Keyset plan:", "; ".join(row[-1] for row in plan))
+
+    print(f"\n{'depth (rows)':>14} {'keyset ms':>10} {'offset ms':>10}")
+    depths = {0, 1_000, 10_000, 100_000, args.rows // 2, args.rows - args.page_size}
+    for depth in sorted(depth for depth in depths if 0 <= depth < args.rows):
+        # Walk to the cursor for this depth once, then time fetching the page after it
+        cursor = None
+        if depth:
+            row = conn.execute(
+                "SELECT created_at, id FROM images ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+                (depth - 1,)
+            ).fetchone()
+            cursor = (row[0], row[1])
+
+        keyset_ms = timed(lambda: db.get_images_page(args.page_size, cursor))
+        offset_ms = timed(lambda: conn.execute(
+            "SELECT * FROM images ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (args.page_size, depth)
+        ).fetchall(), repeat=2)
+        print(f"{depth:>14} {keyset_ms:>10.3f} {offset_ms:>10.3f}")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
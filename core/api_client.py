@@ -1,68 +1,359 @@
-import os
 import time
 import logging
-import base64
 import io
-from typing import Optional, Tuple, Dict, Any, Union
-from pathlib import Path
+import threading
+from typing import Optional, Tuple, Dict, Any, Union, List, BinaryIO
 
 import requests
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 
 from core.settings import AI_API_KEY, API_PROVIDER, DEFAULT_IMAGE_SIZE, APP_CONFIG
+from core.http_pool import get_session
+from core.generation_cache import GenerationCache, get_generation_cache
+from core.streaming import Base64StreamDecoder, STREAM_CHUNK_SIZE
+from core.metrics import get_metrics, TTFB, DOWNLOAD, DECODE, CACHE_WRITE, OPEN, TOTAL
+from core.retry import (RetryPolicy, ProviderError, CircuitBreaker, CircuitOpenError, classify_error,
+                        get_circuit_breaker, parse_retry_after)
 
 logger = logging.getLogger(__name__)
 
+# Provider endpoints, overridable per client (e.g. to point at a local stub server)
+PROVIDER_ENDPOINTS = {
+    "openai": "https://api.openai.com/v1/images/generations",
+    "stability": "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image",
+    "gemini": "https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent",
+}
+
+# How many samples a single request can return (n / samples)
+MAX_SAMPLES_PER_REQUEST = {
+    "openai": 10,
+    "stability": 10,
+    "gemini": 1,
+}
+
+# Sizes each provider accepts
+PROVIDER_SIZES = {
+    "openai": [
+        "256x256", "512x512", "1024x1024",
+        "1024x1792", "1792x1024"
+    ],
+    # Only the dimensions supported by the SDXL model
+    "stability": [
+        "1024x1024", "1152x896", "896x1152",
+        "1216x832", "832x1216", "1344x768", "768x1344",
+        "1536x640", "640x1536"
+    ],
+    "gemini": ["1024x1024", "1024x1792", "1792x1024"],
+}
+
+# JSON field holding the base64 image in each provider's response
+STREAM_FIELDS = {
+    "openai": "b64_json",
+    "stability": "base64",
+    "gemini": "data",
+}
+
+# What must come right before the field: Gemini's "data" only counts inside an
+# inlineData part, and not when that part says its mimeType isn't an image
+STREAM_FIELD_PREFIXES = {
+    "gemini": rb'"inlineData"\s*:\s*\{\s*(?:"mimeType"\s*:\s*"image/[^"]*"\s*,\s*)?',
+}
+
+PROVIDER_NAMES = {
+    "openai": "OpenAI",
+    "stability": "Stability",
+    "gemini": "Gemini",
+}
+
 class APIClient:
     """Client for interacting with AI image generation APIs."""
     
-    def __init__(self, api_key: str = None, provider: str = None):
+    def __init__(self, api_key: str = None, provider: str = None, endpoints: Dict[str, str] = None,
+                 cache: GenerationCache = None, retry_policy: RetryPolicy = None):
         # Try to get values from config first, then from parameters, then from globals
         self.api_key = api_key or APP_CONFIG.get("api_key", AI_API_KEY)
         self.provider = (provider or APP_CONFIG.get("api_provider", API_PROVIDER)).lower()
-        self.max_retries = 3
-        self.retry_delay = 2  # seconds
+        self.endpoints = {**PROVIDER_ENDPOINTS, **APP_CONFIG.get("api_endpoints", {}), **(endpoints or {})}
+        self.retry_policy = retry_policy or RetryPolicy.from_config()
+        
+        # Cache identical requests on disk unless disabled in config
+        self.cache = cache
+        if self.cache is None and APP_CONFIG.get("generation_cache", True):
+            self.cache = get_generation_cache()
         
         if not self.api_key:
             logger.warning("No API key provided. Set API key in Settings.")
     
-    def generate_image(self, 
-                      prompt: str, 
+    def generate_image(self,
+                      prompt: str,
                       size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
-                      negative_prompt: str = None) -> Optional[Image.Image]:
-        """Generate an image based on text prompt using the selected provider."""
+                      negative_prompt: str = None,
+                      bypass_cache: bool = False) -> Optional[Image.Image]:
+        """Generate an image based on text prompt using the selected provider.
+        
+        Set bypass_cache to always request a fresh sample from the provider.
+        """
+        images = self.generate_images(prompt, size, negative_prompt, count=1, bypass_cache=bypass_cache)
+        return images[0] if images else None
+    
+    def generate_images(self,
+                        prompt: str,
+                        size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
+                        negative_prompt: str = None,
+                        count: int = 1,
+                        bypass_cache: bool = False,
+                        cancel_event: threading.Event = None) -> List[Image.Image]:
+        """Generate several samples for one prompt.
+        
+        Samples are requested in as few calls as the provider allows (n / samples),
+        so four variants cost one round-trip instead of four. Setting cancel_event
+        aborts any pending retry wait.
+        """
         if not self.api_key:
             logger.error("API key is required")
+            return []
+        
+        images = []
+        for offset, chunk in self._sample_chunks(count):
+            result = self._generate_with_retries(prompt, size, negative_prompt, chunk, offset, bypass_cache, cancel_event)
+            if result is None:
+                break
+            images.extend(result)
+        
+        return images
+    
+    def _sample_chunks(self, count: int) -> List[Tuple[int, int]]:
+        """Split a sample count into (offset, size) chunks the provider accepts per call."""
+        per_request = MAX_SAMPLES_PER_REQUEST.get(self.provider, 1)
+        return [(offset, min(per_request, count - offset)) for offset in range(0, count, per_request)]
+    
+    def _generate_with_retries(self,
+                               prompt: str,
+                               size: Tuple[int, int],
+                               negative_prompt: str,
+                               count: int,
+                               offset: int,
+                               bypass_cache: bool,
+                               cancel_event: threading.Event = None) -> Optional[List[Image.Image]]:
+        """Run one provider call under the retry policy (the circuit breaker guards its HTTP requests)."""
+        if self.provider not in PROVIDER_NAMES:
+            logger.error(f"Unsupported API provider: {self.provider}")
             return None
         
-        retry_count = 0
-        while retry_count < self.max_retries:
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                if self.provider == "openai":
-                    return self._call_openai(prompt, size)
-                elif self.provider == "stability":
-                    return self._call_stability(prompt, size, negative_prompt)
-                elif self.provider == "gemini":
-                    return self._call_gemini(prompt, size)
-                else:
-                    logger.error(f"Unsupported API provider: {self.provider}")
-                    return None
+                result = self._call_provider(prompt, size, negative_prompt, bypass_cache, count, offset)
+            except CircuitOpenError:
+                self._circuit_open()
+                return None
             except Exception as e:
-                retry_count += 1
-                wait_time = self.retry_delay * (2 ** (retry_count - 1))  # Exponential backoff
-                
-                logger.warning(f"API call failed ({retry_count}/{self.max_retries}): {str(e)}")
-                logger.info(f"Retrying in {wait_time} seconds...")
+                wait_time = self._retry_delay(attempt, e)
+                if wait_time is None:
+                    return None
+                if not self.retry_policy.sleep(wait_time, cancel_event):
+                    logger.info("Generation cancelled")
+                    return None
+                continue
+            
+            self._record_result(start, result)
+            return result
+    
+    def _call_provider(self,
+                       prompt: str,
+                       size: Tuple[int, int],
+                       negative_prompt: str,
+                       bypass_cache: bool,
+                       count: int,
+                       offset: int) -> List[Image.Image]:
+        """Dispatch to the selected provider."""
+        if self.provider == "openai":
+            return self._call_openai(prompt, size, bypass_cache, count, offset)
+        elif self.provider == "stability":
+            return self._call_stability(prompt, size, negative_prompt, bypass_cache, count, offset)
+        else:
+            return self._call_gemini(prompt, size, bypass_cache, count, offset)
+    
+    def _circuit_open(self):
+        logger.error(f"{PROVIDER_NAMES[self.provider]} is unavailable (circuit open), failing fast")
+        get_metrics().increment("errors", self.provider, "circuit_open")
+    
+    @staticmethod
+    def _allow_request(provider: str) -> CircuitBreaker:
+        """The provider's circuit breaker, once it lets a request through.
+        
+        Only real HTTP requests go through the breaker: cache hits neither
+        wait for an open circuit nor count as a half-open trial.
+        """
+        breaker = get_circuit_breaker(provider)
+        if not breaker.allow():
+            raise CircuitOpenError(f"{PROVIDER_NAMES[provider]} circuit is open", provider=provider)
+        return breaker
+    
+    def _record_result(self, start: float, images: List[Image.Image]):
+        """Record the total time of a successful call and the images it returned."""
+        metrics = get_metrics()
+        metrics.observe(self.provider, TOTAL, time.perf_counter() - start)
+        metrics.increment("images", self.provider, amount=len(images))
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> Optional[float]:
+        """Log a failed attempt; return how long to wait before retrying, or None to give up."""
+        get_metrics().increment("errors", self.provider, classify_error(error))
+        if not self.retry_policy.should_retry(attempt, error):
+            logger.error(f"API call failed ({classify_error(error)} error, attempt {attempt}), not retrying: {str(error)}")
+            return None
+        
+        wait_time = self.retry_policy.delay(attempt, error)
+        get_metrics().increment("retries", self.provider)
+        
+        logger.warning(f"API call failed ({attempt}/{self.retry_policy.max_attempts}): {str(error)}")
+        logger.info(f"Retrying in {wait_time:.1f} seconds...")
+        
+        return wait_time
+    
+    def _post(self, provider: str, **kwargs) -> requests.Response:
+        """POST to a provider endpoint over its shared keep-alive session."""
+        kwargs.setdefault("timeout", 60)
+        return get_session(provider).post(self.endpoints[provider], **kwargs)
+    
+    def _cache_keys(self, provider: str, request: Dict[str, Any], count: int, offset: int) -> Optional[List[str]]:
+        """Cache keys for each sample of a request, or None when caching is off."""
+        if self.cache is None:
+            return None
+        key = self.cache.make_key(provider, self.endpoints[provider], request["json"])
+        # Repeated identical calls (providers without n>1) get a key per sample index
+        return [key if offset + i == 0 else f"{key}-{offset + i}" for i in range(count)]
+    
+    def _cached_samples(self, cache_keys: Optional[List[str]], bypass_cache: bool) -> Optional[List[bytes]]:
+        """Return every sample from the cache, or None unless all of them are cached."""
+        if not cache_keys or bypass_cache:
+            return None
+        
+        samples = []
+        for key in cache_keys:
+            image_data = self.cache.get(key)
+            if image_data is None:
+                return None
+            samples.append(image_data)
+        return samples
+    
+    def _request_images(self,
+                        provider: str,
+                        request: Dict[str, Any],
+                        bypass_cache: bool = False,
+                        count: int = 1,
+                        offset: int = 0) -> List[Image.Image]:
+        """Send a request (or serve it from the cache) and return the images.
+        
+        The response body is streamed and its base64 decoded incrementally,
+        so the full JSON text is never held in memory.
+        """
+        cache_keys = self._cache_keys(provider, request, count, offset)
+        cached = self._cached_samples(cache_keys, bypass_cache)
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} {PROVIDER_NAMES[provider]} image(s) from cache")
+            get_metrics().increment("cache_hits", provider)
+            return [self._open_image(io.BytesIO(image_data)) for image_data in cached]
+        
+        breaker = self._allow_request(provider)
+        get_metrics().increment("requests", provider)
+        start = time.perf_counter()
+        try:
+            response = self._post(provider, stream=True, **request)
+            try:
+                get_metrics().observe(provider, TTFB, time.perf_counter() - start)
+                if response.status_code != 200:
+                    self._check_response(provider, response)
                 
-                time.sleep(wait_time)
+                body_start = time.perf_counter()
+                decoder = self._stream_decoder(provider)
+                for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                    decoder.feed(chunk)
+                buffers = decoder.finish()
+                self._record_body(provider, body_start, decoder)
+            finally:
+                response.close()
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_success()
+        
+        return self._open_samples(provider, buffers, cache_keys)
+    
+    @staticmethod
+    def _stream_decoder(provider: str) -> Base64StreamDecoder:
+        """Decoder for the base64 image values in a provider's response."""
+        return Base64StreamDecoder(STREAM_FIELDS[provider], prefix=STREAM_FIELD_PREFIXES.get(provider, b""))
+    
+    @staticmethod
+    def _record_body(provider: str, start: float, decoder: Base64StreamDecoder):
+        """Split the time spent reading a body into download and decode."""
+        metrics = get_metrics()
+        metrics.observe(provider, DOWNLOAD, time.perf_counter() - start - decoder.decode_seconds)
+        metrics.observe(provider, DECODE, decoder.decode_seconds)
+    
+    def _open_samples(self,
+                      provider: str,
+                      buffers: List[BinaryIO],
+                      cache_keys: Optional[List[str]]) -> List[Image.Image]:
+        """Open decoded samples lazily, then store them in the cache.
+        
+        Opening reads each header first, so bytes that aren't an image (e.g.
+        a part whose mimeType comes after its data) fail here, before they
+        can be cached or saved.
+        """
+        metrics = get_metrics()
+        with metrics.timer(provider, OPEN):
+            try:
+                images = [self._open_image(buffer) for buffer in buffers]
+            except UnidentifiedImageError as e:
+                raise Exception(f"{PROVIDER_NAMES[provider]} response data is not an image: {str(e)}")
+        
+        if cache_keys:
+            with metrics.timer(provider, CACHE_WRITE):
+                for key, buffer in zip(cache_keys, buffers):
+                    self.cache.put_file(key, buffer)
+        return images
+    
+    @staticmethod
+    def _open_image(source: BinaryIO) -> Image.Image:
+        """Open an encoded image with PIL; pixels are only decoded when first used.
         
-        logger.error(f"Failed to generate image after {self.max_retries} attempts")
-        return None
+        The encoded bytes stay reachable as image.encoded_source so
+        BlobStore.put_image can store them unchanged.
+        """
+        image = Image.open(source)
+        image.encoded_source = source
+        return image
+    
+    @staticmethod
+    def _check_response(provider: str, response):
+        """Raise a ProviderError if the provider returned an error status."""
+        if response.status_code != 200:
+            logger.error(f"{PROVIDER_NAMES[provider]} API error: {response.status_code} - {response.text}")
+            raise ProviderError(
+                f"API request failed with status {response.status_code}",
+                provider=provider,
+                status_code=response.status_code,
+                retry_after=parse_retry_after(response.headers.get("Retry-After"))
+            )
     
-    def _call_openai(self, prompt: str, size: Tuple[int, int]) -> Optional[Image.Image]:
+    def _call_openai(self,
+                     prompt: str,
+                     size: Tuple[int, int],
+                     bypass_cache: bool = False,
+                     count: int = 1,
+                     offset: int = 0) -> List[Image.Image]:
         """Call OpenAI's DALL-E API."""
         logger.info(f"Calling OpenAI DALL-E with prompt: {prompt[:50]}...")
         
+        request = self._openai_request(prompt, size, count)
+        return self._request_images("openai", request, bypass_cache, count, offset)
+    
+    def _openai_request(self, prompt: str, size: Tuple[int, int], count: int = 1) -> Dict[str, Any]:
+        """Build the headers and payload for an OpenAI request."""
         # Convert size to OpenAI format (e.g. 512x512)
         size_str = f"{size[0]}x{size[1]}"
         
@@ -74,33 +365,31 @@ class APIClient:
         payload = {
             "prompt": prompt,
             "size": size_str,
-            "n": 1,
+            "n": count,
             "response_format": "b64_json"
         }
         
-        response = requests.post(
-            "https://api.openai.com/v1/images/generations",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-            raise Exception(f"API request failed with status {response.status_code}")
-        
-        response_data = response.json()
-        image_data = base64.b64decode(response_data["data"][0]["b64_json"])
-        
-        return Image.open(io.BytesIO(image_data))
+        return {"headers": headers, "json": payload}
     
-    def _call_stability(self, 
-                        prompt: str, 
+    def _call_stability(self,
+                        prompt: str,
                         size: Tuple[int, int],
-                        negative_prompt: str = None) -> Optional[Image.Image]:
+                        negative_prompt: str = None,
+                        bypass_cache: bool = False,
+                        count: int = 1,
+                        offset: int = 0) -> List[Image.Image]:
         """Call Stability AI API."""
         logger.info(f"Calling Stability AI with prompt: {prompt[:50]}...")
         
+        request = self._stability_request(prompt, size, negative_prompt, count)
+        return self._request_images("stability", request, bypass_cache, count, offset)
+    
+    def _stability_request(self,
+                           prompt: str,
+                           size: Tuple[int, int],
+                           negative_prompt: str = None,
+                           count: int = 1) -> Dict[str, Any]:
+        """Build the headers and payload for a Stability AI request."""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -116,7 +405,7 @@ class APIClient:
             ],
             "height": size[1],
             "width": size[0],
-            "samples": 1,
+            "samples": count,
             "cfg_scale": 7.0,
             "steps": 30,
             "style_preset": "photographic"
@@ -129,26 +418,22 @@ class APIClient:
                 "weight": -1.0
             })
         
-        response = requests.post(
-            "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image",
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Stability API error: {response.status_code} - {response.text}")
-            raise Exception(f"API request failed with status {response.status_code}")
-        
-        response_data = response.json()
-        image_data = base64.b64decode(response_data["artifacts"][0]["base64"])
-        
-        return Image.open(io.BytesIO(image_data))
-        
-    def _call_gemini(self, prompt: str, size: Tuple[int, int]) -> Optional[Image.Image]:
-        """Call Google's Gemini API for image generation."""
+        return {"headers": headers, "json": payload}
+    
+    def _call_gemini(self,
+                     prompt: str,
+                     size: Tuple[int, int],
+                     bypass_cache: bool = False,
+                     count: int = 1,
+                     offset: int = 0) -> List[Image.Image]:
+        """Call Google's Gemini API for image generation (one image per call)."""
         logger.info(f"Calling Gemini API with prompt: {prompt[:50]}...")
         
+        request = self._gemini_request(prompt, size)
+        return self._request_images("gemini", request, bypass_cache, count, offset)
+    
+    def _gemini_request(self, prompt: str, size: Tuple[int, int]) -> Dict[str, Any]:
+        """Build the headers, payload and query string for a Gemini request."""
         # Convert size to match Gemini requirements
         # We'll choose the closest supported size
         supported_sizes = {
@@ -164,13 +449,10 @@ class APIClient:
             size_key = "1024x1792"
         else:  # Landscape
             size_key = "1792x1024"
-            
+        
         actual_size = supported_sizes[size_key]
         logger.info(f"Using Gemini size: {size_key} (requested: {size[0]}x{size[1]})")
         
-        # Build the API URL with key - Using gemini-1.5-flash model
-        api_url = f"https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent?key={self.api_key}"
-        
         headers = {
             "Content-Type": "application/json"
         }
@@ -193,49 +475,5 @@ class APIClient:
             }
         }
         
-        response = requests.post(
-            api_url,
-            headers=headers,
-            json=payload,
-            timeout=60
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Gemini API error: {response.status_code} - {response.text}")
-            raise Exception(f"API request failed with status {response.status_code}")
-        
-        response_data = response.json()
-        
-        # Extract image data from the response
-        try:
-            # Gemini might return the image in various formats
-            for candidate in response_data.get("candidates", []):
-                for part in candidate.get("content", {}).get("parts", []):
-                    if "inlineData" in part:
-                        mime_type = part["inlineData"]["mimeType"]
-                        if mime_type.startswith("image/"):
-                            image_data = base64.b64decode(part["inlineData"]["data"])
-                            return Image.open(io.BytesIO(image_data))
-        except Exception as e:
-            logger.error(f"Error parsing Gemini response: {str(e)}")
-            raise Exception(f"Failed to extract image from Gemini response: {str(e)}")
-        
-        raise Exception("No image found in Gemini response")
-
-    @staticmethod
-    def save_image(image: Image.Image, save_dir: Path, prompt: str) -> str:
-        """Save the generated image to disk."""
-        if not save_dir.exists():
-            save_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Create a filename based on the first few words of the prompt
-        clean_prompt = "".join(c if c.isalnum() else "_" for c in prompt[:30])
-        timestamp = int(time.time())
-        filename = f"{clean_prompt}_{timestamp}.png"
-        file_path = save_dir / filename
-        
-        # Save the image
-        image.save(file_path, format="PNG")
-        logger.info(f"Image saved to {file_path}")
-        
-        return str(file_path) 
\ No newline at end of file
+        # API key goes in the query string - using gemini-1.5-flash model
+        return {"headers": headers, "json": payload, "params": {"key": self.api_key}}
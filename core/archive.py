@@ -0,0 +1,353 @@
+import io
+import re
+import json
+import time
+import uuid
+import logging
+import tarfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from core.settings import APP_CONFIG
+from core.db import Database, get_database, CHANGE_INSERT
+from core.blob_store import BlobStore, get_blob_store, hash_file, hash_stream
+from core.migrations import SCHEMA_VERSION
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = "ai-image-history"
+ARCHIVE_VERSION = 1
+
+# Archive layout, in stream order:
+#   archive.json                 header with the archive id
+#   manifest/000000.jsonl        up to MANIFEST_CHUNK_SIZE rows
+#   blobs/ab/<sha256>.png        the images first referenced by that chunk
+#   manifest/000001.jsonl ...
+HEADER_NAME = "archive.json"
+MANIFEST_DIR = "manifest"
+BLOBS_DIR = "blobs"
+
+# Rows per manifest chunk; the importer commits (and can resume) chunk by chunk
+MANIFEST_CHUNK_SIZE = 500
+
+# Threads reading/hashing files on export and writing them on import; "archive_workers" in config.json
+DEFAULT_ARCHIVE_WORKERS = 4
+
+# Names of archived files, and the hashes in the manifest, must look like this
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# History columns carried over; filepath, file_present and thumbnail_ref are local to a machine
+EXPORT_COLUMNS = ("prompt", "filename", "provider", "created_at", "width", "height", "extra_data",
+                  "content_hash", "file_size", "latency_ms", "seed", "phash")
+
+
+class ArchiveReport(NamedTuple):
+    rows: int
+    files: int
+    bytes: int
+    skipped: int
+    seconds: float
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+
+class _Counters:
+    """Running totals for an export or import, reported after every chunk."""
+
+    def __init__(self, on_progress: Optional[Callable[[ArchiveReport], None]]):
+        self.on_progress = on_progress
+        self.start = time.perf_counter()
+        self.rows = self.files = self.bytes = self.skipped = 0
+
+    def snapshot(self) -> ArchiveReport:
+        return ArchiveReport(self.rows, self.files, self.bytes, self.skipped, time.perf_counter() - self.start)
+
+    def report(self):
+        if self.on_progress:
+            try:
+                self.on_progress(self.snapshot())
+            except Exception as e:
+                logger.error(f"Error in archive progress callback: {e}")
+
+
+def get_archive_workers() -> int:
+    return max(1, int(APP_CONFIG.get("archive_workers", DEFAULT_ARCHIVE_WORKERS)))
+
+
+def _blob_member(content_hash: str) -> str:
+    return f"{BLOBS_DIR}/{content_hash[:2]}/{content_hash}.png"
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _prefetch(pool: ThreadPoolExecutor, func: Callable, items: Iterable, window: int) -> Iterator:
+    """func(item) for each item, in order, with up to `window` calls running ahead on the pool."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _iter_row_chunks(db: Database, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Every history row in id order, chunk_size rows at a time."""
+    conn = db._connection()
+    last_id = 0
+    while True:
+        rows = conn.execute(f'''
+        SELECT id, filepath, {", ".join(EXPORT_COLUMNS)} FROM images
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+        ''', (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        last_id = rows[-1]["id"]
+
+
+def _export_entry(row: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Manifest entry and source file for a row, or None when its file can't be read."""
+    if not row["content_hash"]:
+        # Not reached by the backfill yet (or unreadable then)
+        try:
+            row["content_hash"], row["file_size"] = hash_file(row["filepath"])
+        except OSError:
+            return None
+    return {column: row[column] for column in EXPORT_COLUMNS}, row["filepath"]
+
+
+def _read_blob(item: Tuple[str, str]) -> Optional[bytes]:
+    """Contents of a file if it still has the expected hash."""
+    content_hash, filepath = item
+    try:
+        with open(filepath, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        logger.warning(f"Cannot read {filepath} for export: {e}")
+        return None
+    if hash_stream(io.BytesIO(data))[0] != content_hash:
+        logger.warning(f"{filepath} changed since it was recorded, leaving it out of the export")
+        return None
+    return data
+
+
+def export_history(dest_path, db: Database = None, workers: int = None,
+                   on_progress: Callable[[ArchiveReport], None] = None,
+                   stop_event: threading.Event = None) -> ArchiveReport:
+    """Write the whole history and its images to a tar archive at dest_path.
+
+    Rows are streamed from the database chunk by chunk and files are read a
+    few at a time on a worker pool, so memory use doesn't depend on the size
+    of the library. Identical images are stored once. Setting stop_event
+    ends the export early, leaving a shorter but valid archive.
+    """
+    db = db or get_database()
+    workers = workers or get_archive_workers()
+    counters = _Counters(on_progress)
+    written = set()
+
+    with open(dest_path, "wb") as f, \
+            tarfile.open(fileobj=f, mode="w|", format=tarfile.PAX_FORMAT) as tar, \
+            ThreadPoolExecutor(workers, thread_name_prefix="archive-export") as pool:
+        header = {
+            "format": ARCHIVE_FORMAT,
+            "version": ARCHIVE_VERSION,
+            "archive_id": uuid.uuid4().hex,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "schema_version": SCHEMA_VERSION,
+        }
+        _add_bytes(tar, HEADER_NAME, json.dumps(header).encode("utf-8"))
+
+        for index, rows in enumerate(_iter_row_chunks(db, MANIFEST_CHUNK_SIZE)):
+            if stop_event is not None and stop_event.is_set():
+                break
+
+            manifest, new_blobs = [], {}
+            for entry in pool.map(_export_entry, rows):
+                if entry is None:
+                    counters.skipped += 1
+                    continue
+                row, filepath = entry
+                manifest.append(json.dumps(row, ensure_ascii=False))
+                if row["content_hash"] not in written:
+                    new_blobs.setdefault(row["content_hash"], filepath)
+
+            _add_bytes(tar, f"{MANIFEST_DIR}/{index:06d}.jsonl", "\n".join(manifest).encode("utf-8"))
+            counters.rows += len(manifest)
+
+            for (content_hash, _), data in zip(
+                new_blobs.items(), _prefetch(pool, _read_blob, new_blobs.items(), workers * 2)
+            ):
+                if data is None:
+                    continue
+                _add_bytes(tar, _blob_member(content_hash), data)
+                written.add(content_hash)
+                counters.files += 1
+                counters.bytes += len(data)
+
+            counters.report()
+
+    report = counters.snapshot()
+    logger.info(f"Exported {report.rows} images ({report.files} files, {report.bytes / (1024 * 1024):.1f} MB) "
+                f"to {dest_path} in {report.seconds:.1f}s, {report.mb_per_second:.1f} MB/s")
+    return report
+
+
+def _store_blob(store: BlobStore, content_hash: str, data: bytes) -> bool:
+    """Add one archived file to the blob store; False if it doesn't match its name."""
+    blob = store.put(io.BytesIO(data))
+    if blob.content_hash != content_hash:
+        logger.warning(f"Archived file {content_hash} is corrupt, skipping it")
+        if blob.created:
+            blob.path.unlink(missing_ok=True)
+        return False
+    return True
+
+
+class _Importer:
+    """State of one import: the manifest chunk being filled and the blobs being written for it."""
+
+    def __init__(self, db: Database, store: BlobStore, pool: ThreadPoolExecutor, workers: int,
+                 counters: _Counters):
+        self.db = db
+        self.store = store
+        self.pool = pool
+        self.counters = counters
+        self.archive_id: Optional[str] = None
+        self.chunks_done = 0
+        self.chunk_index = -1
+        self.chunk_rows: Optional[List[Dict[str, Any]]] = None
+        self.blob_futures: List[Future] = []
+        # Bounds the archived files held in memory while workers write them out
+        self.slots = threading.BoundedSemaphore(workers * 2)
+
+    def read_header(self, data: bytes):
+        header = json.loads(data)
+        if header.get("format") != ARCHIVE_FORMAT or header.get("version", 0) > ARCHIVE_VERSION:
+            raise ValueError("Not a supported history archive")
+        self.archive_id = header["archive_id"]
+        row = self.db._connection().execute(
+            "SELECT chunks_done FROM import_progress WHERE archive_id = ?", (self.archive_id,)
+        ).fetchone()
+        self.chunks_done = row[0] if row else 0
+        if self.chunks_done:
+            logger.info(f"Resuming import of archive {self.archive_id} after {self.chunks_done} chunks")
+
+    def start_chunk(self, index: int, data: bytes):
+        self.commit_chunk()
+        self.chunk_index = index
+        if index < self.chunks_done:
+            self.chunk_rows = None  # committed by an earlier run
+            return
+        self.chunk_rows = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+    def add_blob(self, content_hash: str, source) -> None:
+        if not _HASH_PATTERN.match(content_hash):
+            return
+        if self.chunk_rows is None or self.store.path_for(content_hash).exists():
+            return  # part of a chunk already imported, or the same image is here already
+        data = source.read()
+        self.slots.acquire()
+        future = self.pool.submit(_store_blob, self.store, content_hash, data)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.blob_futures.append(future)
+
+    def commit_chunk(self):
+        """Insert the current chunk's rows once its files are stored, and record the chunk as done."""
+        if self.chunk_rows is None:
+            return
+        self.counters.files += sum(future.result() for future in self.blob_futures)
+        self.blob_futures = []
+
+        image_ids = []
+        with self.db._transaction() as conn:
+            rows = []
+            for row in self.chunk_rows:
+                content_hash = row.get("content_hash")
+                path = self.store.path_for(content_hash) if _HASH_PATTERN.match(content_hash or "") else None
+                duplicate = path is not None and conn.execute(
+                    "SELECT 1 FROM images WHERE content_hash = ? AND created_at = ? AND prompt = ? LIMIT 1",
+                    (content_hash, row.get("created_at"), row.get("prompt"))
+                ).fetchone() is not None
+                if path is None or duplicate or not path.exists():
+                    self.counters.skipped += 1
+                    continue
+                rows.append({**{column: row.get(column) for column in EXPORT_COLUMNS}, "filepath": str(path)})
+
+            if rows:
+                last_id = self.db._insert_images(conn, rows)
+                image_ids = range(last_id - len(rows) + 1, last_id + 1)
+            conn.execute('''
+            INSERT INTO import_progress (archive_id, chunks_done, rows_imported) VALUES (?, ?, ?)
+            ON CONFLICT (archive_id) DO UPDATE SET
+                chunks_done = excluded.chunks_done,
+                rows_imported = rows_imported + excluded.rows_imported,
+                updated_at = CURRENT_TIMESTAMP
+            ''', (self.archive_id, self.chunk_index + 1, len(rows)))
+        self.db._notify_changes(CHANGE_INSERT, image_ids)
+
+        self.counters.rows += len(rows)
+        self.chunk_rows = None
+        self.counters.report()
+
+
+def import_history(source_path, db: Database = None, workers: int = None,
+                   on_progress: Callable[[ArchiveReport], None] = None,
+                   stop_event: threading.Event = None) -> ArchiveReport:
+    """Add the history and images from an archive made by export_history.
+
+    The archive is read as a stream. Files go into the blob store on a
+    worker pool, skipping images already present, and each manifest chunk
+    is inserted in one transaction together with the import's progress.
+    An interrupted import (stop_event, crash) picks up at the first
+    uncommitted chunk when run again, and rows already in the history
+    (same image, prompt and time) are not added twice.
+    """
+    db = db or get_database()
+    workers = workers or get_archive_workers()
+    counters = _Counters(on_progress)
+
+    with open(source_path, "rb") as f, \
+            tarfile.open(fileobj=f, mode="r|") as tar, \
+            ThreadPoolExecutor(workers, thread_name_prefix="archive-import") as pool:
+        importer = _Importer(db, get_blob_store(), pool, workers, counters)
+        stopped = False
+        for member in tar:
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
+                break
+            if not member.isfile():
+                continue
+
+            path = PurePosixPath(member.name)
+            if member.name == HEADER_NAME:
+                importer.read_header(tar.extractfile(member).read())
+            elif importer.archive_id is None:
+                raise ValueError("Not a supported history archive")
+            elif path.parent.name == MANIFEST_DIR:
+                importer.start_chunk(int(path.stem), tar.extractfile(member).read())
+            elif path.parts[0] == BLOBS_DIR:
+                counters.bytes += member.size
+                importer.add_blob(path.stem, tar.extractfile(member))
+
+        if not stopped:
+            importer.commit_chunk()
+
+    report = counters.snapshot()
+    logger.info(f"Imported {report.rows} images ({report.files} new files, {report.skipped} skipped) "
+                f"from {source_path} in {report.seconds:.1f}s, {report.mb_per_second:.1f} MB/s")
+    return report
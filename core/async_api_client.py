@@ -0,0 +1,251 @@
+import io
+import copy
+import time
+import asyncio
+import logging
+import weakref
+from typing import Optional, Tuple, Dict, Any, List
+
+import httpx
+from PIL import Image
+
+from core.api_client import APIClient, PROVIDER_NAMES
+from core.retry import CircuitOpenError
+from core.http_pool import get_pool_config
+from core.rate_limit import RateLimiter, get_rate_limiter
+from core.settings import DEFAULT_IMAGE_SIZE
+from core.streaming import STREAM_CHUNK_SIZE
+from core.metrics import get_metrics, CONNECT, TTFB
+
+logger = logging.getLogger(__name__)
+
+# One httpx.AsyncClient per event loop, shared by every AsyncAPIClient running on it
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Get the pooled httpx client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _loop_clients.get(loop)
+    if client is None or client.is_closed:
+        config = get_pool_config()
+        max_per_host = int(config["pool_maxsize"])
+        limits = httpx.Limits(
+            max_connections=max_per_host * int(config["pool_connections"]),
+            max_keepalive_connections=max_per_host if config["keep_alive"] else 0
+        )
+        client = httpx.AsyncClient(limits=limits, timeout=60)
+        _loop_clients[loop] = client
+    return client
+
+
+async def close_async_clients():
+    """Close the httpx client bound to the running event loop."""
+    client = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+class AsyncAPIClient(APIClient):
+    """Asyncio version of APIClient.
+    
+    Shares request building and response parsing with APIClient, but sends
+    requests over httpx and backs off with asyncio.sleep, so a single event
+    loop can keep many generations in flight.
+    """
+    
+    # Every HTTP request (first tries, retries, each chunk of a multi-sample
+    # call; not cache hits) takes a token from this, or from get_rate_limiter()
+    rate_limiter: Optional[RateLimiter] = None
+    
+    def with_rate_limiter(self, rate_limiter: RateLimiter) -> "AsyncAPIClient":
+        """Copy of this client that takes its request tokens from another limiter."""
+        client = copy.copy(self)
+        client.rate_limiter = rate_limiter
+        return client
+    
+    async def generate_image(self,
+                             prompt: str,
+                             size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
+                             negative_prompt: str = None,
+                             bypass_cache: bool = False) -> Optional[Image.Image]:
+        """Generate an image based on text prompt using the selected provider.
+        
+        Set bypass_cache to always request a fresh sample from the provider.
+        """
+        images = await self.generate_images(prompt, size, negative_prompt, count=1, bypass_cache=bypass_cache)
+        return images[0] if images else None
+    
+    async def generate_images(self,
+                              prompt: str,
+                              size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
+                              negative_prompt: str = None,
+                              count: int = 1,
+                              bypass_cache: bool = False) -> List[Image.Image]:
+        """Generate several samples for one prompt, running provider calls concurrently."""
+        if not self.api_key:
+            logger.error("API key is required")
+            return []
+        
+        results = await asyncio.gather(*[
+            self._generate_with_retries(prompt, size, negative_prompt, chunk, offset, bypass_cache)
+            for offset, chunk in self._sample_chunks(count)
+        ])
+        
+        images = []
+        for result in results:
+            if result:
+                images.extend(result)
+        return images
+    
+    async def _generate_with_retries(self,
+                                     prompt: str,
+                                     size: Tuple[int, int],
+                                     negative_prompt: str,
+                                     count: int,
+                                     offset: int,
+                                     bypass_cache: bool) -> Optional[List[Image.Image]]:
+        """Run one provider call under the retry policy (the circuit breaker guards its HTTP requests)."""
+        if self.provider not in PROVIDER_NAMES:
+            logger.error(f"Unsupported API provider: {self.provider}")
+            return None
+        
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await self._call_provider(prompt, size, negative_prompt, bypass_cache, count, offset)
+            except CircuitOpenError:
+                self._circuit_open()
+                return None
+            except Exception as e:
+                wait_time = self._retry_delay(attempt, e)
+                if wait_time is None:
+                    return None
+                await asyncio.sleep(wait_time)
+                continue
+            
+            self._record_result(start, result)
+            return result
+    
+    async def _call_provider(self,
+                             prompt: str,
+                             size: Tuple[int, int],
+                             negative_prompt: str,
+                             bypass_cache: bool,
+                             count: int,
+                             offset: int) -> List[Image.Image]:
+        """Dispatch to the selected provider."""
+        if self.provider == "openai":
+            return await self._call_openai(prompt, size, bypass_cache, count, offset)
+        elif self.provider == "stability":
+            return await self._call_stability(prompt, size, negative_prompt, bypass_cache, count, offset)
+        else:
+            return await self._call_gemini(prompt, size, bypass_cache, count, offset)
+    
+    def _stream(self, provider: str, **kwargs):
+        """Open a streaming POST to a provider endpoint over the loop's pooled httpx client."""
+        kwargs.setdefault("extensions", {})["trace"] = self._connect_tracer(provider)
+        return _get_async_client().stream("POST", self.endpoints[provider], **kwargs)
+    
+    @staticmethod
+    def _connect_tracer(provider: str):
+        """httpx trace hook that records TCP + TLS setup time when a new connection is opened."""
+        started = None
+        
+        async def trace(event: str, info: Dict[str, Any]):
+            nonlocal started
+            if event == "connection.connect_tcp.started":
+                started = time.perf_counter()
+            elif started is not None and event.endswith(".send_request_headers.started"):
+                get_metrics().observe(provider, CONNECT, time.perf_counter() - started)
+                started = None
+        
+        return trace
+    
+    async def _request_images(self,
+                              provider: str,
+                              request: Dict[str, Any],
+                              bypass_cache: bool = False,
+                              count: int = 1,
+                              offset: int = 0) -> List[Image.Image]:
+        """Send a request (or serve it from the cache) and return the images.
+        
+        The body is decoded chunk by chunk as it arrives, so concurrent
+        generations don't each hold a full JSON response in memory.
+        """
+        loop = asyncio.get_running_loop()
+        
+        # Cache reads and writes are blocking, run them off the loop
+        cache_keys = self._cache_keys(provider, request, count, offset)
+        cached = await loop.run_in_executor(None, self._cached_samples, cache_keys, bypass_cache)
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} {PROVIDER_NAMES[provider]} image(s) from cache")
+            get_metrics().increment("cache_hits", provider)
+            return [self._open_image(io.BytesIO(image_data)) for image_data in cached]
+        
+        await (self.rate_limiter or get_rate_limiter()).acquire(provider)
+        
+        breaker = self._allow_request(provider)
+        get_metrics().increment("requests", provider)
+        start = time.perf_counter()
+        try:
+            async with self._stream(provider, **request) as response:
+                get_metrics().observe(provider, TTFB, time.perf_counter() - start)
+                if response.status_code != 200:
+                    await response.aread()
+                    self._check_response(provider, response)
+                
+                body_start = time.perf_counter()
+                decoder = self._stream_decoder(provider)
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    decoder.feed(chunk)
+                buffers = decoder.finish()
+                self._record_body(provider, body_start, decoder)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        breaker.record_success()
+        
+        return await loop.run_in_executor(None, self._open_samples, provider, buffers, cache_keys)
+    
+    async def _call_openai(self,
+                           prompt: str,
+                           size: Tuple[int, int],
+                           bypass_cache: bool = False,
+                           count: int = 1,
+                           offset: int = 0) -> List[Image.Image]:
+        """Call OpenAI's DALL-E API."""
+        logger.info(f"Calling OpenAI DALL-E with prompt: {prompt[:50]}...")
+        
+        request = self._openai_request(prompt, size, count)
+        return await self._request_images("openai", request, bypass_cache, count, offset)
+    
+    async def _call_stability(self,
+                              prompt: str,
+                              size: Tuple[int, int],
+                              negative_prompt: str = None,
+                              bypass_cache: bool = False,
+                              count: int = 1,
+                              offset: int = 0) -> List[Image.Image]:
+        """Call Stability AI API."""
+        logger.info(f"Calling Stability AI with prompt: {prompt[:50]}...")
+        
+        request = self._stability_request(prompt, size, negative_prompt, count)
+        return await self._request_images("stability", request, bypass_cache, count, offset)
+    
+    async def _call_gemini(self,
+                           prompt: str,
+                           size: Tuple[int, int],
+                           bypass_cache: bool = False,
+                           count: int = 1,
+                           offset: int = 0) -> List[Image.Image]:
+        """Call Google's Gemini API for image generation (one image per call)."""
+        logger.info(f"Calling Gemini API with prompt: {prompt[:50]}...")
+        
+        request = self._gemini_request(prompt, size)
+        return await self._request_images("gemini", request, bypass_cache, count, offset)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLoopThread:
+    """Runs an asyncio event loop in a background daemon thread.
+    
+    The UI submits coroutines with run(); completion callbacks are marshalled
+    back onto the Tk thread through widget.after().
+    """
+    
+    def __init__(self, name: str = "async-loop"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Start the loop thread if it isn't running yet."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        
+        self._ready.wait()
+    
+    def _run(self):
+        """Thread body: own the event loop until stop() is called."""
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ready.set()
+        
+        try:
+            self.loop.run_forever()
+        finally:
+            # Cancel whatever is still pending and close the loop
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+            logger.debug(f"Event loop {self.name} stopped")
+    
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the loop and return a concurrent Future."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def run(self,
+            coro: Coroutine,
+            widget,
+            on_success: Callable[[Any], None] = None,
+            on_error: Callable[[BaseException], None] = None) -> Future:
+        """Run a coroutine and deliver its result to the Tk thread via widget.after()."""
+        future = self.submit(coro)
+        
+        def _done(fut: Future):
+            if fut.cancelled():
+                return
+            error = fut.exception()
+            if error is not None:
+                if on_error:
+                    widget.after(0, lambda: on_error(error))
+            elif on_success:
+                result = fut.result()
+                widget.after(0, lambda: on_success(result))
+        
+        future.add_done_callback(_done)
+        return future
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the loop and wait for the thread to exit."""
+        if self.loop is None or self._thread is None or not self._thread.is_alive():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+_loop_thread: Optional[AsyncLoopThread] = None
+_loop_thread_lock = threading.Lock()
+
+
+def get_loop_thread() -> AsyncLoopThread:
+    """Get the shared per-process loop thread, starting it on first use."""
+    global _loop_thread
+    with _loop_thread_lock:
+        if _loop_thread is None:
+            _loop_thread = AsyncLoopThread()
+    _loop_thread.start()
+    return _loop_thread
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from core.async_api_client import AsyncAPIClient
+from core.history_writer import save_generated
+from core.db import Database, get_database
+from core.rate_limit import RateLimiter, get_rate_limiter
+from core.settings import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 3
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class BatchJob:
+    """A single generation request inside a batch."""
+
+    def __init__(self, index: int, prompt: str, size: Tuple[int, int], negative_prompt: str = None):
+        self.index = index
+        self.prompt = prompt
+        self.size = size
+        self.negative_prompt = negative_prompt
+        self.status = PENDING
+        self.filepath: Optional[str] = None
+        self.image_id: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def __repr__(self):
+        return f"BatchJob({self.index}, {self.prompt[:20]!r}, {self.size[0]}x{self.size[1]}, {self.status})"
+
+
+class BatchQueue:
+    """Runs many generations with bounded concurrency and per-provider rate limits.
+
+    Must be run on an asyncio loop (see core.async_runner). Callbacks are
+    invoked on that loop's thread; UI code should hop back with after().
+    """
+
+    def __init__(self,
+                 api_client: AsyncAPIClient,
+                 db: Database = None,
+                 concurrency: int = None,
+                 rate_limiter: RateLimiter = None,
+                 on_progress: Callable[["BatchQueue", BatchJob], None] = None):
+        self.db = db or get_database()
+        self.concurrency = max(1, int(concurrency or APP_CONFIG.get("batch_concurrency", DEFAULT_CONCURRENCY)))
+        # Shared with every other generation by default, so concurrent batches split one quota
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.api_client = api_client.with_rate_limiter(self.rate_limiter)
+        self.on_progress = on_progress
+        self.jobs: List[BatchJob] = []
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cancelled = False
+
+    def add_prompts(self, prompts: Iterable[str], size: Tuple[int, int], negative_prompt: str = None):
+        """Queue one job per prompt."""
+        for prompt in prompts:
+            self.jobs.append(BatchJob(len(self.jobs), prompt, size, negative_prompt))
+
+    def add_matrix(self, prompts: Iterable[str], sizes: Iterable[Tuple[int, int]], negative_prompt: str = None):
+        """Queue every prompt x size combination."""
+        sizes = list(sizes)
+        for prompt in prompts:
+            for size in sizes:
+                self.jobs.append(BatchJob(len(self.jobs), prompt, size, negative_prompt))
+
+    @property
+    def completed(self) -> int:
+        """Number of jobs that reached a final state."""
+        return sum(1 for job in self.jobs if job.status in (DONE, FAILED, CANCELLED))
+
+    @property
+    def total(self) -> int:
+        return len(self.jobs)
+
+    async def run(self) -> List[BatchJob]:
+        """Run all queued jobs and return them once every job is finished."""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in self.jobs:
+            if job.status == PENDING:
+                queue.put_nowait(job)
+
+        logger.info(f"Starting batch of {queue.qsize()} jobs with concurrency {self.concurrency}")
+        self._workers = [
+            asyncio.create_task(self._worker(queue))
+            for _ in range(min(self.concurrency, queue.qsize()))
+        ]
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        # Anything left over was cancelled before a worker picked it up
+        for job in self.jobs:
+            if job.status in (PENDING, RUNNING):
+                job.status = CANCELLED
+                self._report(job)
+
+        logger.info(f"Batch finished: {sum(1 for j in self.jobs if j.status == DONE)}/{self.total} succeeded")
+        return self.jobs
+
+    def cancel(self):
+        """Cancel the batch. Safe to call from any thread."""
+        self._cancelled = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_workers)
+
+    def _cancel_workers(self):
+        for task in self._workers:
+            task.cancel()
+
+    async def _worker(self, queue: asyncio.Queue):
+        """Pull jobs until the queue is empty or the batch is cancelled."""
+        while not self._cancelled:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                # A job whose save was already under way has its real outcome
+                if job.status not in (DONE, FAILED):
+                    job.status = CANCELLED
+                    self._report(job)
+                raise
+
+    async def _run_job(self, job: BatchJob):
+        """Generate, save and record one job."""
+        provider = self.api_client.provider
+        job.status = RUNNING
+        self._report(job)
+
+        try:
+            start = time.perf_counter()
+            image = await self.api_client.generate_image(job.prompt, job.size, job.negative_prompt)
+            if image is None:
+                raise Exception("Failed to generate image")
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            # Saving and the DB insert are blocking, keep them off the loop
+            loop = asyncio.get_running_loop()
+            save = loop.run_in_executor(None, self._save_job, job, image, provider, latency_ms)
+            try:
+                await asyncio.shield(save)
+            except asyncio.CancelledError:
+                # The executor thread can't be stopped halfway: report what it did
+                await self._settle_save(job, save)
+                raise
+            job.status = DONE
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch job {job.index} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+
+        self._report(job)
+
+    async def _settle_save(self, job: BatchJob, save: asyncio.Future):
+        """Wait for a save the batch was cancelled during, and mark the job by its outcome."""
+        await asyncio.wait([save])
+        error = save.exception()
+        if error is None:
+            job.status = DONE
+        else:
+            logger.error(f"Batch job {job.index} failed: {error}")
+            job.error = str(error)
+            job.status = FAILED
+        self._report(job)
+
+    def _save_job(self, job: BatchJob, image, provider: str, latency_ms: Optional[float] = None):
+        """Save a finished image and add it to the history database."""
+        # With write-behind enabled, concurrent jobs share one commit
+        (job.image_id, job.filepath), = save_generated(
+            [image], job.prompt, provider, latency_ms, db=self.db, write_behind=True
+        )
+
+    def _report(self, job: BatchJob):
+        if self.on_progress:
+            try:
+                self.on_progress(self, job)
+            except Exception as e:
+                logger.error(f"Error in batch progress callback: {e}")
@@ -0,0 +1,169 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from core.settings import APP_DIR
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = APP_DIR / "images"
+BLOB_SUFFIX = ".png"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def _atomic_write(file_path: Path, write):
+    """Write a file through a temp file in the same directory, then rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class StoredBlob(NamedTuple):
+    content_hash: str
+    path: Path
+    size: int
+    created: bool  # False when identical content was already stored
+
+
+def hash_stream(source: BinaryIO) -> Tuple[str, int]:
+    """sha256 and length of a file object's content (read from the current position)."""
+    # sha256 is hardware-accelerated on current CPUs and beats blake2b/md5 in hashlib
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+def hash_file(filepath) -> Tuple[str, int]:
+    """sha256 and size of a file."""
+    with open(filepath, "rb") as f:
+        return hash_stream(f)
+
+
+def display_filename(prompt: str) -> str:
+    """Human-readable name for the history list, based on the first words of the prompt."""
+    clean_prompt = "".join(c if c.isalnum() else "_" for c in prompt[:30])
+    return f"{clean_prompt}_{int(time.time())}.png"
+
+
+class BlobStore:
+    """Content-addressed image files: each distinct PNG is stored once as <root>/ab/<sha256>.png.
+
+    Storing content that is already present costs a hash but no write.
+
+    A file found already present may belong to a row being deleted right
+    now. Savers pass pin=True and release() the blob once its row is
+    committed; remove() leaves pinned files alone, so a row never ends up
+    pointing at a file deleted between put() and its insert.
+    """
+
+    def __init__(self, root: Path = BLOB_DIR):
+        self.root = Path(root)
+        self._pins: Dict[str, int] = {}  # path key -> saves in progress
+        self._pins_lock = threading.Lock()
+
+    def path_for(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / f"{content_hash}{BLOB_SUFFIX}"
+
+    @staticmethod
+    def _pin_key(path) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def put(self, source: BinaryIO, pin: bool = False) -> StoredBlob:
+        """Store encoded PNG bytes from a seekable file object (rewound afterwards)."""
+        source.seek(0)
+        content_hash, size = hash_stream(source)
+        source.seek(0)
+
+        path = self.path_for(content_hash)
+        with self._pins_lock:
+            # Pinned together with the check, so remove() can't slip in between
+            if pin:
+                key = self._pin_key(path)
+                self._pins[key] = self._pins.get(key, 0) + 1
+            exists = path.exists()
+        if exists:
+            return StoredBlob(content_hash, path, size, False)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A crash mid-write must never leave a truncated file under a valid hash
+        try:
+            _atomic_write(path, lambda f: shutil.copyfileobj(source, f))
+        finally:
+            source.seek(0)
+
+        return StoredBlob(content_hash, path, size, True)
+
+    def release(self, blob: StoredBlob):
+        """Drop the pin taken by put(pin=True), once the row referencing the blob is committed (or given up)."""
+        key = self._pin_key(blob.path)
+        with self._pins_lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def remove(self, filepath) -> bool:
+        """Delete a file no row references any more, unless a save is about to reference it again.
+
+        Returns False when the file is pinned and was kept; raises OSError
+        like os.remove() otherwise.
+        """
+        with self._pins_lock:
+            if self._pin_key(filepath) in self._pins:
+                return False
+            os.remove(filepath)
+            return True
+
+    def put_image(self, image: Image.Image, pin: bool = False) -> StoredBlob:
+        """Store an image as PNG.
+
+        Images opened from a provider response keep their original bytes in
+        image.encoded_source; those are stored as-is when already PNG, anything
+        else is encoded first.
+        """
+        source = getattr(image, "encoded_source", None)
+        if source is not None and image.format == "PNG":
+            blob = self.put(source, pin)
+        else:
+            with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as buffer:
+                image.save(buffer, format="PNG")
+                blob = self.put(buffer, pin)
+
+        if blob.created:
+            logger.info(f"Image saved to {blob.path}")
+        else:
+            logger.info(f"Identical image already stored at {blob.path}")
+        return blob
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Get the shared per-process blob store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
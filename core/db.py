@@ -1,142 +1,696 @@
 import os
+import re
 import sqlite3
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple, Callable, NamedTuple
 from datetime import datetime
 
-from core.settings import DB_PATH
+from core.settings import DB_PATH, APP_CONFIG
+from core.migrations import migrate, backfill, pending_seeds
+from core.thumbnails import get_thumbnail_store
+from core.blob_store import get_blob_store
+from core.phash import (
+    hamming, band_value, band_neighbours, PHASH_BANDS, DEFAULT_MAX_DISTANCE, MAX_SEARCH_DISTANCE
+)
 
 logger = logging.getLogger(__name__)
 
+# Applied to every connection; overridable with the "sqlite_pragmas" key in config.json
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",        # readers don't block the writer and vice versa
+    "synchronous": "NORMAL",      # safe with WAL, avoids an fsync per commit
+    "cache_size": -16000,         # 16 MB page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,         # wait instead of failing with "database is locked"
+}
+
+# Statements cached per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 256
+
+# Position in the history list: (created_at, id) of the last row already shown
+PageCursor = Tuple[str, int]
+
+# Typed columns added in schema v3 and v5 (see core.migrations)
+METADATA_COLUMNS = ("content_hash", "file_size", "latency_ms", "seed", "thumbnail_ref", "phash")
+
+# Write-behind defaults, overridable with the "db_write_behind" key in config.json
+DEFAULT_WRITE_BEHIND = {
+    "enabled": False,
+    "flush_interval": 0.25,  # seconds between grouped commits
+    "max_batch": 500,        # flush early once this many rows are waiting
+}
+
+# Columns get_stats() can group by; "month" buckets the rollup's days
+STATS_GROUPS = {
+    "day": "day",
+    "month": "substr(day, 1, 7)",
+    "provider": "provider",
+    "size": "size",
+}
+
+# Ids per "WHERE id IN (...)" query, well under SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 500
+
+# Rows per batch yielded by iter_search_images()
+SEARCH_BATCH_SIZE = 100
+
+# ChangeEvent kinds
+CHANGE_INSERT = "insert"
+CHANGE_DELETE = "delete"
+CHANGE_UPDATE = "update"
+
+# Markers wrapped around matched terms by FTS5 highlight(), turned into match_spans
+_MATCH_START = "\x01"
+_MATCH_END = "\x02"
+
+class ChangeEvent(NamedTuple):
+    """Rows of the images table changed by one committed transaction."""
+    kind: str               # CHANGE_INSERT, CHANGE_DELETE or CHANGE_UPDATE
+    ids: Tuple[int, ...]
+
 class Database:
-    """Database wrapper for storing image history."""
+    """Database wrapper for storing image history.
+    
+    Each thread gets one long-lived connection (reads run concurrently under
+    WAL), and writes go through a single lock so threads in this process never
+    race each other for the write lock. Use get_database() for the shared
+    per-process instance.
+    """
     
     def __init__(self, db_path=DB_PATH):
         self.db_path = db_path
+        self.pragmas = {**DEFAULT_PRAGMAS, **(APP_CONFIG.get("sqlite_pragmas", {}) or {})}
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}  # by the thread that opened it
+        self._connections_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._write_behind: Optional["WriteBehindBuffer"] = None
+        self._change_listeners: List[Callable[[ChangeEvent], None]] = []
+        self._stop_event = threading.Event()
+        self._backfill_thread: Optional[threading.Thread] = None
+        self.fts_enabled = False
         self._ensure_db_exists()
         logger.info(f"Database initialized at {db_path}")
     
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                isolation_level=None,  # transactions are opened explicitly in _transaction
+                check_same_thread=False,  # so close() can run from any thread
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            conn.row_factory = sqlite3.Row
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name}={value}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._prune_connections()
+                self._connections[threading.current_thread()] = conn
+        return conn
+    
+    def _prune_connections(self):
+        """Close the connections of threads that have ended (call with _connections_lock held)."""
+        for thread in [thread for thread in self._connections if not thread.is_alive()]:
+            try:
+                self._connections.pop(thread).close()
+            except sqlite3.Error as e:
+                logger.error(f"Error closing database connection: {e}")
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run the enclosed writes in one transaction, committed on success."""
+        conn = self._connection()
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+    
+    def add_change_listener(self, listener: Callable[[ChangeEvent], None]):
+        """Call listener with a ChangeEvent after every commit that adds, deletes or updates images.
+        
+        Listeners run on the thread that wrote, after the write lock is
+        released; hand the event over to your own thread (e.g. with after()).
+        Updates of the thumbnail_ref bookkeeping column are not announced.
+        """
+        with self._connections_lock:
+            self._change_listeners.append(listener)
+    
+    def remove_change_listener(self, listener: Callable[[ChangeEvent], None]):
+        with self._connections_lock:
+            if listener in self._change_listeners:
+                self._change_listeners.remove(listener)
+    
+    def _notify_changes(self, kind: str, image_ids: Iterable[int]):
+        """Tell the listeners about committed changes (call outside the write transaction)."""
+        image_ids = tuple(image_ids)
+        with self._connections_lock:
+            listeners = list(self._change_listeners)
+        if not image_ids or not listeners:
+            return
+        
+        event = ChangeEvent(kind, image_ids)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in database change listener: {e}")
+    
+    def close(self):
+        """Flush pending writes and close every connection opened by this instance."""
+        if self._write_behind is not None:
+            self._write_behind.close()
+            self._write_behind = None
+        
+        # An unfinished backfill resumes on the next start
+        self._stop_event.set()
+        if self._backfill_thread is not None:
+            self._backfill_thread.join()
+            self._backfill_thread = None
+        
+        with self._connections_lock:
+            connections, self._connections = list(self._connections.values()), {}
+        for conn in connections:
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Error closing database connection: {e}")
+        self._local = threading.local()
+    
     def _ensure_db_exists(self):
-        """Create database and tables if they don't exist."""
+        """Create or migrate the schema, then backfill new columns in the background."""
         # Make sure directory exists
         if not os.path.exists(os.path.dirname(self.db_path)):
             os.makedirs(os.path.dirname(self.db_path))
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create history table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS images (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            prompt TEXT NOT NULL,
-            filename TEXT NOT NULL,
-            filepath TEXT NOT NULL,
-            provider TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            width INTEGER,
-            height INTEGER,
-            extra_data TEXT
-        )
-        ''')
+        conn = self._connection()
+        migrate(conn, self._write_lock)
+        # Searches use LIKE until the index covers the prompts stored before it existed
+        self.fts_enabled = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images_fts'"
+        ).fetchone() is not None and "fts" not in pending_seeds(conn)
         
-        conn.commit()
-        conn.close()
+        # New tables still to be filled from existing rows, and rows from before the typed
+        # columns existed (or inserted without them), are handled in the background
+        if self._needs_backfill():
+            self._backfill_thread = threading.Thread(
+                target=backfill, args=(self, self._stop_event), name="db-backfill", daemon=True
+            )
+            self._backfill_thread.start()
+    
+    def _needs_backfill(self) -> bool:
+        """Whether a derived table is still being seeded, or any row lacks a content hash or perceptual hash."""
+        # Separate lookups so each one can use its index (an OR here would scan the table)
+        conn = self._connection()
+        if pending_seeds(conn):
+            return True
+        return any(
+            conn.execute(f"SELECT 1 FROM images WHERE {column} IS NULL LIMIT 1").fetchone() is not None
+            for column in ("content_hash", "phash")
+        )
     
     def add_image(self, prompt: str, filename: str, filepath: str, provider: str = "unknown",
-                width: int = None, height: int = None, extra_data: str = None) -> int:
-        """Add a new image to the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        INSERT INTO images (prompt, filename, filepath, provider, created_at, width, height, extra_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            prompt, 
-            filename, 
-            filepath, 
-            provider, 
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            width,
-            height,
-            extra_data
-        ))
-        
-        # Get the ID of the inserted row
-        image_id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
-        
-        logger.debug(f"Added image to database with ID {image_id}")
-        return image_id
+                width: int = None, height: int = None, extra_data: str = None, **metadata) -> int:
+        """Add a new image to the database.
+        
+        metadata may hold any of METADATA_COLUMNS (content_hash, file_size, ...).
+        """
+        return self.add_images([{
+            "prompt": prompt,
+            "filename": filename,
+            "filepath": filepath,
+            "provider": provider,
+            "width": width,
+            "height": height,
+            "extra_data": extra_data,
+            **metadata
+        }])[0]
+    
+    def add_images(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Add several images to the database in a single transaction.
+        
+        Each row is a dict with the same keys as add_image's arguments.
+        """
+        if not rows:
+            return []
+        
+        with self._transaction() as conn:
+            last_id = self._insert_images(conn, rows)
+        
+        image_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+        logger.debug(f"Added {len(image_ids)} images to database")
+        self._notify_changes(CHANGE_INSERT, image_ids)
+        return image_ids
+    
+    @staticmethod
+    def _insert_images(conn: sqlite3.Connection, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows inside the caller's write transaction; return the last new id."""
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.executemany(f'''
+        INSERT INTO images (prompt, filename, filepath, provider, created_at, width, height, extra_data,
+                            {", ".join(METADATA_COLUMNS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?{", ?" * len(METADATA_COLUMNS)})
+        ''', [
+            (
+                row["prompt"],
+                row["filename"],
+                row["filepath"],
+                row.get("provider", "unknown"),
+                row.get("created_at") or created_at,
+                row.get("width"),
+                row.get("height"),
+                row.get("extra_data"),
+                *(row.get(column) for column in METADATA_COLUMNS)
+            )
+            for row in rows
+        ])
+        
+        # The write lock keeps other writers out, so AUTOINCREMENT ids are consecutive
+        return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    
+    def write_behind(self) -> "WriteBehindBuffer":
+        """Get this database's write-behind buffer, starting it on first use."""
+        with self._connections_lock:
+            if self._write_behind is None:
+                config = {**DEFAULT_WRITE_BEHIND, **(APP_CONFIG.get("db_write_behind", {}) or {})}
+                self._write_behind = WriteBehindBuffer(self, config["flush_interval"], config["max_batch"])
+            return self._write_behind
+    
+    def queue_image(self, row: Dict[str, Any]) -> "Future[int]":
+        """Add an image through the write-behind buffer when enabled, otherwise right away.
+        
+        The returned future resolves to the new row id once it is committed.
+        """
+        if (APP_CONFIG.get("db_write_behind", {}) or {}).get("enabled", DEFAULT_WRITE_BEHIND["enabled"]):
+            return self.write_behind().add(row)
+        
+        future = Future()
+        try:
+            future.set_result(self.add_images([row])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
     
     def get_all_images(self, limit: int = 50) -> List[Dict[str, Any]]:
         """Get all images from the database."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        items, _ = self.get_images_page(limit)
+        return items
+    
+    def get_images_page(self, limit: int = 50,
+                        cursor: Optional[PageCursor] = None) -> Tuple[List[Dict[str, Any]], Optional[PageCursor]]:
+        """Get one page of images, newest first.
         
-        cursor.execute('''
-        SELECT * FROM images
-        ORDER BY created_at DESC
-        LIMIT ?
-        ''', (limit,))
+        Pass the cursor returned with the previous page to get the next one;
+        the returned cursor is None on the last page. Seeking on the
+        (created_at, id) index keeps deep pages as cheap as the first.
+        """
+        if cursor is None:
+            rows = self._connection().execute('''
+            SELECT * FROM images
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            ''', (limit,)).fetchall()
+        else:
+            rows = self._connection().execute('''
+            SELECT * FROM images
+            WHERE (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            ''', (cursor[0], cursor[1], limit)).fetchall()
         
-        rows = cursor.fetchall()
-        results = [dict(row) for row in rows]
+        items = [dict(row) for row in rows]
+        next_cursor = (items[-1]["created_at"], items[-1]["id"]) if len(items) == limit else None
+        return items, next_cursor
+    
+    def get_images_at(self, offset: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get the images at a position in the newest-first list.
         
-        conn.close()
-        return results
+        For jumping into the middle of the list; prefer get_images_page()
+        when reading on from a previous page, as OFFSET walks every row it skips.
+        """
+        rows = self._connection().execute('''
+        SELECT * FROM images
+        ORDER BY created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+        ''', (limit, offset)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def count_images(self) -> int:
+        """Number of images in the history."""
+        return self._connection().execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    
+    def count_newer(self, created_at: str, image_id: int) -> int:
+        """Number of images listed before this one, i.e. its position in the newest-first list."""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM images WHERE (created_at, id) > (?, ?)", (created_at, image_id)
+        ).fetchone()[0]
+    
+    def get_images(self, image_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Get several images by ID (missing ones are left out), in no particular order."""
+        image_ids = list(image_ids)
+        conn = self._connection()
+        items = []
+        for start in range(0, len(image_ids), ID_CHUNK_SIZE):
+            chunk = image_ids[start:start + ID_CHUNK_SIZE]
+            items.extend(dict(row) for row in conn.execute(
+                f"SELECT * FROM images WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return items
     
     def search_images(self, search_term: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Search for images matching the search term."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        """Search prompts, best matches first.
         
-        # Search in prompt field
-        cursor.execute('''
-        SELECT * FROM images
-        WHERE prompt LIKE ?
-        ORDER BY created_at DESC
-        LIMIT ?
-        ''', (f'%{search_term}%', limit))
+        Every word must appear; the last word (or any ending in "*") also
+        matches as a prefix. Results carry a short "snippet" and "match_spans",
+        the (start, end) offsets of the matched words in the prompt.
+        """
+        return [item for batch in self.iter_search_images(search_term, limit) for item in batch]
+    
+    def iter_search_images(self, search_term: str, limit: int = 50,
+                           batch_size: int = SEARCH_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """search_images() results in batches, as SQLite produces them (to stream them into a list).
         
-        rows = cursor.fetchall()
-        results = [dict(row) for row in rows]
+        Runs on this thread's connection, so another thread can stop it with
+        interrupt() on that connection (see core.live_search).
+        """
+        conn = self._connection()
+        if self.fts_enabled:
+            query = self._fts_query(search_term)
+            if not query:
+                return
+            cursor = conn.execute('''
+            SELECT images.*,
+                   snippet(images_fts, 0, '[', ']', '...', 16) AS snippet,
+                   highlight(images_fts, 0, ?, ?) AS highlighted
+            FROM images_fts
+            JOIN images ON images.id = images_fts.rowid
+            WHERE images_fts MATCH ?
+            ORDER BY rank, images.created_at DESC
+            LIMIT ?
+            ''', (_MATCH_START, _MATCH_END, query, limit))
+        else:
+            # Substring search, for SQLite builds without FTS5
+            cursor = conn.execute('''
+            SELECT * FROM images
+            WHERE prompt LIKE ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            ''', (f'%{search_term}%', limit))
         
-        conn.close()
-        return results
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                batch = []
+                for row in rows:
+                    item = dict(row)
+                    if "highlighted" in item:
+                        item["match_spans"] = self._match_spans(item.pop("highlighted"))
+                    batch.append(item)
+                yield batch
+        finally:
+            cursor.close()
     
-    def get_image(self, image_id: int) -> Optional[Dict[str, Any]]:
-        """Get an image by ID."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    @staticmethod
+    def _fts_query(search_term: str) -> str:
+        """Turn free text into an FTS5 query of quoted terms (so user input can't inject syntax)."""
+        words = re.findall(r"[\w]+\*?", search_term)
+        terms = []
+        for i, word in enumerate(words):
+            term = f'"{word.rstrip("*")}"'
+            if word.endswith("*") or i == len(words) - 1:
+                # Also match the whole word so exact hits rank above longer words
+                term = f"({term} OR {term}*)"
+            terms.append(term)
+        return " AND ".join(terms)
+    
+    @staticmethod
+    def _match_spans(highlighted: str) -> List[Tuple[int, int]]:
+        """Offsets of the marked terms in highlight() output, relative to the unmarked text."""
+        spans = []
+        position = 0
+        start = None
+        for char in highlighted:
+            if char == _MATCH_START:
+                start = position
+            elif char == _MATCH_END:
+                spans.append((start, position))
+            else:
+                position += 1
+        return spans
+    
+    def find_similar(self, phash: int, max_distance: int = DEFAULT_MAX_DISTANCE,
+                     limit: int = 50, exclude_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Images whose perceptual hash is within max_distance bits of phash, closest first.
         
-        cursor.execute('SELECT * FROM images WHERE id = ?', (image_id,))
-        row = cursor.fetchone()
+        Each result carries its "distance". Candidates come from the
+        phash_bands index (any hash within r bits matches some band to within
+        r // PHASH_BANDS bits), so only a small part of the history is compared.
+        """
+        max_distance = min(max_distance, MAX_SEARCH_DISTANCE)
+        radius = max_distance // PHASH_BANDS
         
-        conn.close()
+        conn = self._connection()
+        candidates = set()
+        for band in range(PHASH_BANDS):
+            values = band_neighbours(band_value(phash, band), radius)
+            candidates.update(row[0] for row in conn.execute(
+                f"SELECT image_id FROM phash_bands WHERE band = ? AND value IN ({', '.join('?' * len(values))})",
+                (band, *values)
+            ))
+        candidates.discard(exclude_id)
+        
+        matches = []
+        candidates = list(candidates)
+        for start in range(0, len(candidates), ID_CHUNK_SIZE):
+            chunk = candidates[start:start + ID_CHUNK_SIZE]
+            for row in conn.execute(
+                f"SELECT * FROM images WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+            ):
+                distance = hamming(phash, row["phash"])
+                if distance <= max_distance:
+                    item = dict(row)
+                    item["distance"] = distance
+                    matches.append(item)
+        
+        matches.sort(key=lambda item: (item["distance"], -item["id"]))
+        return matches[:limit]
+    
+    def get_stats(self, date_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+                  group_by: Iterable[str] = ("provider",)) -> List[Dict[str, Any]]:
+        """Image counts, bytes and average latency, grouped by any of STATS_GROUPS.
+        
+        date_range is an inclusive ("YYYY-MM-DD", "YYYY-MM-DD") pair, either
+        end may be None. Reads the usage_rollup table (one row per day,
+        provider and size), so the cost doesn't grow with the history. Right
+        after an upgrade the older rows are still being added to it in the
+        background (see migrations.backfill).
+        """
+        group_by = list(group_by)
+        unknown = [name for name in group_by if name not in STATS_GROUPS]
+        if unknown:
+            raise ValueError(f"Unknown stats grouping: {', '.join(unknown)}")
+        
+        conditions, params = [], []
+        start, end = date_range or (None, None)
+        if start:
+            conditions.append("day >= ?")
+            params.append(str(start))
+        if end:
+            conditions.append("day <= ?")
+            params.append(str(end))
+        
+        select = [f"{STATS_GROUPS[name]} AS {name}" for name in group_by] + [
+            "SUM(image_count) AS image_count",
+            "SUM(total_bytes) AS total_bytes",
+            "SUM(latency_sum) / NULLIF(SUM(latency_count), 0) AS avg_latency_ms",
+        ]
+        query = f"SELECT {', '.join(select)} FROM usage_rollup"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        if group_by:
+            query += f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}"
+        
+        rows = self._connection().execute(query, params).fetchall()
+        return [dict(row) for row in rows if row["image_count"]]
+    
+    def set_thumbnail_refs(self, refs: Iterable[Tuple[int, str]]):
+        """Record the cached thumbnail key of images, as (image_id, thumbnail_ref) pairs."""
+        refs = [(thumbnail_ref, image_id) for image_id, thumbnail_ref in refs]
+        if refs:
+            with self._transaction() as conn:
+                conn.executemany("UPDATE images SET thumbnail_ref = ? WHERE id = ?", refs)
+    
+    def get_image(self, image_id: int) -> Optional[Dict[str, Any]]:
+        """Get an image by ID."""
+        row = self._connection().execute('SELECT * FROM images WHERE id = ?', (image_id,)).fetchone()
         
         if row:
             return dict(row)
         return None
     
     def delete_image(self, image_id: int) -> bool:
-        """Delete an image from the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Delete an image from the database, and its file once nothing else references it."""
+        success = self.delete_images([image_id]) > 0
         
-        cursor.execute('DELETE FROM images WHERE id = ?', (image_id,))
+        logger.debug(f"Deleted image with ID {image_id}, success: {success}")
+        return success
+    
+    def delete_images(self, image_ids: Iterable[int], remove_files: bool = True) -> int:
+        """Delete several images in a single transaction; return how many rows were removed.
         
-        # Check if a row was affected
-        success = cursor.rowcount > 0
+        Identical images share one file (see core.blob_store), so a file is
+        only removed once no remaining row points at it. Pass
+        remove_files=False to keep the files.
+        """
+        image_ids = [(image_id,) for image_id in image_ids]
+        if not image_ids:
+            return 0
         
-        conn.commit()
-        conn.close()
+        with self._write_lock:
+            with self._transaction() as conn:
+                # filepath -> thumbnail keys of the rows being deleted
+                filepaths: Dict[str, set] = {}
+                if remove_files:
+                    for start in range(0, len(image_ids), ID_CHUNK_SIZE):
+                        chunk = [image_id for (image_id,) in image_ids[start:start + ID_CHUNK_SIZE]]
+                        for filepath, thumbnail_ref in conn.execute(
+                            f"SELECT filepath, thumbnail_ref FROM images WHERE id IN ({', '.join('?' * len(chunk))})",
+                            chunk
+                        ):
+                            refs = filepaths.setdefault(filepath, set())
+                            if thumbnail_ref:
+                                refs.add(thumbnail_ref)
+                
+                # rowcount sums the rows deleted by each execution (trigger changes excluded);
+                # the triggers drop the blob refcounts and forget blobs nothing uses any more
+                deleted = conn.executemany('DELETE FROM images WHERE id = ?', image_ids).rowcount
+                
+                # Legacy rows may share a hash without sharing a file, so check the paths themselves
+                orphaned = [
+                    filepath for filepath in filepaths
+                    if conn.execute('SELECT 1 FROM images WHERE filepath = ? LIMIT 1', (filepath,)).fetchone() is None
+                ]
+            
+            # Removed after the commit, under the write lock so no insert can commit in between.
+            # A save may already have found the file and be waiting to insert its row: it holds
+            # a pin on the file (see BlobStore.put), and pinned files are kept
+            blobs = get_blob_store()
+            thumbnails = get_thumbnail_store()
+            for filepath in orphaned:
+                try:
+                    if not blobs.remove(filepath):
+                        logger.debug(f"Kept file about to be saved again: {filepath}")
+                        continue
+                    logger.debug(f"Deleted file: {filepath}")
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"Error deleting file {filepath}: {e}")
+                    continue
+                for thumbnail_ref in filepaths[filepath]:
+                    thumbnails.remove(thumbnail_ref)
         
-        logger.debug(f"Deleted image with ID {image_id}, success: {success}")
-        return success 
\ No newline at end of file
+        logger.debug(f"Deleted {deleted} of {len(image_ids)} images and {len(orphaned)} files")
+        if deleted:
+            self._notify_changes(CHANGE_DELETE, (image_id for (image_id,) in image_ids))
+        return deleted
+
+class WriteBehindBuffer:
+    """Groups image inserts from many threads into periodic single-transaction commits.
+    
+    Rows are committed every flush_interval seconds, or as soon as max_batch
+    rows are waiting, by one background thread. close() flushes what is left.
+    """
+    
+    def __init__(self, db: Database, flush_interval: float = 0.25, max_batch: int = 500):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: List[Tuple[Dict[str, Any], Future]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+    
+    def add(self, row: Dict[str, Any]) -> "Future[int]":
+        """Queue a row; the future resolves to its id after the commit."""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Write-behind buffer is closed")
+            self._pending.append((row, future))
+            if len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return future
+    
+    def flush(self):
+        """Commit everything queued so far on the calling thread."""
+        with self._condition:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        try:
+            image_ids = self.db.add_images([row for row, _ in batch])
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} buffered images: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (_, future), image_id in zip(batch, image_ids):
+            future.set_result(image_id)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._pending) < self.max_batch:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+    
+    def close(self):
+        """Stop the background thread after a final flush."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(db_path=DB_PATH) -> Database:
+    """Get the shared per-process Database for a path."""
+    key = os.path.abspath(db_path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = Database(db_path)
+        return db
+
+
+def close_databases():
+    """Close every shared Database (call on shutdown)."""
+    with _databases_lock:
+        databases = list(_databases.values())
+        _databases.clear()
+    for db in databases:
+        db.close()
@@ -0,0 +1,178 @@
+import io
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+from core.settings import APP_DIR, APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = APP_DIR / "cache"
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+CACHE_SUFFIX = ".img"
+
+
+class GenerationCache:
+    """Disk-backed, content-addressed cache of generated images.
+
+    Entries are keyed on a hash of the full provider request and evicted in
+    least-recently-used order once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_bytes: int = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = int(max_bytes or APP_CONFIG.get("cache_max_bytes", DEFAULT_CACHE_MAX_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU index from the files on disk (oldest access first)."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(CACHE_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-len(CACHE_SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        logger.debug(f"Generation cache loaded: {len(self._entries)} entries, {self._total_bytes} bytes")
+
+    @staticmethod
+    def make_key(provider: str, endpoint: str, payload: Dict[str, Any]) -> str:
+        """Hash a provider request into a cache key (credentials are not part of it)."""
+        canonical = json.dumps(
+            {"provider": provider, "endpoint": endpoint, "payload": payload},
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{CACHE_SUFFIX}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached image bytes for a key, or None on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Persist recency for the next run
+        except OSError:
+            # File vanished underneath us, treat as a miss
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store image bytes under a key and evict old entries if over budget."""
+        self.put_file(key, io.BytesIO(data))
+
+    def put_file(self, key: str, source: BinaryIO):
+        """Copy an image from a file object into the cache (the object is rewound)."""
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            source.seek(0)
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(source, f)
+                size = f.tell()
+            source.seek(0)
+
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.error(f"Error writing cache entry: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes (lock held)."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cache entry."""
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache: Optional[GenerationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """Get the shared per-process cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GenerationCache()
+        return _cache
@@ -0,0 +1,155 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from core.db import Database
+
+# Pages kept in memory; older ones are fetched again when scrolled back to
+DEFAULT_MAX_PAGES = 20
+
+
+class HistoryPages:
+    """Random access to the newest-first history, fetched from the database a page at a time.
+
+    Rows are loaded a page at a time on first use and the least recently
+    used ones are dropped past max_pages pages, so memory stays flat however
+    far the list is scrolled. A page right after loaded rows is read by
+    seeking from the last of them; any other page (e.g. after dragging the
+    scrollbar) falls back to OFFSET.
+
+    insert(), delete() and update() apply database changes to the loaded
+    rows in place, so they cost as much as the change, not the library.
+    """
+
+    def __init__(self, db: Database, page_size: int = 50, max_pages: int = DEFAULT_MAX_PAGES):
+        self.db = db
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._items: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # index -> item, least recently used first
+        # Read together: rows up to _last_id are counted, so late insert events for them are ignored
+        self._count, self._last_id = db._connection().execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM images"
+        ).fetchone()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        """The item at a position, or None past the end."""
+        if not 0 <= index < self._count:
+            return None
+        if index not in self._items:
+            self._load(index - index % self.page_size)
+        item = self._items.get(index)
+        if item is not None:
+            self._items.move_to_end(index)
+        return item
+
+    def _load(self, start: int):
+        previous = self._items.get(start - 1)
+        if previous is not None:
+            page, _ = self.db.get_images_page(self.page_size, (previous["created_at"], previous["id"]))
+        else:
+            page = self.db.get_images_at(start, self.page_size)
+
+        for offset, item in enumerate(page):
+            self._items[start + offset] = item
+            self._items.move_to_end(start + offset)
+        while len(self._items) > self.max_pages * self.page_size:
+            self._items.popitem(last=False)
+
+    def loaded_ids(self) -> Set[int]:
+        return {item["id"] for item in self._items.values()}
+
+    def _reindex(self, new_index):
+        self._items = OrderedDict((new_index(index), item) for index, item in self._items.items())
+
+    def insert(self, items: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """Place rows just added to the database; return their positions.
+
+        More than a page of rows at once (an import) isn't worth placing one
+        by one: the loaded rows are dropped instead and None is returned.
+        """
+        items = [item for item in items if item["id"] > self._last_id]
+        self._last_id = max([self._last_id] + [item["id"] for item in items])
+        if len(items) > self.page_size:
+            self._items.clear()
+            self._count = self.db.count_images()
+            return None
+
+        placed = sorted(((self.db.count_newer(item["created_at"], item["id"]), item) for item in items),
+                        key=lambda pair: pair[0])
+        positions = [position for position, _ in placed]
+
+        # A loaded row moves down by the number of new rows that end up above it
+        moved = {}
+        shift = 0
+        for index in sorted(self._items):
+            while shift < len(positions) and positions[shift] <= index + shift:
+                shift += 1
+            moved[index] = index + shift
+        self._reindex(moved.__getitem__)
+        for position, item in placed:
+            self._items[position] = item
+        self._count += len(items)
+        return positions
+
+    def delete(self, image_ids: Iterable[int]) -> Optional[List[int]]:
+        """Drop deleted rows; return their former positions, or None when some weren't loaded.
+
+        Rows that weren't loaded have unknown positions, so everything loaded
+        is dropped and read again as needed.
+        """
+        image_ids = set(image_ids)
+        removed = sorted(index for index, item in self._items.items() if item["id"] in image_ids)
+        if len(removed) < len(image_ids):
+            self._items.clear()
+            self._count = self.db.count_images()
+            return None
+
+        for index in removed:
+            del self._items[index]
+        self._reindex(lambda index: index - bisect_left(removed, index))
+        self._count -= len(removed)
+        return removed
+
+    def update(self, items: List[Dict[str, Any]]):
+        """Replace loaded rows with their current version."""
+        by_id = {item["id"]: item for item in items}
+        for index, item in self._items.items():
+            if item["id"] in by_id:
+                self._items[index] = by_id[item["id"]]
+
+
+class ResultPages:
+    """The same access as HistoryPages over a result list already in memory (search, similar images).
+
+    Results are not re-evaluated as the database changes: deleted rows are
+    dropped and updated ones replaced, but new rows are not added.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.items = items
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        return self.items[index] if 0 <= index < len(self.items) else None
+
+    def loaded_ids(self) -> Set[int]:
+        return {item["id"] for item in self.items}
+
+    def insert(self, items: List[Dict[str, Any]]) -> List[int]:
+        return []
+
+    def delete(self, image_ids: Iterable[int]) -> List[int]:
+        image_ids = set(image_ids)
+        removed = [index for index, item in enumerate(self.items) if item["id"] in image_ids]
+        self.items = [item for item in self.items if item["id"] not in image_ids]
+        return removed
+
+    def update(self, items: List[Dict[str, Any]]):
+        by_id = {item["id"]: item for item in items}
+        # Keep the per-result fields (distance, match spans) computed by the query
+        self.items = [{**item, **by_id[item["id"]]} if item["id"] in by_id else item for item in self.items]
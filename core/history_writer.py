@@ -0,0 +1,69 @@
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from core.blob_store import display_filename, get_blob_store
+from core.db import Database, get_database
+from core.metrics import get_metrics, SAVE, DB_INSERT
+from core.phash import dhash
+from core.thumbnails import get_thumbnail_store, thumbnail_key
+
+
+def save_generated(images: Sequence[Image.Image],
+                   prompt: str,
+                   provider: str,
+                   latency_ms: Optional[float] = None,
+                   db: Database = None,
+                   filename: str = None,
+                   write_behind: bool = False) -> List[Tuple[int, str]]:
+    """Store images, cache their thumbnails and add them to the history.
+
+    Blocking (file writes, hashing, the insert), so callers on the Tk thread
+    or an event loop should run it in an executor. Identical images share
+    one file in the blob store. Each file stays pinned until its row is
+    committed, so a concurrent delete of another row pointing at it keeps
+    it. The rows go in with one insert, or through the database's
+    write-behind buffer when write_behind is set, which lets concurrent
+    callers share a commit. Returns (image_id, filepath) per image.
+    """
+    db = db or get_database()
+    metrics = get_metrics()
+    store = get_blob_store()
+    blobs = []
+    try:
+        with metrics.timer(provider, SAVE):
+            for image in images:
+                blobs.append(store.put_image(image, pin=True))
+
+        # Decode pixels here rather than on the Tk thread when a preview is drawn
+        for image in images:
+            image.load()
+        # Cache the history thumbnails now, while the pixels are in memory
+        thumbnails = get_thumbnail_store()
+        rows = [
+            {
+                "prompt": prompt,
+                "filename": filename or display_filename(prompt),
+                "filepath": str(blob.path),
+                "provider": provider,
+                "width": image.width,
+                "height": image.height,
+                "content_hash": blob.content_hash,
+                "file_size": blob.size,
+                "phash": dhash(image),
+                "latency_ms": latency_ms,
+                "thumbnail_ref": thumbnails.put(thumbnail_key(blob.content_hash), image)
+            }
+            for image, blob in zip(images, blobs)
+        ]
+
+        with metrics.timer(provider, DB_INSERT):
+            if write_behind:
+                image_ids = [future.result() for future in [db.queue_image(row) for row in rows]]
+            else:
+                image_ids = db.add_images(rows)
+    finally:
+        for blob in blobs:
+            store.release(blob)
+
+    return [(image_id, row["filepath"]) for image_id, row in zip(image_ids, rows)]
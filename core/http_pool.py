@@ -0,0 +1,95 @@
+import threading
+import logging
+from typing import Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.settings import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Default connection pool settings, overridable through the "http_pool" key in config.json
+DEFAULT_POOL_CONFIG = {
+    "pool_connections": 4,   # number of per-host pools kept alive by a session
+    "pool_maxsize": 8,       # max connections kept per host
+    "pool_block": False,     # block instead of opening extra connections past pool_maxsize
+    "keep_alive": True,      # reuse connections between requests
+}
+
+_sessions: Dict[str, requests.Session] = {}
+_pool_config: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def get_pool_config() -> Dict[str, Any]:
+    """Get the effective pool configuration (defaults < config.json < configure_pool)."""
+    config = dict(DEFAULT_POOL_CONFIG)
+    config.update(APP_CONFIG.get("http_pool", {}) or {})
+    config.update(_pool_config)
+    return config
+
+
+def _create_session(provider: str) -> requests.Session:
+    """Build a pooled session for one provider."""
+    config = get_pool_config()
+
+    adapter = HTTPAdapter(
+        pool_connections=int(config["pool_connections"]),
+        pool_maxsize=int(config["pool_maxsize"]),
+        pool_block=bool(config["pool_block"]),
+        max_retries=0  # Retries are handled by APIClient
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not config["keep_alive"]:
+        session.headers["Connection"] = "close"
+
+    logger.debug(f"Created HTTP session for {provider}: {config}")
+    return session
+
+
+def get_session(provider: str) -> requests.Session:
+    """Get the shared session for a provider, creating it on first use.
+
+    Sessions are shared by every APIClient in the process, so a client that
+    switches provider (e.g. after the settings dialog) reuses the warm pool.
+    """
+    provider = provider.lower()
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(provider)
+        if session is None:
+            session = _create_session(provider)
+            _sessions[provider] = session
+        return session
+
+
+def configure_pool(**overrides) -> None:
+    """Override pool settings at runtime and drop existing sessions so they pick them up."""
+    unknown = set(overrides) - set(DEFAULT_POOL_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown pool settings: {', '.join(sorted(unknown))}")
+
+    with _lock:
+        _pool_config.update(overrides)
+    close_sessions()
+
+
+def close_sessions() -> None:
+    """Close all pooled sessions and their connections."""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+
+    for session in sessions:
+        try:
+            session.close()
+        except Exception as e:
+            logger.error(f"Error closing HTTP session: {e}")
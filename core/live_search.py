@@ -0,0 +1,107 @@
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from core.db import Database
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSearch:
+    """Runs prompt searches on a background thread, one at a time, newest wins.
+
+    submit() returns at once with a generation number. The worker reads
+    the results in batches and hands each to
+    on_batch(generation, items, done) on the Tk thread through
+    widget.after(); the last call has done=True. A search overtaken by a
+    newer submit() (or by cancel()) is stopped with sqlite3's
+    Connection.interrupt() and delivers nothing more, so callers only need
+    to drop batches whose generation isn't their latest one.
+    """
+
+    def __init__(self, db: Database, widget, on_batch: Callable[[int, List[Dict[str, Any]], bool], None],
+                 limit: int = 1000):
+        self.db = db
+        self.widget = widget
+        self.on_batch = on_batch
+        self.limit = limit
+        self._condition = threading.Condition()
+        self._term: Optional[str] = None
+        self._generation = 0
+        self._running = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="live-search", daemon=True)
+        self._thread.start()
+
+    def submit(self, search_term: str) -> int:
+        """Search for a term, cancelling the search in flight; return this search's generation."""
+        with self._condition:
+            self._generation += 1
+            self._term = search_term
+            self._interrupt()
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Stop the search in flight and drop a queued one."""
+        with self._condition:
+            self._generation += 1
+            self._term = None
+            self._interrupt()
+
+    def _interrupt(self):
+        # Only while a query runs: interrupt() with no statement pending would be a no-op anyway,
+        # but this way a finished search is never mistaken for a cancelled one
+        if self._running and self._conn is not None:
+            self._conn.interrupt()
+
+    def _run(self):
+        # This thread's own connection, the one _interrupt() stops
+        self._conn = self.db._connection()
+        while True:
+            with self._condition:
+                while self._term is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                search_term, generation = self._term, self._generation
+                self._term = None
+                self._running = True
+            try:
+                self._search(search_term, generation)
+            finally:
+                with self._condition:
+                    self._running = False
+
+    def _search(self, search_term: str, generation: int):
+        batches = self.db.iter_search_images(search_term, self.limit)
+        try:
+            for batch in batches:
+                if generation != self._generation:
+                    return
+                self._deliver(generation, batch, False)
+        except sqlite3.OperationalError as e:
+            if generation != self._generation:
+                return  # interrupted by a newer search
+            logger.error(f"Error searching for {search_term!r}: {e}")
+        finally:
+            batches.close()
+        if generation == self._generation:
+            self._deliver(generation, [], True)
+
+    def _deliver(self, generation: int, items: List[Dict[str, Any]], done: bool):
+        try:
+            self.widget.after(0, lambda: self.on_batch(generation, items, done))
+        except RuntimeError:
+            pass  # Tk is shutting down
+
+    def close(self):
+        """Stop the search in flight and the worker thread."""
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._interrupt()
+            self._condition.notify()
+        self._thread.join()
@@ -0,0 +1,171 @@
+import json
+import math
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from core.settings import APP_DIR, APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = APP_DIR / "metrics"
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# Phases of one generation, in the order they happen
+CONNECT = "connect"        # TCP/TLS connection setup (async client only)
+TTFB = "ttfb"              # request sent until response headers arrive (includes connect)
+DOWNLOAD = "download"      # reading the body, excluding time spent decoding it
+DECODE = "decode"          # base64 decoding of the streamed body
+CACHE_WRITE = "cache_write"
+OPEN = "open"              # PIL header parse of the decoded image
+SAVE = "save"
+DB_INSERT = "db_insert"
+TOTAL = "total"            # one provider call including retries and backoff
+
+PHASES = (CONNECT, TTFB, DOWNLOAD, DECODE, CACHE_WRITE, OPEN, SAVE, DB_INSERT, TOTAL)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == math.inf else repr(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class Metrics:
+    """Per-provider phase histograms and counters for image generation.
+
+    Counters: requests, images, cache_hits, retries and errors (by error class).
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str, str], int] = {}  # (name, provider, error_class)
+        self._lock = threading.Lock()
+
+    def observe(self, provider: str, phase: str, seconds: float):
+        """Record the duration of one phase."""
+        with self._lock:
+            histogram = self._histograms.get((provider, phase))
+            if histogram is None:
+                histogram = self._histograms[(provider, phase)] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, provider: str, error_class: str = "", amount: int = 1):
+        """Add to a counter."""
+        key = (name, provider, error_class)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, provider: str, phase: str):
+        """Time the enclosed block as one phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(provider, phase, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict:
+        """All metrics as plain data, grouped by provider."""
+        with self._lock:
+            providers: Dict[str, Dict] = {}
+            for (provider, phase), histogram in sorted(self._histograms.items()):
+                entry = providers.setdefault(provider, {"phases": {}, "counters": {}, "errors": {}})
+                entry["phases"][phase] = histogram.snapshot()
+            for (name, provider, error_class), value in sorted(self._counters.items()):
+                entry = providers.setdefault(provider, {"phases": {}, "counters": {}, "errors": {}})
+                if error_class:
+                    entry["errors"][error_class] = entry["errors"].get(error_class, 0) + value
+                else:
+                    entry["counters"][name] = value
+        return {"generated_at": time.time(), "providers": providers}
+
+    def to_prometheus(self) -> str:
+        """Render a Prometheus text-format snapshot."""
+        lines = [
+            "# HELP image_generation_phase_seconds Time spent in each phase of an image generation.",
+            "# TYPE image_generation_phase_seconds histogram",
+        ]
+        with self._lock:
+            for (provider, phase), histogram in sorted(self._histograms.items()):
+                labels = f'provider="{provider}",phase="{phase}"'
+                for bound, count in histogram.snapshot()["buckets"].items():
+                    lines.append(f'image_generation_phase_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"image_generation_phase_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"image_generation_phase_seconds_count{{{labels}}} {histogram.count}")
+
+            seen = set()
+            for (name, provider, error_class), value in sorted(self._counters.items()):
+                metric = f"image_generation_{name}_total"
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                labels = f'provider="{provider}"'
+                if error_class:
+                    labels += f',error_class="{error_class}"'
+                lines.append(f"{metric}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, fmt: str = "json", path: Optional[Path] = None) -> Path:
+        """Write a snapshot ("json" or "prometheus") under APP_DIR and return its path."""
+        if fmt == "prometheus":
+            text = self.to_prometheus()
+            path = Path(path or METRICS_DIR / "metrics.prom")
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+            path = Path(path or METRICS_DIR / "metrics.json")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        tmp_path.replace(path)
+        logger.info(f"Metrics written to {path}")
+        return path
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Get the shared per-process metrics registry."""
+    return _metrics
+
+
+def export_metrics() -> Optional[Path]:
+    """Write the snapshot in the format set by "metrics_export" in config.json (empty disables)."""
+    fmt = APP_CONFIG.get("metrics_export", "json")
+    if not fmt or not _metrics.snapshot()["providers"]:
+        return None
+    try:
+        return _metrics.export(fmt)
+    except OSError as e:
+        logger.error(f"Error writing metrics: {e}")
+        return None
@@ -0,0 +1,595 @@
+import json
+import logging
+import sqlite3
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image
+
+from core.blob_store import hash_file
+from core.phash import dhash, PHASH_BANDS, BAND_BITS, BAND_MASK
+
+logger = logging.getLogger(__name__)
+
+# Rows handled per transaction by the background backfill
+BACKFILL_CHUNK_SIZE = 500
+# Pause between backfill chunks so foreground writes get the write lock
+BACKFILL_PAUSE = 0.05
+# content_hash value for rows whose file could not be read, so they aren't retried forever
+HASH_UNAVAILABLE = ""
+
+
+def _seeded(task: str, ref: str) -> str:
+    """Trigger condition: row `ref` (new/old) is already part of the table `task` seeds.
+
+    Rows that existed when a derived table was created are added to it in the
+    background (see _queue_seed); until then the delete and update triggers
+    must leave them alone, or they would take out what was never put in.
+    """
+    return (f"NOT EXISTS (SELECT 1 FROM backfill_tasks WHERE task = '{task}' "
+            f"AND {ref}.id > done_id AND {ref}.id <= max_id)")
+
+
+def _queue_seed(conn: sqlite3.Connection, task: str):
+    """Leave adding the existing rows to a new derived table to the background backfill."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS backfill_tasks (
+        task TEXT PRIMARY KEY,
+        done_id INTEGER NOT NULL,   -- rows up to here are seeded
+        max_id INTEGER NOT NULL     -- rows above are kept in sync by the triggers
+    )
+    ''')
+    conn.execute('''
+    INSERT OR REPLACE INTO backfill_tasks (task, done_id, max_id)
+    SELECT ?, 0, MAX(id) FROM images HAVING COUNT(*) > 0
+    ''', (task,))
+
+
+def _create_images(conn: sqlite3.Connection):
+    """Base history table and the indexes used for newest-first listing."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        prompt TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        width INTEGER,
+        height INTEGER,
+        extra_data TEXT
+    )
+    ''')
+
+    # Newest-first listing walks this index instead of sorting the table;
+    # id breaks ties between rows created in the same second
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_images_created_at_id
+    ON images (created_at, id)
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_images_provider_created_at
+    ON images (provider, created_at)
+    ''')
+
+
+def _create_fts(conn: sqlite3.Connection):
+    """FTS5 prompt index kept in sync by triggers (skipped when FTS5 is unavailable)."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'images_fts'"
+    ).fetchone()
+    if exists:
+        return
+
+    try:
+        # External-content table: the prompt text lives only in images
+        conn.execute('''
+        CREATE VIRTUAL TABLE images_fts USING fts5(
+            prompt,
+            content='images',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 unavailable, prompt search falls back to LIKE: {e}")
+        return
+
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+        INSERT INTO images_fts (rowid, prompt) VALUES (new.id, new.prompt);
+    END
+    ''')
+    # Removing a row that was never indexed would corrupt the index, hence the guards
+    _queue_seed(conn, "fts")
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images
+    WHEN {_seeded("fts", "old")} BEGIN
+        INSERT INTO images_fts (images_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE OF prompt ON images
+    WHEN {_seeded("fts", "old")} BEGIN
+        INSERT INTO images_fts (images_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+        INSERT INTO images_fts (rowid, prompt) VALUES (new.id, new.prompt);
+    END
+    ''')
+    # Prompts stored before the table existed are indexed by the background backfill
+
+
+def _add_typed_columns(conn: sqlite3.Connection):
+    """Typed columns for what used to go into extra_data; filled for old rows by backfill()."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(images)")}
+    for name, column_type in (
+        ("content_hash", "TEXT"),     # sha256 of the image file
+        ("file_size", "INTEGER"),     # bytes
+        ("latency_ms", "REAL"),       # provider call time
+        ("seed", "INTEGER"),
+        ("thumbnail_ref", "TEXT"),    # key of the cached thumbnail
+    ):
+        if name not in columns:
+            # ADD COLUMN only touches the schema, not the rows, so it is instant on large tables
+            conn.execute(f"ALTER TABLE images ADD COLUMN {name} {column_type}")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_content_hash ON images (content_hash)")
+
+
+def _create_blobs(conn: sqlite3.Connection):
+    """Refcounted image files, one row per distinct content_hash, kept in sync by triggers."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS blobs (
+        content_hash TEXT PRIMARY KEY,
+        filepath TEXT NOT NULL,
+        file_size INTEGER,
+        refcount INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''')
+    # Lets a delete check whether any other row still points at a file
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_filepath ON images (filepath)")
+
+    # Rows without a hash (not backfilled yet, or file unreadable) are counted once backfill sets it
+    _queue_seed(conn, "blobs")
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS blobs_ref_insert AFTER INSERT ON images
+    WHEN new.content_hash IS NOT NULL AND new.content_hash != '' BEGIN
+        INSERT INTO blobs (content_hash, filepath, file_size, refcount)
+        VALUES (new.content_hash, new.filepath, new.file_size, 1)
+        ON CONFLICT (content_hash) DO UPDATE SET refcount = refcount + 1;
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS blobs_ref_delete AFTER DELETE ON images
+    WHEN old.content_hash IS NOT NULL AND old.content_hash != '' AND {_seeded("blobs", "old")} BEGIN
+        UPDATE blobs SET refcount = refcount - 1 WHERE content_hash = old.content_hash;
+        DELETE FROM blobs WHERE content_hash = old.content_hash AND refcount <= 0;
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS blobs_ref_update AFTER UPDATE OF content_hash ON images
+    WHEN old.content_hash IS NOT new.content_hash AND {_seeded("blobs", "old")} BEGIN
+        UPDATE blobs SET refcount = refcount - 1
+        WHERE content_hash = old.content_hash AND old.content_hash != '';
+        DELETE FROM blobs WHERE content_hash = old.content_hash AND refcount <= 0;
+        INSERT INTO blobs (content_hash, filepath, file_size, refcount)
+        SELECT new.content_hash, new.filepath, new.file_size, 1
+        WHERE new.content_hash IS NOT NULL AND new.content_hash != ''
+        ON CONFLICT (content_hash) DO UPDATE SET refcount = refcount + 1;
+    END
+    ''')
+    # The rows hashed so far are counted by the background backfill
+
+
+def _add_phash(conn: sqlite3.Connection):
+    """Perceptual hash column plus the multi-index table used to find similar images."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(images)")}
+    if "phash" not in columns:
+        conn.execute("ALTER TABLE images ADD COLUMN phash INTEGER")  # 64-bit dHash, see core.phash
+    # Keeps the backfill's "still missing" lookups off a full table scan
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_phash_missing ON images (id) WHERE phash IS NULL")
+
+    # One row per (band, 16-bit slice of the hash, image): looking up the bands of a
+    # query hash finds every candidate within the search radius without a table scan
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS phash_bands (
+        band INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        image_id INTEGER NOT NULL,
+        PRIMARY KEY (band, value, image_id)
+    ) WITHOUT ROWID
+    ''')
+
+    def band_rows(ref: str) -> str:
+        return ", ".join(
+            f"({band}, ({ref}.phash >> {band * BAND_BITS}) & {BAND_MASK}, {ref}.id)"
+            for band in range(PHASH_BANDS)
+        )
+
+    def band_match(ref: str) -> str:
+        return " OR ".join(
+            f"(band = {band} AND value = ({ref}.phash >> {band * BAND_BITS}) & {BAND_MASK} AND image_id = {ref}.id)"
+            for band in range(PHASH_BANDS)
+        )
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS phash_bands_insert AFTER INSERT ON images
+    WHEN new.phash IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO phash_bands (band, value, image_id) VALUES {band_rows("new")};
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS phash_bands_delete AFTER DELETE ON images
+    WHEN old.phash IS NOT NULL BEGIN
+        DELETE FROM phash_bands WHERE {band_match("old")};
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS phash_bands_update AFTER UPDATE OF phash ON images
+    WHEN old.phash IS NOT new.phash BEGIN
+        DELETE FROM phash_bands WHERE {band_match("old")};
+        INSERT OR IGNORE INTO phash_bands (band, value, image_id)
+        SELECT * FROM (VALUES {band_rows("new")}) WHERE new.phash IS NOT NULL;
+    END
+    ''')
+
+
+def _add_file_presence(conn: sqlite3.Connection):
+    """Cached "is the file still on disk" flag and the list of files no row points at."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(images)")}
+    if "file_present" not in columns:
+        # Maintained by core.reconciler so listing history never stats the disk
+        conn.execute("ALTER TABLE images ADD COLUMN file_present INTEGER NOT NULL DEFAULT 1")
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS orphan_files (
+        filepath TEXT PRIMARY KEY,
+        found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _rollup_add(ref: str) -> str:
+    """Trigger statement adding row `ref` (new/old) to its usage_rollup bucket."""
+    return f'''
+        INSERT INTO usage_rollup (day, provider, size, image_count, total_bytes, latency_sum, latency_count)
+        VALUES (COALESCE(date({ref}.created_at), ''), {ref}.provider, COALESCE({ref}.width || 'x' || {ref}.height, ''),
+                1, COALESCE({ref}.file_size, 0), COALESCE({ref}.latency_ms, 0), {ref}.latency_ms IS NOT NULL)
+        ON CONFLICT (day, provider, size) DO UPDATE SET
+            image_count = image_count + 1,
+            total_bytes = total_bytes + excluded.total_bytes,
+            latency_sum = latency_sum + excluded.latency_sum,
+            latency_count = latency_count + excluded.latency_count;'''
+
+
+def _rollup_remove(ref: str) -> str:
+    """Trigger statements taking row `ref` back out of its usage_rollup bucket."""
+    bucket = (f"day = COALESCE(date({ref}.created_at), '') AND provider = {ref}.provider "
+              f"AND size = COALESCE({ref}.width || 'x' || {ref}.height, '')")
+    return f'''
+        UPDATE usage_rollup SET
+            image_count = image_count - 1,
+            total_bytes = total_bytes - COALESCE({ref}.file_size, 0),
+            latency_sum = latency_sum - COALESCE({ref}.latency_ms, 0),
+            latency_count = latency_count - ({ref}.latency_ms IS NOT NULL)
+        WHERE {bucket};
+        DELETE FROM usage_rollup WHERE {bucket} AND image_count <= 0;'''
+
+
+def _create_usage_rollup(conn: sqlite3.Connection):
+    """Per day/provider/size totals, kept current by triggers so stats never scan images."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS usage_rollup (
+        day TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        size TEXT NOT NULL,             -- "WxH", '' when unknown
+        image_count INTEGER NOT NULL,
+        total_bytes INTEGER NOT NULL,
+        latency_sum REAL NOT NULL,      -- ms, over the latency_count rows that have a latency
+        latency_count INTEGER NOT NULL,
+        PRIMARY KEY (day, provider, size)
+    ) WITHOUT ROWID
+    ''')
+
+    # Existing rows are summed in by the background backfill
+    conn.execute("DELETE FROM usage_rollup")
+    _queue_seed(conn, "usage_rollup")
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS usage_rollup_insert AFTER INSERT ON images BEGIN
+        {_rollup_add("new")}
+    END
+    ''')
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS usage_rollup_delete AFTER DELETE ON images
+    WHEN {_seeded("usage_rollup", "old")} BEGIN
+        {_rollup_remove("old")}
+    END
+    ''')
+    # The backfill fills file_size and latency_ms in after the insert
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS usage_rollup_update
+    AFTER UPDATE OF created_at, provider, width, height, file_size, latency_ms ON images
+    WHEN {_seeded("usage_rollup", "old")} BEGIN
+        {_rollup_remove("old")}
+        {_rollup_add("new")}
+    END
+    ''')
+
+
+def _create_import_progress(conn: sqlite3.Connection):
+    """Committed manifest chunks per archive, so an interrupted import resumes where it stopped."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS import_progress (
+        archive_id TEXT PRIMARY KEY,
+        chunks_done INTEGER NOT NULL,
+        rows_imported INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def _create_backfill_tasks(conn: sqlite3.Connection):
+    """Seeding progress of derived tables (see _queue_seed); for databases whose seeding ran inline."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS backfill_tasks (
+        task TEXT PRIMARY KEY,
+        done_id INTEGER NOT NULL,
+        max_id INTEGER NOT NULL
+    )
+    ''')
+
+
+# (version, description, step); each step runs in its own transaction and must be idempotent
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "images table and listing indexes", _create_images),
+    (2, "full-text prompt index", _create_fts),
+    (3, "typed metadata columns", _add_typed_columns),
+    (4, "refcounted image blobs", _create_blobs),
+    (5, "perceptual hash index", _add_phash),
+    (6, "file presence and orphaned files", _add_file_presence),
+    (7, "usage statistics rollup", _create_usage_rollup),
+    (8, "archive import progress", _create_import_progress),
+    (9, "background seeding of derived tables", _create_backfill_tasks),
+]
+
+# Statement adding rows done_id < id <= upper of images to each derived table, as
+# the triggers would have; run chunk by chunk by _seed_derived
+SEED_STATEMENTS = {
+    "fts": '''
+    INSERT INTO images_fts (rowid, prompt)
+    SELECT id, prompt FROM images WHERE id > ? AND id <= ?
+    ''',
+    "blobs": '''
+    INSERT INTO blobs (content_hash, filepath, file_size, refcount)
+    SELECT content_hash, MIN(filepath), MAX(file_size), COUNT(*) FROM images
+    WHERE id > ? AND id <= ? AND content_hash IS NOT NULL AND content_hash != ''
+    GROUP BY content_hash
+    ON CONFLICT (content_hash) DO UPDATE SET refcount = refcount + excluded.refcount
+    ''',
+    "usage_rollup": '''
+    INSERT INTO usage_rollup (day, provider, size, image_count, total_bytes, latency_sum, latency_count)
+    SELECT COALESCE(date(created_at), ''), provider, COALESCE(width || 'x' || height, ''),
+           COUNT(*), COALESCE(SUM(file_size), 0), COALESCE(SUM(latency_ms), 0), COUNT(latency_ms)
+    FROM images
+    WHERE id > ? AND id <= ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, provider, size) DO UPDATE SET
+        image_count = image_count + excluded.image_count,
+        total_bytes = total_bytes + excluded.total_bytes,
+        latency_sum = latency_sum + excluded.latency_sum,
+        latency_count = latency_count + excluded.latency_count
+    ''',
+}
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_seeds(conn: sqlite3.Connection) -> List[str]:
+    """Derived tables whose existing rows the background backfill hasn't added yet."""
+    try:
+        return [row[0] for row in conn.execute("SELECT task FROM backfill_tasks")]
+    except sqlite3.OperationalError:
+        return []  # schema older than v2
+
+
+def migrate(conn: sqlite3.Connection, write_lock: threading.RLock) -> int:
+    """Bring the schema up to SCHEMA_VERSION; return the version it started from.
+
+    Steps only change the schema, so they are quick on any size of history;
+    filling new tables from the existing rows is left to backfill().
+    The connection must be in autocommit mode (isolation_level=None).
+    """
+    start_version = get_version(conn)
+    if start_version > SCHEMA_VERSION:
+        logger.warning(f"Database schema v{start_version} is newer than this app (v{SCHEMA_VERSION})")
+        return start_version
+
+    for version, description, step in MIGRATIONS:
+        if version <= start_version:
+            continue
+        with write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if get_version(conn) < version:
+                    step(conn)
+                    conn.execute(f"PRAGMA user_version = {version}")
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        logger.info(f"Database migrated to v{version}: {description}")
+
+    return start_version
+
+
+def _parse_extra(extra_data: Optional[str]) -> Tuple[Optional[int], Optional[float]]:
+    """Seed and latency from the legacy extra_data JSON, when present."""
+    if not extra_data:
+        return None, None
+    try:
+        extra = json.loads(extra_data)
+    except ValueError:
+        return None, None
+    if not isinstance(extra, dict):
+        return None, None
+
+    try:
+        seed = int(extra["seed"]) if extra.get("seed") is not None else None
+    except (TypeError, ValueError):
+        seed = None
+    try:
+        if extra.get("latency_ms") is not None:
+            latency_ms = float(extra["latency_ms"])
+        elif extra.get("latency") is not None:
+            latency_ms = float(extra["latency"]) * 1000  # seconds
+        else:
+            latency_ms = None
+    except (TypeError, ValueError):
+        latency_ms = None
+    return seed, latency_ms
+
+
+def backfill(db, stop_event: threading.Event, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """Fill the columns added by later schema versions for older rows; return rows updated.
+
+    Runs in the background, one short transaction per chunk, so the UI can
+    keep reading and writing meanwhile. Files are read outside the transactions.
+    """
+    updated = _seed_derived(db, stop_event, chunk_size)
+    updated += _backfill_metadata(db, stop_event, chunk_size)
+    updated += _backfill_phash(db, stop_event, chunk_size)
+    return updated
+
+
+def _seed_derived(db, stop_event: threading.Event, chunk_size: int) -> int:
+    """Add the rows that predate a derived table (FTS index, blobs, rollup) to it, a chunk at a time.
+
+    Each chunk moves the task's done_id forward in the same transaction, so
+    the triggers start covering those rows exactly when they are seeded; the
+    task row is deleted once it reaches max_id.
+    """
+    conn = db._connection()
+    seeded = 0
+    for task in pending_seeds(conn):
+        while not stop_event.is_set():
+            with db._transaction() as write_conn:
+                done_id, max_id = write_conn.execute(
+                    "SELECT done_id, max_id FROM backfill_tasks WHERE task = ?", (task,)
+                ).fetchone()
+                row = write_conn.execute('''
+                SELECT MAX(id), COUNT(*) FROM (
+                    SELECT id FROM images WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                )
+                ''', (done_id, max_id, chunk_size)).fetchone()
+                upper = max_id if row[1] < chunk_size else row[0]
+                write_conn.execute(SEED_STATEMENTS[task], (done_id, upper))
+                if upper >= max_id:
+                    write_conn.execute("DELETE FROM backfill_tasks WHERE task = ?", (task,))
+                else:
+                    write_conn.execute("UPDATE backfill_tasks SET done_id = ? WHERE task = ?", (upper, task))
+            seeded += row[1]
+            if upper >= max_id:
+                logger.info(f"Seeded {task} from existing history")
+                if task == "fts":
+                    db.fts_enabled = True
+                break
+            stop_event.wait(BACKFILL_PAUSE)
+    return seeded
+
+
+def _backfill_metadata(db, stop_event: threading.Event, chunk_size: int) -> int:
+    """Hash, size, seed and latency for the content_hash IS NULL rows, in id order."""
+    from core.db import CHANGE_UPDATE  # core.db imports this module
+    conn = db._connection()
+    updated = 0
+    last_id = 0
+    while not stop_event.is_set():
+        rows = conn.execute('''
+        SELECT id, filepath, extra_data, seed, latency_ms FROM images
+        WHERE content_hash IS NULL AND id > ?
+        ORDER BY id
+        LIMIT ?
+        ''', (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+
+        values = []
+        for row in rows:
+            try:
+                content_hash, file_size = hash_file(row["filepath"])
+            except OSError:
+                content_hash, file_size = HASH_UNAVAILABLE, None
+            seed, latency_ms = _parse_extra(row["extra_data"])
+            values.append((
+                content_hash,
+                file_size,
+                row["seed"] if row["seed"] is not None else seed,
+                row["latency_ms"] if row["latency_ms"] is not None else latency_ms,
+                row["id"]
+            ))
+
+        with db._transaction() as write_conn:
+            write_conn.executemany('''
+            UPDATE images SET content_hash = ?, file_size = ?, seed = ?, latency_ms = ?
+            WHERE id = ? AND content_hash IS NULL
+            ''', values)
+        db._notify_changes(CHANGE_UPDATE, (value[-1] for value in values))
+
+        updated += len(values)
+        last_id = rows[-1]["id"]
+        stop_event.wait(BACKFILL_PAUSE)
+
+    if updated:
+        logger.info(f"Backfilled metadata for {updated} images")
+    return updated
+
+
+def _backfill_phash(db, stop_event: threading.Event, chunk_size: int) -> int:
+    """Perceptual hashes for readable rows that don't have one yet.
+
+    Rows sharing a content hash are decoded once. Files that fail to decode
+    keep a NULL phash and are tried again on the next start.
+    """
+    from core.db import CHANGE_UPDATE  # core.db imports this module
+    conn = db._connection()
+    updated = 0
+    last_id = 0
+    while not stop_event.is_set():
+        rows = conn.execute('''
+        SELECT id, filepath, content_hash FROM images
+        WHERE phash IS NULL AND content_hash != '' AND id > ?
+        ORDER BY id
+        LIMIT ?
+        ''', (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+
+        hashes = {}
+        values = []
+        for row in rows:
+            if row["content_hash"] not in hashes:
+                try:
+                    with Image.open(row["filepath"]) as image:
+                        hashes[row["content_hash"]] = dhash(image)
+                except (OSError, ValueError) as e:
+                    logger.debug(f"Cannot hash {row['filepath']}: {e}")
+                    hashes[row["content_hash"]] = None
+            if hashes[row["content_hash"]] is not None:
+                values.append((hashes[row["content_hash"]], row["id"]))
+
+        with db._transaction() as write_conn:
+            write_conn.executemany("UPDATE images SET phash = ? WHERE id = ? AND phash IS NULL", values)
+        db._notify_changes(CHANGE_UPDATE, (image_id for _, image_id in values))
+
+        updated += len(values)
+        last_id = rows[-1]["id"]
+        stop_event.wait(BACKFILL_PAUSE)
+
+    if updated:
+        logger.info(f"Backfilled perceptual hashes for {updated} images")
+    return updated
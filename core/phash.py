@@ -0,0 +1,63 @@
+import logging
+from itertools import combinations
+from typing import List, Set
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# dHash compares each pixel of a (HASH_SIZE+1) x HASH_SIZE grayscale thumbnail with its right neighbour
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# The hash is split into this many bands for the multi-index lookup; two hashes
+# within distance r always agree on some band to within r // PHASH_BANDS bits
+PHASH_BANDS = 4
+BAND_BITS = HASH_BITS // PHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Hamming distance treated as "similar" by default (out of 64 bits)
+DEFAULT_MAX_DISTANCE = 8
+# Larger radii would need so many band variants that a full scan is cheaper
+MAX_SEARCH_DISTANCE = 15
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash of an image, as a signed integer so SQLite can store it.
+
+    Resizing, recompression and small edits change only a few bits, so
+    near-duplicates end up a small Hamming distance apart.
+    """
+    # BOX is the cheapest filter that still averages every source pixel
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX, reducing_gap=2.0)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin((a ^ b) & ((1 << HASH_BITS) - 1)).count("1")
+
+
+def band_value(phash: int, band: int) -> int:
+    """The 16-bit slice of a hash used as key for one band (matches the SQL triggers)."""
+    return (phash >> (band * BAND_BITS)) & BAND_MASK
+
+
+def band_neighbours(value: int, radius: int) -> List[int]:
+    """Every band value within `radius` bit flips of `value`, itself included."""
+    values: Set[int] = {value}
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flips):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            values.add(flipped)
+    return sorted(values)
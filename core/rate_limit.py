@@ -0,0 +1,81 @@
+import time
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from core.settings import APP_CONFIG
+
+# Default provider quotas as requests per minute plus burst size.
+# Overridable through the "rate_limits" key in config.json.
+DEFAULT_RATE_LIMITS = {
+    "openai": {"per_minute": 5, "burst": 5},        # DALL-E image quota on low usage tiers
+    "stability": {"per_minute": 900, "burst": 150},  # 150 requests per 10 seconds
+    "gemini": {"per_minute": 15, "burst": 15},      # Gemini free tier RPM
+}
+
+
+class TokenBucket:
+    """Asyncio token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until `tokens` are available and take them."""
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Per-provider token buckets built from DEFAULT_RATE_LIMITS and config."""
+
+    def __init__(self, limits: Dict[str, Dict[str, float]] = None):
+        self.limits = {**DEFAULT_RATE_LIMITS, **APP_CONFIG.get("rate_limits", {}), **(limits or {})}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, provider: str) -> Optional[TokenBucket]:
+        """Get the bucket for a provider (None means unlimited)."""
+        if provider not in self._buckets:
+            limit = self.limits.get(provider)
+            if not limit:
+                return None
+            self._buckets[provider] = TokenBucket(limit["per_minute"] / 60.0, limit.get("burst", 1))
+        return self._buckets[provider]
+
+    async def acquire(self, provider: str):
+        """Wait for the provider's quota."""
+        bucket = self.bucket(provider)
+        if bucket is not None:
+            await bucket.acquire()
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide limiter every provider request takes its token from.
+
+    Its buckets use asyncio locks, so it is only used from the shared loop
+    thread (see core.async_runner).
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from PIL import Image
+
+from core.settings import APP_DIR, APP_CONFIG
+from core.db import Database, get_database, CHANGE_UPDATE
+from core.blob_store import BLOB_DIR, hash_file
+from core.phash import dhash
+
+logger = logging.getLogger(__name__)
+
+# Overridable with the "reconcile" key in config.json
+DEFAULT_RECONCILE_CONFIG = {
+    "enabled": True,
+    "start_delay": 5,     # seconds after startup before the first scan
+    "interval": 600,      # seconds between scans, 0 to scan only once
+}
+
+# Rows read (and orphans imported) per transaction
+RECONCILE_CHUNK_SIZE = 500
+
+# Files younger than this (seconds) are never reported as orphans: their row may not be committed yet
+ORPHAN_GRACE_PERIOD = 60
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+DATE_DIR_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# "<prompt>_<unix time>[_<suffix>].png", the names the app used for dated folders
+SAVED_NAME_PATTERN = re.compile(r"^(?P<prompt>.*?)_\d{9,}(?:_[0-9a-f]+)?$")
+
+IMPORTED_PROVIDER = "Imported"
+
+
+class ReconcileReport(NamedTuple):
+    scanned_files: int
+    missing: int      # rows whose file disappeared since the last scan
+    restored: int     # rows whose file came back
+    orphans: int      # image files no row points at
+
+
+def _key(path) -> str:
+    """Comparable form of a path (the DB may hold it with different separators or case)."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def get_reconcile_config() -> Dict:
+    return {**DEFAULT_RECONCILE_CONFIG, **(APP_CONFIG.get("reconcile", {}) or {})}
+
+
+class Reconciler:
+    """Keeps images.file_present and the orphan_files table in line with the disk.
+
+    A scan lists the dated save folders and the blob store with os.scandir
+    (names only, no stat per file) and compares them with the filepaths in
+    the database, so the history list never has to touch the disk to know
+    whether a file is there.
+    """
+
+    def __init__(self, db: Database, root=APP_DIR, blob_dir=BLOB_DIR):
+        self.db = db
+        self.root = str(root)
+        self.blob_dir = str(blob_dir)
+        self._scan_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _scan_dirs(self) -> List[str]:
+        """The folders images are saved into: YYYY-MM-DD under the app dir, and the blob shards."""
+        dirs = []
+        for parent, matches in ((self.root, DATE_DIR_PATTERN.match), (self.blob_dir, None)):
+            try:
+                with os.scandir(parent) as it:
+                    for entry in it:
+                        if entry.is_dir() and (matches is None or matches(entry.name)):
+                            dirs.append(entry.path)
+            except FileNotFoundError:
+                continue
+        return dirs
+
+    def _scan_files(self, dirs: List[str]) -> Dict[str, str]:
+        """Image files in the given folders, keyed by _key()."""
+        files = {}
+        for directory in dirs:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                            files[_key(entry.path)] = entry.path
+            except OSError as e:
+                logger.warning(f"Cannot scan {directory}: {e}")
+        return files
+
+    def scan(self) -> ReconcileReport:
+        """Compare the database with the disk and record the differences."""
+        with self._scan_lock:
+            conn = self.db._connection()
+            # Files are written before their rows, so every row up to here has its file on disk already
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM images").fetchone()[0]
+
+            dirs = self._scan_dirs()
+            scanned_dirs = {_key(directory) for directory in dirs}
+            on_disk = self._scan_files(dirs)
+
+            known: Set[str] = set()
+            changes = []
+            last_id = 0
+            while not self._stop_event.is_set():
+                rows = conn.execute('''
+                SELECT id, filepath, file_present FROM images
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                ''', (last_id, RECONCILE_CHUNK_SIZE)).fetchall()
+                if not rows:
+                    break
+
+                for row in rows:
+                    key = _key(row["filepath"])
+                    known.add(key)
+                    if row["id"] > max_id:
+                        continue  # saved during the scan
+                    if os.path.dirname(key) in scanned_dirs:
+                        present = key in on_disk
+                    else:
+                        # Outside the save folders (e.g. imported from elsewhere): check it directly
+                        present = os.path.exists(row["filepath"])
+                    if present != bool(row["file_present"]):
+                        changes.append((int(present), row["id"]))
+                last_id = rows[-1]["id"]
+            else:
+                return ReconcileReport(len(on_disk), 0, 0, 0)
+
+            with self.db._transaction() as write_conn:
+                # Nothing can be inserted while we hold the write lock; pick up rows added meanwhile
+                known.update(_key(row[0]) for row in write_conn.execute(
+                    "SELECT filepath FROM images WHERE id > ?", (last_id,)
+                ))
+                orphans = [path for key, path in on_disk.items() if key not in known and self._is_orphan(path)]
+
+                write_conn.executemany("UPDATE images SET file_present = ? WHERE id = ?", changes)
+                write_conn.execute("DELETE FROM orphan_files")
+                write_conn.executemany(
+                    "INSERT OR IGNORE INTO orphan_files (filepath) VALUES (?)", ((path,) for path in orphans)
+                )
+
+        self.db._notify_changes(CHANGE_UPDATE, (image_id for _, image_id in changes))
+        restored = sum(present for present, _ in changes)
+        report = ReconcileReport(len(on_disk), len(changes) - restored, restored, len(orphans))
+        if changes or orphans:
+            logger.info(f"Reconciled history with disk: {report.missing} missing, "
+                        f"{report.restored} restored, {report.orphans} orphaned files")
+        return report
+
+    @staticmethod
+    def _is_orphan(path: str) -> bool:
+        """Whether a file without a row really is orphaned, not just saved and about to be recorded."""
+        try:
+            # Deleted together with its row during the scan, or written moments ago
+            return time.time() - os.path.getmtime(path) > ORPHAN_GRACE_PERIOD
+        except OSError:
+            return False
+
+    def orphan_count(self) -> int:
+        """Image files found by the last scan that no history row points at."""
+        return self.db._connection().execute("SELECT COUNT(*) FROM orphan_files").fetchone()[0]
+
+    def reimport_orphans(self) -> int:
+        """Add every orphaned file back to the history; return how many were imported.
+
+        The files stay where they are. The prompt is recovered from the file
+        name where it follows the app's naming, and the file's mtime becomes
+        the creation time so it lands at its original place in the list.
+        """
+        conn = self.db._connection()
+        imported = 0
+        while not self._stop_event.is_set():
+            paths = [row[0] for row in conn.execute(
+                "SELECT filepath FROM orphan_files LIMIT ?", (RECONCILE_CHUNK_SIZE,)
+            )]
+            if not paths:
+                break
+
+            rows = [row for row in (self._import_row(path) for path in paths) if row is not None]
+            # Drop the orphan entries first, so a file that cannot be read is not retried forever
+            with self.db._transaction() as write_conn:
+                write_conn.executemany("DELETE FROM orphan_files WHERE filepath = ?", ((path,) for path in paths))
+            self.db.add_images(rows)
+            imported += len(rows)
+
+        if imported:
+            logger.info(f"Re-imported {imported} orphaned images")
+        return imported
+
+    @staticmethod
+    def _import_row(filepath: str) -> Optional[Dict]:
+        """History row for an image file found on disk, or None if it can't be read."""
+        try:
+            content_hash, file_size = hash_file(filepath)
+            with Image.open(filepath) as image:
+                width, height = image.size
+                phash = dhash(image)
+            mtime = os.path.getmtime(filepath)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable orphan {filepath}: {e}")
+            return None
+
+        stem = os.path.splitext(os.path.basename(filepath))[0]
+        match = SAVED_NAME_PATTERN.match(stem)
+        if match:
+            prompt = match.group("prompt").replace("_", " ").strip()
+        else:
+            # Blob store names are just the hash
+            prompt = "" if stem == content_hash else stem
+        return {
+            "prompt": prompt or "Imported image",
+            "filename": os.path.basename(filepath),
+            "filepath": filepath,
+            "provider": IMPORTED_PROVIDER,
+            "created_at": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S"),
+            "width": width,
+            "height": height,
+            "content_hash": content_hash,
+            "file_size": file_size,
+            "phash": phash
+        }
+
+    def start(self):
+        """Scan in a background thread now and then, as set by the "reconcile" config."""
+        config = get_reconcile_config()
+        if not config["enabled"] or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(config,), name="reconciler", daemon=True)
+        self._thread.start()
+
+    def _run(self, config: Dict):
+        delay = config["start_delay"]
+        while not self._stop_event.wait(delay):
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"Error reconciling history with disk: {e}")
+            if not config["interval"]:
+                return
+            delay = config["interval"]
+
+    def stop(self):
+        """Stop the background thread (an interrupted scan writes nothing)."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+_reconciler: Optional[Reconciler] = None
+_reconciler_lock = threading.Lock()
+
+
+def get_reconciler() -> Reconciler:
+    """Get the shared reconciler for the default database."""
+    global _reconciler
+    with _reconciler_lock:
+        if _reconciler is None:
+            _reconciler = Reconciler(get_database())
+        return _reconciler
@@ -0,0 +1,204 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+import requests
+
+from core.settings import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Error classes, used for retry decisions and reporting
+CLIENT_ERROR = "client"          # 4xx other than 408/429 - the request itself is wrong
+RATE_LIMITED = "rate_limited"    # 429
+SERVER_ERROR = "server"          # 5xx / 408
+NETWORK_ERROR = "network"        # connect/read failures and timeouts
+INVALID_RESPONSE = "invalid_response"  # 200 but no usable image
+CIRCUIT_OPEN = "circuit_open"
+
+RETRYABLE_CLASSES = {RATE_LIMITED, SERVER_ERROR, NETWORK_ERROR}
+# Failures that suggest the provider itself is unhealthy
+BREAKER_CLASSES = {SERVER_ERROR, NETWORK_ERROR}
+
+
+class ProviderError(Exception):
+    """An error response from an image provider."""
+
+    def __init__(self, message: str, provider: str = None, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error: BaseException) -> str:
+    """Sort an exception into one of the error classes above."""
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN
+    if isinstance(error, ProviderError) and error.status_code is not None:
+        if error.status_code == 429:
+            return RATE_LIMITED
+        if error.status_code == 408 or error.status_code >= 500:
+            return SERVER_ERROR
+        return CLIENT_ERROR
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError,
+                          ConnectionError, TimeoutError)):
+        return NETWORK_ERROR
+    return INVALID_RESPONSE
+
+
+class RetryPolicy:
+    """Decides whether and how long to wait before retrying a provider call.
+
+    Only rate limits, server errors and network failures are retried.
+    Retry-After is honoured (up to max_delay), otherwise the delay is
+    exponential backoff with jitter.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 2.0,
+                 max_delay: float = 30.0,
+                 jitter: float = 0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter  # fraction of the delay that is randomised
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        """Build a policy from the "retry" key in config.json."""
+        return cls(**(APP_CONFIG.get("retry", {}) or {}))
+
+    def should_retry(self, attempt: int, error: BaseException) -> bool:
+        """Whether another attempt should follow failed attempt number `attempt` (1-based)."""
+        return attempt < self.max_attempts and classify_error(error) in RETRYABLE_CLASSES
+
+    def delay(self, attempt: int, error: BaseException = None) -> float:
+        """Seconds to wait after failed attempt number `attempt` (1-based)."""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        delay = min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
+        return delay * (1 - self.jitter * random.random())
+
+    @staticmethod
+    def sleep(delay: float, cancel_event: threading.Event = None) -> bool:
+        """Wait for `delay` seconds; return False if cancelled meanwhile."""
+        if cancel_event is None:
+            time.sleep(delay)
+            return True
+        return not cancel_event.wait(delay)
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker.
+
+    After `failure_threshold` consecutive provider-side failures the circuit
+    opens and calls fail fast for `reset_timeout` seconds. Then one trial
+    call is let through (half-open); success closes the circuit again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be made right now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def is_open(self) -> bool:
+        """Whether calls are currently failing fast (does not claim the half-open trial)."""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give up a call without an outcome (e.g. it was cancelled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, error: BaseException):
+        """Count a failure; only provider-side failures can open the circuit."""
+        error_class = classify_error(error)
+        with self._lock:
+            self._trial_in_flight = False
+            if error_class not in BREAKER_CLASSES:
+                # The provider answered, so it is up - a trial call proved that much
+                if self.state == self.HALF_OPEN:
+                    self.state = self.CLOSED
+                    self.failures = 0
+                return
+
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get the shared circuit breaker for a provider."""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider, **(APP_CONFIG.get("circuit_breaker", {}) or {}))
+            _breakers[provider] = breaker
+        return breaker
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from core.api_client import PROVIDER_SIZES
+from core.async_api_client import AsyncAPIClient
+from core.retry import get_circuit_breaker
+from core.settings import APP_CONFIG, DEFAULT_IMAGE_SIZE, get_api_key
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the "routing" key in config.json
+DEFAULT_ROUTING_CONFIG = {
+    "enabled": False,
+    "providers": [],              # fallback providers, in order, after the selected one
+    "hedge_percentile": 0.95,     # hedge once the primary is slower than this percentile
+    "hedge_min_samples": 10,      # latency samples needed before the percentile is trusted
+    "hedge_default_delay": 30.0,  # seconds to wait before hedging until then
+}
+
+
+def get_routing_config() -> Dict:
+    """Effective routing settings."""
+    return {**DEFAULT_ROUTING_CONFIG, **(APP_CONFIG.get("routing", {}) or {})}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        """Latency at the given percentile, or None with too few samples."""
+        with self._lock:
+            if len(self.samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[index]
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(provider: str) -> LatencyTracker:
+    """Get the shared latency tracker for a provider."""
+    with _trackers_lock:
+        if provider not in _trackers:
+            _trackers[provider] = LatencyTracker()
+        return _trackers[provider]
+
+
+def fit_size(provider: str, size: Tuple[int, int]) -> Tuple[int, int]:
+    """Closest size a provider supports: same aspect ratio first, then closest area."""
+    options = [tuple(map(int, s.split("x"))) for s in PROVIDER_SIZES.get(provider, [])]
+    if not options or tuple(size) in options:
+        return tuple(size)
+
+    ratio = size[0] / size[1]
+    area = size[0] * size[1]
+    return min(options, key=lambda o: (round(abs(o[0] / o[1] - ratio), 2), abs(o[0] * o[1] - area)))
+
+
+class ProviderRouter:
+    """Routes a generation across an ordered list of providers.
+
+    The primary provider is tried first. If it hasn't answered by its
+    latency percentile threshold, the next provider is started as a hedge
+    and the first result wins (the loser is cancelled). If a provider fails
+    outright, or its circuit is open, the next one takes over.
+    """
+
+    def __init__(self,
+                 clients: List[AsyncAPIClient],
+                 hedge_percentile: float = None,
+                 hedge_min_samples: int = None,
+                 hedge_default_delay: float = None):
+        config = get_routing_config()
+        self.clients = clients
+        self.hedge_percentile = hedge_percentile or config["hedge_percentile"]
+        self.hedge_min_samples = hedge_min_samples or config["hedge_min_samples"]
+        self.hedge_default_delay = hedge_default_delay or config["hedge_default_delay"]
+
+    @classmethod
+    def from_config(cls, primary: AsyncAPIClient) -> "ProviderRouter":
+        """Primary client first, then the configured fallbacks that have an API key (see the settings dialog)."""
+        config = get_routing_config()
+
+        clients = [primary]
+        for provider in config["providers"]:
+            provider = provider.lower()
+            api_key = get_api_key(provider)
+            if provider == primary.provider or not api_key:
+                continue
+            clients.append(AsyncAPIClient(
+                api_key=api_key,
+                provider=provider,
+                endpoints=primary.endpoints,
+                cache=primary.cache,
+                retry_policy=primary.retry_policy
+            ))
+        return cls(clients)
+
+    def hedge_delay(self, provider: str) -> float:
+        """How long to give a provider before hedging to the next one."""
+        delay = get_latency_tracker(provider).percentile(self.hedge_percentile, self.hedge_min_samples)
+        return delay if delay is not None else self.hedge_default_delay
+
+    async def route(self,
+                    prompt: str,
+                    size: Tuple[int, int] = DEFAULT_IMAGE_SIZE,
+                    negative_prompt: str = None,
+                    count: int = 1,
+                    bypass_cache: bool = False) -> Tuple[Optional[str], List[Image.Image]]:
+        """Generate with hedging and failover; return (provider, images)."""
+        pending = [c for c in self.clients if not get_circuit_breaker(c.provider).is_open()]
+        if not pending:
+            logger.error("No provider available for routing")
+            return None, []
+
+        loop = asyncio.get_running_loop()
+        running: Dict[asyncio.Task, AsyncAPIClient] = {}
+        latest: Optional[AsyncAPIClient] = None
+        delay = 0.0
+        hedge_at = 0.0  # loop time at which the latest attempt gets a hedge
+
+        def start_next():
+            nonlocal latest, delay, hedge_at
+            if not pending:
+                return
+            latest = pending.pop(0)
+            task = asyncio.create_task(self._timed(latest, prompt, size, negative_prompt, count, bypass_cache))
+            running[task] = latest
+            # Fixed when the attempt starts, so an earlier attempt failing meanwhile doesn't push it back
+            delay = self.hedge_delay(latest.provider)
+            hedge_at = loop.time() + delay
+
+        start_next()
+        try:
+            while running:
+                # Only wait for the latency threshold while there is someone left to hedge to
+                timeout = max(0.0, hedge_at - loop.time()) if pending else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    logger.info(f"{latest.provider} slower than {delay:.1f}s, hedging to next provider")
+                    start_next()
+                    continue
+
+                for task in done:
+                    client = running.pop(task)
+                    images = task.result() if not task.exception() else []
+                    if images:
+                        return client.provider, images
+                    logger.warning(f"Provider {client.provider} failed, failing over")
+
+                if not running:
+                    start_next()
+        finally:
+            # Cancel the losers
+            for task in running:
+                task.cancel()
+
+        logger.error("All providers failed")
+        return None, []
+
+    async def _timed(self,
+                     client: AsyncAPIClient,
+                     prompt: str,
+                     size: Tuple[int, int],
+                     negative_prompt: str,
+                     count: int,
+                     bypass_cache: bool) -> List[Image.Image]:
+        """Run one provider and record its latency when it succeeds."""
+        start = time.monotonic()
+        images = await client.generate_images(
+            prompt, fit_size(client.provider, size), negative_prompt, count=count, bypass_cache=bypass_cache
+        )
+        if images:
+            get_latency_tracker(client.provider).record(time.monotonic() - start)
+        return images
@@ -2,7 +2,6 @@ import os
 import json
 import datetime
 import logging
-import sqlite3
 import sys
 from pathlib import Path
 
@@ -109,6 +108,7 @@ def save_setting(key, value):
     config[json_key] = value
     
     # Also update in memory
+    APP_CONFIG[json_key] = value
     global AI_API_KEY, API_PROVIDER, DARK_MODE
     if json_key == "api_key":
         AI_API_KEY = value
@@ -128,6 +128,24 @@ def save_setting(key, value):
         
     return result
 
+# API key of one provider
+def get_api_key(provider):
+    """Get the API key saved for a provider, falling back to the main key for the selected provider"""
+    provider = provider.lower()
+    api_keys = APP_CONFIG.get("api_keys", {}) or {}
+    if api_keys.get(provider):
+        return api_keys[provider]
+    if provider == str(APP_CONFIG.get("api_provider", "")).lower():
+        return APP_CONFIG.get("api_key", "")
+    return ""
+
+# Save the API key of one provider
+def save_api_key(provider, api_key):
+    """Save a provider's API key alongside the others, so routing can fall back to it"""
+    api_keys = dict(get_config("api_keys", {}) or {})
+    api_keys[provider.lower()] = api_key
+    return save_setting("api_keys", api_keys)
+
 # Load initial configuration
 APP_CONFIG = load_config()
 
@@ -157,24 +175,7 @@ save_env_variable = save_to_env
 
 # Database settings
 def initialize_db():
-    """Initialize the database with necessary tables."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Create images table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS images (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        prompt TEXT NOT NULL,
-        filename TEXT NOT NULL,
-        filepath TEXT NOT NULL,
-        provider TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        width INTEGER,
-        height INTEGER,
-        extra_data TEXT
-    )
-    ''')
-    
-    conn.commit()
-    conn.close() 
\ No newline at end of file
+    """Initialize the database (creates or migrates the schema)."""
+    # The schema lives in core.migrations; imported here to avoid a circular import
+    from core.db import get_database
+    get_database(DB_PATH) 
\ No newline at end of file
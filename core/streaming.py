@@ -0,0 +1,130 @@
+import re
+import time
+import base64
+import logging
+import tempfile
+from typing import BinaryIO, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Decoded images up to this size stay in memory, larger ones spill to a temp file
+SPOOL_MAX_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Only the tail of the non-image JSON needs to be kept to find a key split across chunks
+_SEARCH_TAIL = 256
+
+
+def spooled_buffer() -> BinaryIO:
+    """Default sink for decoded images."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+
+class Base64StreamDecoder:
+    """Incrementally decodes base64 JSON string values while a response downloads.
+
+    Feed raw response chunks with feed(); every string value of `field`
+    (e.g. "b64_json") is decoded in 4-character blocks straight into its own
+    sink, so the JSON text, the base64 text and the raw bytes never all
+    exist in memory at once. `prefix` is a regex the JSON right before the
+    key must match, for field names that also occur outside image parts.
+    """
+
+    def __init__(self, field: str, sink_factory: Callable[[], BinaryIO] = spooled_buffer, prefix: bytes = b""):
+        self.field = field
+        self.sink_factory = sink_factory
+        self.outputs: List[BinaryIO] = []
+        self._key_pattern = re.compile(prefix + rb'"' + re.escape(field.encode("ascii")) + rb'"\s*:\s*"')
+        self._search = b""     # unparsed JSON while looking for the next field
+        self._carry = b""      # base64 characters not yet forming a full 4-char block
+        self._escape = False   # previous chunk ended in a backslash
+        self._sink: Optional[BinaryIO] = None
+        self.decode_seconds = 0.0  # time spent in feed(), to tell decoding apart from downloading
+
+    def feed(self, chunk: bytes):
+        """Consume the next chunk of the response body."""
+        start = time.perf_counter()
+        while chunk:
+            if self._sink is None:
+                chunk = self._find_field(chunk)
+            else:
+                chunk = self._read_value(chunk)
+        self.decode_seconds += time.perf_counter() - start
+
+    def _find_field(self, chunk: bytes) -> bytes:
+        """Look for the next `"field": "` and return what follows it."""
+        data = self._search + chunk
+        match = self._key_pattern.search(data)
+        if match is None:
+            self._search = data[-_SEARCH_TAIL:]
+            return b""
+
+        self._search = b""
+        self._sink = self.sink_factory()
+        return data[match.end():]
+
+    def _read_value(self, chunk: bytes) -> bytes:
+        """Decode base64 until the closing quote; return the bytes after it."""
+        end = chunk.find(b'"')
+        value = chunk if end < 0 else chunk[:end]
+
+        # JSON may escape "/" as "\/" and break long strings with "\n"
+        if b"\\" in value or self._escape:
+            value = self._unescape(value)
+
+        self._write(self._carry + value)
+
+        if end < 0:
+            return b""
+
+        self._close_value()
+        return chunk[end + 1:]
+
+    def _unescape(self, value: bytes) -> bytes:
+        """Strip JSON escapes from a piece of base64 text."""
+        if self._escape:
+            value = b"\\" + value
+            self._escape = False
+        if value.endswith(b"\\") and not value.endswith(b"\\\\"):
+            # Escape sequence split across chunks, finish it with the next one
+            value = value[:-1]
+            self._escape = True
+        return value.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+
+    def _write(self, text: bytes):
+        """Decode every complete 4-character block and keep the rest."""
+        usable = len(text) - len(text) % 4
+        if usable:
+            self._sink.write(base64.b64decode(text[:usable]))
+        self._carry = text[usable:]
+
+    def _close_value(self):
+        """Finish the current value and rewind its sink."""
+        if self._carry:
+            # Tolerate missing padding on the final block
+            self._sink.write(base64.b64decode(self._carry + b"=" * (-len(self._carry) % 4)))
+            self._carry = b""
+        self._sink.seek(0)
+        self.outputs.append(self._sink)
+        self._sink = None
+
+    def finish(self) -> List[BinaryIO]:
+        """Return one rewound sink per decoded value."""
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+            raise Exception(f"Response ended inside the \"{self.field}\" value")
+        if not self.outputs:
+            raise Exception("No image found in response")
+        return self.outputs
+
+
+def decode_base64_stream(chunks: Iterable[bytes],
+                         field: str,
+                         sink_factory: Callable[[], BinaryIO] = spooled_buffer,
+                         prefix: bytes = b"") -> List[BinaryIO]:
+    """Decode every `field` value from an iterable of response chunks."""
+    decoder = Base64StreamDecoder(field, sink_factory, prefix)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.finish()
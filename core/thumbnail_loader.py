@@ -0,0 +1,124 @@
+import heapq
+import logging
+import threading
+from itertools import count
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Decoder threads; Pillow releases the GIL while decoding and resizing, so threads scale
+DEFAULT_LOADER_WORKERS = 2
+# Results finished within this window reach the Tk thread in one after() callback
+DEFAULT_BATCH_DELAY_MS = 30
+
+
+class ThumbnailLoader:
+    """Runs thumbnail decodes on background threads, most urgent first.
+
+    request() queues a key with a priority (lower runs sooner) and asking
+    again just re-prioritises it; cancel() drops keys that are no longer
+    needed before a worker gets to them. load(item) runs on a worker and its
+    results are handed to on_ready([(key, result), ...]) on the Tk thread,
+    grouped into batches through widget.after(). A load that fails delivers
+    None.
+    """
+
+    def __init__(self, load: Callable[[Any], Any], widget, on_ready: Callable[[List[Tuple[Hashable, Any]]], None],
+                 workers: int = DEFAULT_LOADER_WORKERS, batch_delay_ms: int = DEFAULT_BATCH_DELAY_MS):
+        self.load = load
+        self.widget = widget
+        self.on_ready = on_ready
+        self.batch_delay_ms = batch_delay_ms
+        self._heap: List[Tuple[int, int, Hashable, Any]] = []
+        self._queued: Dict[Hashable, Tuple[int, int]] = {}  # key -> (priority, sequence) of its live entry
+        self._sequence = count()
+        self._ready: List[Tuple[Hashable, Any]] = []
+        self._flush_scheduled = False
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"thumbnail-loader-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, key: Hashable, item: Any, priority: int = 0):
+        """Queue item for loading, or move it to a new priority if it is queued already."""
+        with self._condition:
+            queued = self._queued.get(key)
+            if queued is not None and queued[0] == priority:
+                return
+            # The old heap entry (if any) stays behind and is skipped when popped
+            sequence = next(self._sequence)
+            self._queued[key] = (priority, sequence)
+            heapq.heappush(self._heap, (priority, sequence, key, item))
+            self._condition.notify()
+
+    def is_queued(self, key: Hashable) -> bool:
+        with self._condition:
+            return key in self._queued
+
+    def cancel(self, key: Hashable):
+        """Forget a queued key (a load already running still delivers)."""
+        with self._condition:
+            self._queued.pop(key, None)
+
+    def cancel_all(self):
+        with self._condition:
+            self._queued.clear()
+            self._heap.clear()
+
+    def _next(self) -> Optional[Tuple[Hashable, Any]]:
+        with self._condition:
+            while True:
+                while not self._heap and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return None
+                priority, sequence, key, item = heapq.heappop(self._heap)
+                if self._queued.get(key) == (priority, sequence):
+                    del self._queued[key]
+                    return key, item
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            key, item = job
+            try:
+                result = self.load(item)
+            except Exception as e:
+                logger.error(f"Error loading thumbnail {key}: {e}")
+                result = None
+            self._deliver(key, result)
+
+    def _deliver(self, key: Hashable, result: Any):
+        with self._condition:
+            self._ready.append((key, result))
+            if self._flush_scheduled or self._closed:
+                return
+            self._flush_scheduled = True
+        try:
+            self.widget.after(self.batch_delay_ms, self._flush)
+        except RuntimeError:
+            pass  # Tk is shutting down
+
+    def _flush(self):
+        """Hand everything finished so far to on_ready (runs on the Tk thread)."""
+        with self._condition:
+            batch, self._ready = self._ready, []
+            self._flush_scheduled = False
+        if batch:
+            self.on_ready(batch)
+
+    def close(self):
+        """Stop the workers; queued loads are dropped."""
+        with self._condition:
+            self._closed = True
+            self._heap.clear()
+            self._queued.clear()
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
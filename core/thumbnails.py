@@ -0,0 +1,120 @@
+import os
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, features
+
+from core.settings import APP_DIR
+from core.blob_store import _atomic_write
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = APP_DIR / "thumbnails"
+# Longest side of a history thumbnail, in pixels
+THUMBNAIL_SIZE = 150
+# WebP keeps alpha and is ~30% smaller than JPEG; fall back when Pillow lacks it
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_SUFFIX = ".webp" if THUMBNAIL_FORMAT == "WEBP" else ".jpg"
+THUMBNAIL_QUALITY = 80
+
+
+def thumbnail_key(content_hash: Optional[str] = None, filepath: Optional[str] = None) -> Optional[str]:
+    """Cache key for an image: its content hash, or its path and mtime when it has none yet.
+
+    Content-hash keys never go stale (an edited image is a new hash), and
+    identical images share one thumbnail.
+    """
+    if content_hash:
+        return f"{content_hash}_{THUMBNAIL_SIZE}"
+    if filepath:
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+        digest = hashlib.sha256(f"{filepath}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8")).hexdigest()
+        return f"p{digest[:40]}_{THUMBNAIL_SIZE}"
+    return None
+
+
+def make_thumbnail(image: Image.Image) -> Image.Image:
+    """Downscaled copy of an image in a mode the thumbnail format can store."""
+    # Lets a JPEG that isn't decoded yet decode at reduced scale; a no-op for PNG or loaded images
+    image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    thumb = image.copy()
+    thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    has_alpha = thumb.mode in ("RGBA", "LA") or (thumb.mode == "P" and "transparency" in thumb.info)
+    if has_alpha and THUMBNAIL_FORMAT == "WEBP":
+        return thumb.convert("RGBA")
+    return thumb.convert("RGB")
+
+
+class ThumbnailStore:
+    """Small encoded thumbnails for the history list, stored once per image under <root>/ab/<key>."""
+
+    def __init__(self, root: Path = THUMBNAIL_DIR):
+        self.root = Path(root)
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{THUMBNAIL_SUFFIX}"
+
+    def put(self, key: str, image: Image.Image) -> str:
+        """Store the thumbnail of an image already in memory (e.g. right after generating it)."""
+        path = self.path_for(key)
+        if not path.exists():
+            thumb = make_thumbnail(image)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write(path, lambda f: thumb.save(f, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY))
+        return key
+
+    def load(self, item: Dict[str, Any]) -> Tuple[Optional[Image.Image], Optional[str]]:
+        """Thumbnail for a history row, and the key it is stored under.
+
+        Reads the cached file when the row has a thumbnail_ref; otherwise
+        (or if that file is gone) builds it from the original once. Compare
+        the key with item["thumbnail_ref"] to know whether to record it.
+        Returns (None, None) when the original can't be read either.
+        """
+        ref = item.get("thumbnail_ref")
+        if ref:
+            try:
+                with Image.open(self.path_for(ref)) as cached:
+                    cached.load()
+                    return cached, ref
+            except (OSError, ValueError):
+                pass  # removed or damaged, rebuild below
+
+        key = thumbnail_key(item.get("content_hash"), item["filepath"])
+        if key is None:
+            return None, None
+        try:
+            with Image.open(item["filepath"]) as original:
+                self.put(key, original)
+            with Image.open(self.path_for(key)) as cached:
+                cached.load()
+                return cached, key
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot build thumbnail for {item['filepath']}: {e}")
+            return None, None
+
+    def remove(self, key: str):
+        """Drop a cached thumbnail (missing ones are ignored)."""
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+
+_store: Optional[ThumbnailStore] = None
+_store_lock = threading.Lock()
+
+
+def get_thumbnail_store() -> ThumbnailStore:
+    """Get the shared per-process thumbnail store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ThumbnailStore()
+        return _store
@@ -5,6 +5,12 @@ from pathlib import Path
 
 from ui.main_window import MainWindow
 from core.settings import ensure_dirs, DB_PATH
+from core.metrics import export_metrics
+from core.db import close_databases
+from core.reconciler import get_reconciler
+from core.async_runner import get_loop_thread
+from core.async_api_client import close_async_clients
+from core.http_pool import close_sessions
 
 # Configure logging
 logging.basicConfig(
@@ -39,18 +45,74 @@ def setup_app():
         # Running as a bundled executable
         logger.info(f"Running from PyInstaller bundle: {sys._MEIPASS}")
 
+def stop_async_loop():
+    """Close the pooled async HTTP client on its loop, then stop the loop thread."""
+    loop_thread = get_loop_thread()
+    try:
+        loop_thread.submit(close_async_clients()).result(timeout=5)
+    except Exception as e:
+        logger.exception(f"Error closing async HTTP clients: {str(e)}")
+    finally:
+        loop_thread.stop()
+
+def on_close(app):
+    """Window close: stop the async loop while Tk still exists, so no callback lands on a destroyed window.
+
+    Destroying the window also stops the history tab's search and thumbnail
+    threads, before shutdown() closes the databases they read from.
+    """
+    try:
+        stop_async_loop()
+    finally:
+        app.destroy()
+
+def shutdown(reconciler=None):
+    """Stop background work and save state; each step runs even if an earlier one failed."""
+    try:
+        if reconciler is not None:
+            reconciler.stop()
+    except Exception as e:
+        logger.exception(f"Error stopping the reconciler: {str(e)}")
+    
+    try:
+        # Release the pooled keep-alive connections
+        close_sessions()
+    except Exception as e:
+        logger.exception(f"Error closing HTTP sessions: {str(e)}")
+    
+    try:
+        # Leave a timing snapshot behind for this session
+        export_metrics()
+    except Exception as e:
+        logger.exception(f"Error exporting metrics: {str(e)}")
+    
+    # Last: flushes pending writes once nothing else uses the databases
+    try:
+        close_databases()
+    except Exception as e:
+        logger.exception(f"Error closing databases: {str(e)}")
+
 def main():
     """Application entry point."""
+    reconciler = None
     try:
         # Setup
         setup_app()
         
         # Start the UI
         app = MainWindow()
+        app.protocol("WM_DELETE_WINDOW", lambda: on_close(app))
+        
+        # Keep the history's file status in line with the disk in the background
+        reconciler = get_reconciler()
+        reconciler.start()
+        
         app.mainloop()
     except Exception as e:
         logger.exception(f"Unhandled exception: {str(e)}")
         raise
+    finally:
+        shutdown(reconciler)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
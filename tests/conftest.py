@@ -0,0 +1,102 @@
+import base64
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from core.api_client import APIClient
+from core.http_pool import close_sessions
+from core.settings import APP_CONFIG
+
+
+def png_bytes(color: str = "red", size=(8, 8)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST like the OpenAI images endpoint, over keep-alive connections."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        # The client side of the connection: one port per TCP connection
+        self.server.client_ports.append(self.client_address[1])
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        if status == 200:
+            data = base64.b64encode(png_bytes()).decode()
+            body = json.dumps({"data": [{"b64_json": data}]}).encode()
+        else:
+            body = json.dumps({"error": "stub"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Local HTTP server standing in for a provider; set `statuses` to fail the next requests."""
+    monkeypatch.setitem(APP_CONFIG, "generation_cache", False)
+    close_sessions()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.client_ports = []
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    close_sessions()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_client(stub_server):
+    """Factory for APIClients that send OpenAI requests to the stub server."""
+    url = f"http://127.0.0.1:{stub_server.server_address[1]}/v1/images/generations"
+
+    def make(**kwargs) -> APIClient:
+        return APIClient(api_key="test", provider="openai", endpoints={"openai": url}, **kwargs)
+
+    return make
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path, monkeypatch):
+    """Point the app's data directory, and the stores kept under it, at tmp_path."""
+    from core import blob_store, generation_cache, metrics, settings, thumbnails
+    root = tmp_path / "App_Data"
+    monkeypatch.setattr(settings, "APP_DIR", root)
+    monkeypatch.setattr(settings, "SAVE_DIR", root / "save")
+    monkeypatch.setattr(settings, "CONFIG_FILE", root / "config.json")
+    monkeypatch.setattr(settings, "DB_PATH", root / "history.db")
+    monkeypatch.setattr(metrics, "METRICS_DIR", root / "metrics")
+    monkeypatch.setattr(blob_store, "_store", blob_store.BlobStore(tmp_path / "images"))
+    monkeypatch.setattr(thumbnails, "_store", thumbnails.ThumbnailStore(tmp_path / "thumbnails"))
+    monkeypatch.setattr(generation_cache, "_cache", generation_cache.GenerationCache(root / "cache"))
+    return root
+
+
+@pytest.fixture
+def stores():
+    """The blob store, under tmp_path (see app_dir)."""
+    from core import blob_store
+    return blob_store.get_blob_store()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh history database under tmp_path."""
+    from core.db import Database
+    database = Database(str(tmp_path / "history.db"))
+    yield database
+    database.close()
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+from PIL import Image
+
+from core import archive, blob_store
+from core.archive import export_history, import_history
+from core.db import Database
+from core.history_writer import save_generated
+
+COMPARED_COLUMNS = ("prompt", "provider", "width", "height", "content_hash", "file_size", "latency_ms", "phash")
+
+
+class _StopAfter(threading.Event):
+    """Stop event that reports set after a number of checks, to interrupt an import mid-way."""
+
+    def __init__(self, checks: int):
+        super().__init__()
+        self.checks = checks
+
+    def is_set(self) -> bool:
+        self.checks -= 1
+        return self.checks < 0
+
+
+@pytest.fixture
+def source(stores, db):
+    """History of 9 rows over 7 distinct images, exported from a database of its own."""
+    colors = ["red", "green", "blue", "white", "black", "yellow", "purple"]
+    for index, color in enumerate(colors + colors[:2]):
+        save_generated([Image.new("RGB", (16 + index % 7, 16), color)], f"{color} square {index}", "openai",
+                       latency_ms=100.0 + index, db=db)
+    return db
+
+
+@pytest.fixture
+def target(tmp_path, monkeypatch):
+    """Empty history and blob store on another 'machine'."""
+    monkeypatch.setattr(blob_store, "_store", blob_store.BlobStore(tmp_path / "target_images"))
+    db = Database(str(tmp_path / "target.db"))
+    yield db
+    db.close()
+
+
+def _rows(db: Database) -> list:
+    return sorted(
+        tuple(row) for row in db._connection().execute(
+            f"SELECT {', '.join(COMPARED_COLUMNS)}, created_at FROM images"
+        )
+    )
+
+
+def _files(db: Database) -> dict:
+    return {
+        row["content_hash"]: open(row["filepath"], "rb").read()
+        for row in db._connection().execute("SELECT content_hash, filepath FROM images")
+    }
+
+
+def _progress(db: Database):
+    return db._connection().execute("SELECT chunks_done, rows_imported FROM import_progress").fetchone()
+
+
+def test_export_import_round_trip(source, target, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "MANIFEST_CHUNK_SIZE", 4)
+    path = tmp_path / "history.tar"
+
+    exported = export_history(path, db=source, workers=2)
+    assert (exported.rows, exported.files, exported.skipped) == (9, 7, 0)
+
+    imported = import_history(path, db=target, workers=2)
+    assert (imported.rows, imported.files, imported.skipped) == (9, 7, 0)
+    assert _rows(target) == _rows(source)
+    assert _files(target) == _files(source)
+    # Files landed in the target's store, shared where the source shared them
+    assert all(str(tmp_path / "target_images") in item["filepath"] for item in target.get_images_page(20)[0])
+    assert target._connection().execute("SELECT SUM(refcount) FROM blobs").fetchone()[0] == 9
+    assert tuple(_progress(target)) == (3, 9)
+
+    # Importing the same archive again adds nothing
+    again = import_history(path, db=target, workers=2)
+    assert again.rows == 0
+    assert _rows(target) == _rows(source)
+
+
+def test_interrupted_import_resumes_from_progress(source, target, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "MANIFEST_CHUNK_SIZE", 2)
+    path = tmp_path / "history.tar"
+    export_history(path, db=source, workers=2)
+
+    # Header, two chunks with their files, then stop inside the third chunk
+    first = import_history(path, db=target, workers=2, stop_event=_StopAfter(9))
+    chunks_done, rows_imported = _progress(target)
+    assert 0 < chunks_done < 5
+    assert rows_imported == first.rows == len(_rows(target)) == chunks_done * 2
+
+    # Running again skips the committed chunks and finishes the rest
+    second = import_history(path, db=target, workers=2)
+    assert second.rows == 9 - first.rows
+    assert second.skipped == 0
+    assert tuple(_progress(target)) == (5, 9)
+    assert _rows(target) == _rows(source)
+    assert _files(target) == _files(source)
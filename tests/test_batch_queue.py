@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+from PIL import Image
+
+from core.async_api_client import AsyncAPIClient
+from core.batch_queue import BatchQueue, CANCELLED, DONE
+from core.rate_limit import RateLimiter, get_rate_limiter
+
+
+class _FakeClient(AsyncAPIClient):
+    async def generate_image(self, prompt, size=None, negative_prompt=None, bypass_cache=False):
+        return Image.new("RGB", (8, 8))
+
+
+def test_batches_share_the_process_rate_limiter():
+    client = _FakeClient(api_key="test", provider="openai", cache=None)
+    first, second = BatchQueue(client, db=object()), BatchQueue(client, db=object())
+
+    assert first.rate_limiter is second.rate_limiter is get_rate_limiter()
+    assert first.api_client.rate_limiter is get_rate_limiter()
+
+
+def test_cancel_during_save_reports_the_saved_job():
+    client = _FakeClient(api_key="test", provider="openai", cache=None)
+    queue = BatchQueue(client, db=object(), concurrency=2, rate_limiter=RateLimiter({"openai": None}))
+    queue.add_prompts(["saved", "queued"], (8, 8))
+    saving = threading.Event()
+    release = threading.Event()
+
+    def slow_save(job, image, provider, latency_ms=None):
+        saving.set()
+        release.wait(5)
+        job.image_id = 1
+
+    queue._save_job = slow_save
+
+    async def run():
+        batch = asyncio.ensure_future(queue.run())
+        while not saving.is_set():
+            await asyncio.sleep(0.01)
+        queue.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        return await batch
+
+    jobs = asyncio.run(run())
+    assert jobs[0].status == DONE
+    assert jobs[0].image_id == 1
+    assert jobs[1].status in (DONE, CANCELLED)
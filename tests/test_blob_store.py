@@ -0,0 +1,71 @@
+import io
+import os
+
+from PIL import Image
+
+from core.history_writer import save_generated
+from core.thumbnails import get_thumbnail_store
+
+
+def _refcount(db, content_hash):
+    row = db._connection().execute("SELECT refcount FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+    return row[0] if row else None
+
+
+def test_identical_bytes_are_stored_once(stores):
+    first = stores.put(io.BytesIO(b"same bytes"))
+    second = stores.put(io.BytesIO(b"same bytes"))
+
+    assert first.created and not second.created
+    assert first.path == second.path
+    with open(first.path, "rb") as f:
+        assert f.read() == b"same bytes"
+
+
+def test_shared_file_is_removed_with_its_last_row(stores, db):
+    image = Image.new("RGB", (16, 16), "red")
+    (first_id, path), = save_generated([image], "first", "openai", db=db)
+    (second_id, second_path), = save_generated([image.copy()], "second", "openai", db=db)
+    item = db.get_image(first_id)
+    thumbnail = get_thumbnail_store().path_for(item["thumbnail_ref"])
+
+    assert path == second_path
+    assert _refcount(db, item["content_hash"]) == 2
+
+    db.delete_images([first_id])
+    assert os.path.exists(path) and thumbnail.exists()
+    assert _refcount(db, item["content_hash"]) == 1
+
+    db.delete_images([second_id])
+    assert not os.path.exists(path) and not thumbnail.exists()
+    assert _refcount(db, item["content_hash"]) is None
+
+
+def test_pinned_file_survives_remove(stores):
+    blob = stores.put(io.BytesIO(b"pinned"), pin=True)
+    again = stores.put(io.BytesIO(b"pinned"), pin=True)
+
+    assert stores.remove(blob.path) is False
+    stores.release(blob)
+    assert stores.remove(blob.path) is False  # still pinned once
+    assert os.path.exists(blob.path)
+
+    stores.release(again)
+    assert stores.remove(blob.path) is True
+    assert not os.path.exists(blob.path)
+
+
+def test_delete_keeps_file_a_pending_save_is_about_to_reference(stores, db):
+    image = Image.new("RGB", (16, 16), "blue")
+    (image_id, path), = save_generated([image], "original", "openai", db=db)
+
+    # A save of the same image has found the file but not inserted its row yet
+    pending = stores.put_image(image.copy(), pin=True)
+    db.delete_images([image_id])
+    assert os.path.exists(path)
+
+    db.add_image("saved again", "again.png", str(pending.path), "openai",
+                 content_hash=pending.content_hash, file_size=pending.size)
+    stores.release(pending)
+    assert os.path.exists(path)
+    assert _refcount(db, pending.content_hash) == 1
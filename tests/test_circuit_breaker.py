@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from core import retry
+from core.generation_cache import GenerationCache
+from core.retry import CircuitBreaker, RetryPolicy
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers():
+    retry._breakers.clear()
+    yield
+    retry._breakers.clear()
+
+
+def _open(breaker: CircuitBreaker, elapsed: float = 0.0):
+    breaker.state = CircuitBreaker.OPEN
+    breaker.opened_at = time.monotonic() - elapsed
+
+
+def test_open_circuit_still_serves_cached_images(stub_server, stub_client, tmp_path):
+    client = stub_client(cache=GenerationCache(tmp_path))
+    assert client.generate_image("a red square", (256, 256)) is not None
+
+    _open(retry.get_circuit_breaker("openai"))
+    assert client.generate_image("a red square", (256, 256)) is not None
+    assert len(stub_server.client_ports) == 1
+
+    # Anything not cached fails fast without reaching the provider
+    assert client.generate_image("a blue square", (256, 256)) is None
+    assert len(stub_server.client_ports) == 1
+
+
+def test_cache_hit_does_not_close_half_open_circuit(stub_server, stub_client, tmp_path):
+    client = stub_client(cache=GenerationCache(tmp_path))
+    assert client.generate_image("a red square", (256, 256)) is not None
+
+    breaker = retry.get_circuit_breaker("openai")
+    _open(breaker, elapsed=breaker.reset_timeout + 1)
+    assert client.generate_image("a red square", (256, 256)) is not None
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # The first real request is the half-open trial
+    assert client.generate_image("a blue square", (256, 256)) is not None
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_server_errors_open_the_circuit(stub_server, stub_client):
+    client = stub_client(retry_policy=RetryPolicy(max_attempts=1))
+    breaker = retry.get_circuit_breaker("openai")
+    stub_server.statuses = [500] * breaker.failure_threshold
+
+    for _ in range(breaker.failure_threshold):
+        assert client.generate_image("a red square", (256, 256)) is None
+    assert breaker.is_open()
+    assert len(stub_server.client_ports) == breaker.failure_threshold
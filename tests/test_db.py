@@ -0,0 +1,17 @@
+import threading
+
+
+def _query_in_thread(db):
+    thread = threading.Thread(target=lambda: db._connection().execute("SELECT COUNT(*) FROM images").fetchone())
+    thread.start()
+    thread.join()
+
+
+def test_connections_of_ended_threads_are_closed(db):
+    db._connection()
+    for _ in range(5):
+        _query_in_thread(db)
+
+    # Each new thread's connection replaces those of threads that have ended
+    assert len(db._connections) == 2
+    assert threading.current_thread() in db._connections
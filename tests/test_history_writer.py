@@ -0,0 +1,34 @@
+import os
+
+from PIL import Image
+
+from core.history_writer import save_generated
+from core.thumbnails import get_thumbnail_store
+
+
+def test_save_generated_records_images_and_shares_identical_files(stores, db):
+    red, blue = Image.new("RGB", (16, 16), "red"), Image.new("RGB", (16, 16), "blue")
+
+    saved = save_generated([red, blue, red.copy()], "three squares", "openai", 120.0, db=db)
+
+    assert len(saved) == 3
+    (red_id, red_path), (_, blue_path), (_, copy_path) = saved
+    assert red_path == copy_path != blue_path
+    assert os.path.exists(red_path) and os.path.exists(blue_path)
+    assert stores._pins == {}
+
+    item = db.get_image(red_id)
+    assert item["prompt"] == "three squares"
+    assert (item["width"], item["height"]) == (16, 16)
+    assert item["latency_ms"] == 120.0
+    assert item["phash"] is not None
+    assert get_thumbnail_store().path_for(item["thumbnail_ref"]).exists()
+
+
+def test_save_generated_through_write_behind(stores, db):
+    (image_id, filepath), = save_generated([Image.new("RGB", (8, 8), "green")], "Edited image", "Local Edit",
+                                           db=db, filename="edited.png", write_behind=True)
+
+    item = db.get_image(image_id)
+    assert item["filename"] == "edited.png"
+    assert item["filepath"] == filepath
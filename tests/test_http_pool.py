@@ -0,0 +1,23 @@
+from core.http_pool import close_sessions
+
+
+def test_clients_share_pooled_connection(stub_server, stub_client):
+    first, second = stub_client(), stub_client()
+
+    assert first.generate_image("a red square", (256, 256)) is not None
+    assert second.generate_image("a red square", (256, 256)) is not None
+    assert first.generate_image("another red square", (256, 256)) is not None
+
+    # Three requests from two clients, one TCP connection
+    assert len(stub_server.client_ports) == 3
+    assert len(set(stub_server.client_ports)) == 1
+
+
+def test_close_sessions_drops_connections(stub_server, stub_client):
+    client = stub_client()
+
+    assert client.generate_image("a red square", (256, 256)) is not None
+    close_sessions()
+    assert client.generate_image("a red square", (256, 256)) is not None
+
+    assert len(set(stub_server.client_ports)) == 2
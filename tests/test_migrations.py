@@ -0,0 +1,196 @@
+import json
+import sqlite3
+import threading
+
+import pytest
+from PIL import Image
+
+from core import db as db_module
+from core import migrations
+from core.db import Database
+from core.migrations import SCHEMA_VERSION, backfill, migrate, pending_seeds
+
+WORDS = ["cat", "dog", "sunset", "forest", "robot", "ocean"]
+
+
+class _StopAfter(threading.Event):
+    """Stop event that reports set after a number of checks, to interrupt backfill mid-way."""
+
+    def __init__(self, checks: int):
+        super().__init__()
+        self.checks = checks
+
+    def is_set(self) -> bool:
+        self.checks -= 1
+        return self.checks < 0
+
+
+@pytest.fixture(autouse=True)
+def manual_backfill(monkeypatch):
+    """Let the tests run backfill() themselves, without pauses."""
+    monkeypatch.setattr(migrations, "BACKFILL_PAUSE", 0)
+    monkeypatch.setattr(db_module, "backfill", lambda db, stop_event: 0)
+
+
+def _baseline_db(tmp_path, rows: int = 30) -> str:
+    """History database with the schema from before migrations, pointing at real image files."""
+    files = []
+    for index, color in enumerate(["red", "green", "blue", "white"]):
+        path = tmp_path / f"{color}.png"
+        Image.new("RGB", (16 + index, 16), color).save(path)
+        files.append(str(path))
+    files.append(str(tmp_path / "missing.png"))
+
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        prompt TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        width INTEGER,
+        height INTEGER,
+        extra_data TEXT
+    )
+    ''')
+    conn.executemany(
+        "INSERT INTO images (prompt, filename, filepath, provider, created_at, width, height, extra_data) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                f"{WORDS[i % 6]} and {WORDS[(i * 5 + 1) % 6]}",
+                f"image_{i}.png",
+                files[i % len(files)],
+                ["openai", "stability", "gemini"][i % 3],
+                f"2024-01-{1 + i % 4:02d} 10:00:{i % 60:02d}",
+                512 if i % 2 else 1024,
+                512 if i % 2 else 1024,
+                json.dumps({"latency": i % 4, "seed": i}) if i % 3 else None,
+            )
+            for i in range(rows)
+        ]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _fresh_copy(source: Database, tmp_path) -> Database:
+    """The rows of `source` inserted into a new database, so only the triggers fill the derived tables."""
+    rows = [dict(row) for row in source._connection().execute("SELECT * FROM images ORDER BY id")]
+    fresh = Database(str(tmp_path / "fresh.db"))
+    fresh.add_images(rows)
+    return fresh
+
+
+def _derived(db: Database) -> dict:
+    """Contents of the trigger-maintained tables, keyed so they compare across databases."""
+    conn = db._connection()
+    conn.execute("INSERT INTO images_fts (images_fts) VALUES ('integrity-check')")
+    return {
+        "fts": {
+            word: sorted(row[0] for row in conn.execute(
+                "SELECT i.filename FROM images_fts JOIN images i ON i.id = images_fts.rowid "
+                "WHERE images_fts MATCH ?", (word,)
+            ))
+            for word in WORDS
+        },
+        "blobs": conn.execute(
+            "SELECT content_hash, file_size, refcount FROM blobs ORDER BY content_hash"
+        ).fetchall(),
+        "usage_rollup": conn.execute(
+            "SELECT day, provider, size, image_count, total_bytes, latency_sum, latency_count "
+            "FROM usage_rollup WHERE image_count > 0 ORDER BY day, provider, size"
+        ).fetchall(),
+        "phash_bands": conn.execute(
+            "SELECT band, value, i.filename FROM phash_bands JOIN images i ON i.id = image_id "
+            "ORDER BY band, value, i.filename"
+        ).fetchall(),
+    }
+
+
+def _as_tuples(derived: dict) -> dict:
+    return {name: value if name == "fts" else [tuple(row) for row in value] for name, value in derived.items()}
+
+
+def test_baseline_database_matches_fresh_insert(tmp_path):
+    db = Database(_baseline_db(tmp_path))
+    conn = db._connection()
+    assert migrations.get_version(conn) == SCHEMA_VERSION
+    assert sorted(pending_seeds(conn)) == ["blobs", "fts", "usage_rollup"]
+    assert not db.fts_enabled  # LIKE until the index covers the old prompts
+
+    backfill(db, threading.Event())
+    assert pending_seeds(conn) == []
+    assert db.fts_enabled
+    assert conn.execute("SELECT COUNT(*) FROM images WHERE content_hash IS NULL").fetchone()[0] == 0
+    # Latency and seed moved out of the legacy JSON
+    assert tuple(conn.execute("SELECT latency_ms, seed FROM images WHERE id = 2").fetchone()) == (1000.0, 1)
+
+    fresh = _fresh_copy(db, tmp_path)
+    derived = _as_tuples(_derived(db))
+    assert derived == _as_tuples(_derived(fresh))
+    assert derived["blobs"] and derived["usage_rollup"] and derived["phash_bands"]
+    fresh.close()
+    db.close()
+
+
+def test_new_database_has_nothing_to_seed(tmp_path):
+    db = Database(str(tmp_path / "new.db"))
+    conn = db._connection()
+    assert migrations.get_version(conn) == SCHEMA_VERSION
+    assert pending_seeds(conn) == []
+    assert db.fts_enabled
+    db.close()
+
+
+def test_migrate_twice_is_a_no_op(tmp_path):
+    db = Database(_baseline_db(tmp_path))
+    conn = db._connection()
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    tasks = conn.execute("SELECT * FROM backfill_tasks ORDER BY task").fetchall()
+
+    assert migrate(conn, db._write_lock) == SCHEMA_VERSION
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    assert conn.execute("SELECT * FROM backfill_tasks ORDER BY task").fetchall() == tasks
+    db.close()
+
+    # Opening again neither re-queues nor repeats anything
+    db = Database(db.db_path)
+    assert db._connection().execute("SELECT * FROM backfill_tasks ORDER BY task").fetchall() == tasks
+    backfill(db, threading.Event())
+    fresh = _fresh_copy(db, tmp_path)
+    assert _as_tuples(_derived(db)) == _as_tuples(_derived(fresh))
+    fresh.close()
+    db.close()
+
+
+def test_backfill_resumes_after_interruption(tmp_path):
+    db = Database(_baseline_db(tmp_path, rows=40))
+    conn = db._connection()
+    backfill(db, _StopAfter(3), chunk_size=4)
+    progress = dict(conn.execute("SELECT task, done_id FROM backfill_tasks").fetchall())
+    assert progress and all(done_id < 40 for done_id in progress.values())
+
+    # Changes while seeding is half done: rows on both sides of done_id
+    with db._transaction() as write_conn:
+        write_conn.execute("DELETE FROM images WHERE id IN (2, 30, 31)")
+        write_conn.execute("UPDATE images SET prompt = 'robot ocean' WHERE id IN (3, 35)")
+        write_conn.execute("UPDATE images SET provider = 'openai', width = 256, height = 256 WHERE id = 36")
+    db.add_image("cat sunset", "image_new.png", str(tmp_path / "red.png"), "gemini",
+                 width=16, height=16, created_at="2024-01-02 11:00:00")
+    db.close()
+
+    db = Database(db.db_path)
+    conn = db._connection()
+    assert dict(conn.execute("SELECT task, done_id FROM backfill_tasks").fetchall()) == progress
+    backfill(db, threading.Event(), chunk_size=4)
+    assert pending_seeds(conn) == []
+
+    fresh = _fresh_copy(db, tmp_path)
+    assert _as_tuples(_derived(db)) == _as_tuples(_derived(fresh))
+    fresh.close()
+    db.close()
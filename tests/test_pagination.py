@@ -0,0 +1,68 @@
+import pytest
+
+
+def _add(db, created_at_list):
+    return db.add_images([
+        {"prompt": f"image {i}", "filename": f"{i}.png", "filepath": f"/images/{i}.png",
+         "provider": "openai", "created_at": created_at}
+        for i, created_at in enumerate(created_at_list)
+    ])
+
+
+def _walk(db, limit):
+    """Every page from the first, as lists of ids."""
+    pages = []
+    cursor = None
+    while True:
+        items, cursor = db.get_images_page(limit, cursor)
+        pages.append([item["id"] for item in items])
+        if cursor is None:
+            return pages
+
+
+def test_empty_history(db):
+    assert db.get_images_page(10) == ([], None)
+    assert db.get_images_at(0, 10) == []
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 5, 12, 13])
+def test_rows_with_equal_created_at(db, limit):
+    # Many rows created in the same second: id breaks the tie
+    ids = _add(db, ["2024-01-01 10:00:00"] * 8 + ["2024-01-02 09:00:00"] * 4)
+    expected = ids[8:][::-1] + ids[:8][::-1]
+
+    pages = _walk(db, limit)
+
+    assert [image_id for page in pages for image_id in page] == expected
+    assert all(len(page) == limit for page in pages[:-1])
+    assert len(pages[-1]) < limit  # the last page (empty when the total divides evenly) ends the walk
+
+
+def test_last_page(db):
+    ids = _add(db, [f"2024-01-01 10:00:{second:02d}" for second in range(7)])
+
+    first, cursor = db.get_images_page(5)
+    last, end = db.get_images_page(5, cursor)
+
+    assert [item["id"] for item in first + last] == ids[::-1]
+    assert len(last) == 2 and end is None
+
+
+def test_pages_match_offset_reads(db):
+    _add(db, ["2024-01-01 10:00:00", "2024-01-03 10:00:00", "2024-01-02 10:00:00"] * 5)
+
+    pages = _walk(db, 4)
+
+    for index, page in enumerate(pages):
+        assert [item["id"] for item in db.get_images_at(index * 4, 4)] == page
+
+
+def test_rows_added_while_paging_are_not_repeated(db):
+    _add(db, ["2024-01-01 10:00:00"] * 6)
+    first, cursor = db.get_images_page(3)
+
+    _add(db, ["2024-01-05 10:00:00", "2024-01-01 10:00:00"])
+    rest, _ = db.get_images_page(10, cursor)
+
+    seen = [item["id"] for item in first + rest]
+    assert len(seen) == len(set(seen)) == 6
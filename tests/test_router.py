@@ -0,0 +1,55 @@
+import asyncio
+
+from PIL import Image
+
+from core import settings
+from core.async_api_client import AsyncAPIClient
+from core.router import ProviderRouter
+
+
+class _FakeClient:
+    """Provider that answers (images, or a failure) after a fixed time."""
+
+    def __init__(self, provider: str, seconds: float, succeed: bool):
+        self.provider = provider
+        self.seconds = seconds
+        self.succeed = succeed
+        self.started_at = None
+
+    async def generate_images(self, prompt, size, negative_prompt=None, count=1, bypass_cache=False):
+        self.started_at = asyncio.get_running_loop().time()
+        await asyncio.sleep(self.seconds)
+        return [Image.new("RGB", size)] if self.succeed else []
+
+
+def test_hedge_deadline_survives_earlier_failures():
+    slow = _FakeClient("hedge-slow", 5.0, succeed=True)
+    failing = _FakeClient("hedge-failing", 0.3, succeed=False)
+    fast = _FakeClient("hedge-fast", 0.0, succeed=True)
+    router = ProviderRouter([slow, failing, fast], hedge_default_delay=0.4)
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        provider, images = await router.route("a red square", (64, 64))
+        return provider, images, start
+
+    provider, images, start = asyncio.run(run())
+
+    assert provider == "hedge-fast" and len(images) == 1
+    assert failing.started_at - start < 0.55
+    # The third attempt is due 0.4s after the second started, not 0.4s after it failed
+    assert fast.started_at - failing.started_at < 0.55
+
+
+def test_fallback_uses_per_provider_and_main_keys(monkeypatch):
+    monkeypatch.setitem(settings.APP_CONFIG, "api_provider", "gemini")
+    monkeypatch.setitem(settings.APP_CONFIG, "api_key", "main-key")
+    monkeypatch.setitem(settings.APP_CONFIG, "api_keys", {"stability": "stability-key"})
+    monkeypatch.setitem(settings.APP_CONFIG, "routing", {"providers": ["stability", "gemini", "openai"]})
+    primary = AsyncAPIClient(api_key="openai-key", provider="openai", cache=False)
+
+    router = ProviderRouter.from_config(primary)
+
+    assert [(c.provider, c.api_key) for c in router.clients] == [
+        ("openai", "openai-key"), ("stability", "stability-key"), ("gemini", "main-key")
+    ]
@@ -0,0 +1,83 @@
+import pytest
+
+from core.db import Database, _MATCH_END, _MATCH_START
+
+PROMPTS = [
+    "A red cat sat on the red mat",
+    "black and white cat",
+    "a dog in the rain",
+    "Phố cổ Hà Nội lúc hoàng hôn",
+    "café terrace at night",
+]
+
+
+@pytest.fixture
+def history(db):
+    for index, prompt in enumerate(PROMPTS):
+        db.add_image(prompt, f"image_{index}.png", f"/images/{index}.png", "openai")
+    return db
+
+
+def _prompts(results):
+    return sorted(item["prompt"] for item in results)
+
+
+def test_fts_query_quotes_every_term():
+    assert Database._fts_query('cat NEAR(dog) -"robot" col:x ^y*') == (
+        '"cat" AND "NEAR" AND "dog" AND "robot" AND "col" AND "x" AND ("y" OR "y"*)'
+    )
+    assert Database._fts_query("red ca") == '"red" AND ("ca" OR "ca"*)'
+    assert Database._fts_query('" * ( ) : ^ -') == ""
+
+
+@pytest.mark.parametrize("term", [
+    '"', 'cat"', '"cat', "AND", "OR OR", "NOT cat", "NEAR(", "*", "cat*dog", "col:cat",
+    "-cat", "^cat", ")(", "'; DROP TABLE images; --", "{prompt}: cat", "",
+])
+def test_operators_and_quotes_are_plain_text(history, term):
+    history.search_images(term)
+    assert history.count_images() == len(PROMPTS)
+
+
+def test_operator_words_are_searched_as_words(history):
+    # "AND" is the word "and" (as a prefix, being last), not an operator
+    assert _prompts(history.search_images("cat AND")) == ["black and white cat"]
+    # No prompt has the word "or", so this finds nothing instead of cats or dogs
+    assert history.search_images("cat OR dog") == []
+    assert _prompts(history.search_images("NOT dog")) == []
+
+
+def test_every_word_must_match_and_last_word_is_a_prefix(history):
+    assert _prompts(history.search_images("red cat")) == ["A red cat sat on the red mat"]
+    assert _prompts(history.search_images("ca")) == ["A red cat sat on the red mat", "black and white cat",
+                                                     "café terrace at night"]
+    assert history.search_images("ca rain") == []
+
+
+def test_diacritics_are_folded(history):
+    assert _prompts(history.search_images("ha noi")) == ["Phố cổ Hà Nội lúc hoàng hôn"]
+    assert _prompts(history.search_images("Hà Nội")) == ["Phố cổ Hà Nội lúc hoàng hôn"]
+    assert _prompts(history.search_images("cafe")) == ["café terrace at night"]
+
+
+def test_match_spans_point_at_the_matched_words(history):
+    item, = history.search_images("red")
+    assert item["match_spans"] == [(2, 5), (21, 24)]
+
+    item, = history.search_images("red ma")
+    assert [item["prompt"][start:end] for start, end in item["match_spans"]] == ["red", "red", "mat"]
+
+    item, = history.search_images("pho noi")
+    assert [item["prompt"][start:end] for start, end in item["match_spans"]] == ["Phố", "Nội"]
+
+
+def test_match_spans_from_markers():
+    highlighted = f"{_MATCH_START}ab{_MATCH_END} cd {_MATCH_START}é{_MATCH_END}"
+    assert Database._match_spans(highlighted) == [(0, 2), (6, 7)]
+    assert Database._match_spans("no markers") == []
+
+
+def test_like_fallback_without_fts(history):
+    history.fts_enabled = False
+    assert _prompts(history.search_images("red m")) == ["A red cat sat on the red mat"]
+    assert "match_spans" not in history.search_images("red m")[0]
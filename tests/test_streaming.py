@@ -0,0 +1,89 @@
+import base64
+import io
+import json
+
+import pytest
+
+from core.api_client import APIClient
+from core.streaming import Base64StreamDecoder, decode_base64_stream
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _decode(body: bytes, field: str, size: int, prefix: bytes = b"") -> list:
+    buffers = decode_base64_stream(_chunks(body, size), field, sink_factory=io.BytesIO, prefix=prefix)
+    return [buffer.read() for buffer in buffers]
+
+
+# 0xfb 0xff 0xbf encodes to "+/+/": slashes to escape in every block
+PAYLOAD = bytes(range(256)) + b"\xfb\xff\xbf" * 50
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64, 100000])
+def test_chunk_boundaries(size):
+    body = json.dumps({"data": [{"b64_json": base64.b64encode(PAYLOAD).decode()}]}).encode()
+    assert _decode(body, "b64_json", size) == [PAYLOAD]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 64])
+def test_json_escapes(size):
+    encoded = base64.b64encode(PAYLOAD).decode()
+    # Escaped slashes plus line breaks, as some JSON encoders write long base64
+    text = "\\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76)).replace("/", "\\/")
+    assert "\\/" in text
+    body = b'{"artifacts": [{"base64": "' + text.encode() + b'", "seed": 1}]}'
+    assert _decode(body, "base64", size) == [PAYLOAD]
+
+
+def test_missing_padding():
+    encoded = base64.b64encode(b"abcd").decode().rstrip("=")
+    body = json.dumps({"b64_json": encoded}).encode()
+    assert _decode(body, "b64_json", 1) == [b"abcd"]
+
+
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_multiple_samples(size):
+    samples = [b"first sample", bytes(range(100)), b"\xfb\xff\xbf" * 10]
+    body = json.dumps({"created": 1, "data": [
+        {"b64_json": base64.b64encode(sample).decode(), "revised_prompt": "a \"quoted\" prompt"}
+        for sample in samples
+    ]}).encode()
+    assert _decode(body, "b64_json", size) == samples
+
+
+def _gemini_decode(body: dict, size: int) -> list:
+    decoder = APIClient._stream_decoder("gemini")
+    decoder.sink_factory = io.BytesIO
+    for chunk in _chunks(json.dumps(body).encode(), size):
+        decoder.feed(chunk)
+    return [buffer.read() for buffer in decoder.finish()]
+
+
+@pytest.mark.parametrize("size", [1, 4, 64])
+def test_gemini_text_parts_before_image(size):
+    body = {
+        "candidates": [{"content": {"parts": [
+            {"text": "Here is your image; its data follows"},
+            {"inlineData": {"mimeType": "text/plain", "data": base64.b64encode(b"not an image").decode()}},
+            {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(PAYLOAD).decode()}},
+        ]}}],
+        "usageMetadata": {"data": base64.b64encode(b"metadata").decode()},
+    }
+    assert _gemini_decode(body, size) == [PAYLOAD]
+
+
+def test_gemini_without_image_part():
+    body = {"candidates": [{"content": {"parts": [{"text": "no image"}]}}],
+            "data": base64.b64encode(b"elsewhere").decode()}
+    with pytest.raises(Exception, match="No image found"):
+        _gemini_decode(body, 8)
+
+
+def test_truncated_response():
+    body = b'{"data": [{"b64_json": "' + base64.b64encode(PAYLOAD)[:40]
+    decoder = Base64StreamDecoder("b64_json", io.BytesIO)
+    decoder.feed(body)
+    with pytest.raises(Exception, match="Response ended inside"):
+        decoder.finish()
@@ -0,0 +1,200 @@
+import logging
+import tkinter as tk
+from typing import List, Tuple
+
+import customtkinter as ctk
+
+from core.async_runner import get_loop_thread
+from core.batch_queue import BatchQueue, BatchJob, DONE, FAILED, DEFAULT_CONCURRENCY
+from core.settings import APP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+class BatchDialog(ctk.CTkToplevel):
+    """Dialog for queueing many prompts (optionally across several sizes) at once."""
+
+    def __init__(self, parent, generate_tab):
+        super().__init__(parent)
+        self.parent = parent
+        self.generate_tab = generate_tab
+        self.main_window = generate_tab.main_window
+        self.queue = None
+        self.future = None
+
+        # Window setup
+        self.title("Batch Generate")
+        self.geometry("560x600")
+        self.minsize(500, 500)
+        self.transient(parent)
+
+        self._create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+    def _create_widgets(self):
+        """Create the UI elements."""
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        # Title
+        title_label = ctk.CTkLabel(
+            self,
+            text="Prompts (one per line)",
+            font=ctk.CTkFont(size=14, weight="bold")
+        )
+        title_label.grid(row=0, column=0, padx=20, pady=(20, 5), sticky="w")
+
+        # Prompts input
+        self.prompts_text = ctk.CTkTextbox(self, height=200, wrap="word")
+        self.prompts_text.grid(row=1, column=0, padx=20, pady=5, sticky="nsew")
+        current_prompt = self.generate_tab.prompt_var.get().strip()
+        if current_prompt:
+            self.prompts_text.insert("1.0", current_prompt)
+
+        # Size checkboxes
+        sizes_frame = ctk.CTkFrame(self)
+        sizes_frame.grid(row=2, column=0, padx=20, pady=5, sticky="ew")
+
+        ctk.CTkLabel(
+            sizes_frame,
+            text="Sizes:",
+            font=ctk.CTkFont(size=14)
+        ).grid(row=0, column=0, padx=10, pady=5, sticky="w")
+
+        self.size_vars = {}
+        selected_size = self.generate_tab.size_var.get()
+        for i, size in enumerate(self.generate_tab.size_dropdown.cget("values")):
+            var = tk.BooleanVar(value=(size == selected_size))
+            ctk.CTkCheckBox(sizes_frame, text=size, variable=var).grid(
+                row=1 + i // 3, column=i % 3, padx=10, pady=5, sticky="w"
+            )
+            self.size_vars[size] = var
+
+        # Concurrency
+        options_frame = ctk.CTkFrame(self)
+        options_frame.grid(row=3, column=0, padx=20, pady=5, sticky="ew")
+
+        ctk.CTkLabel(
+            options_frame,
+            text="Parallel requests:",
+            font=ctk.CTkFont(size=14)
+        ).pack(side="left", padx=10, pady=10)
+
+        self.concurrency_var = ctk.StringVar(value=str(APP_CONFIG.get("batch_concurrency", DEFAULT_CONCURRENCY)))
+        ctk.CTkEntry(options_frame, textvariable=self.concurrency_var, width=60).pack(side="left", padx=10, pady=10)
+
+        # Progress
+        self.progress_bar = ctk.CTkProgressBar(self)
+        self.progress_bar.grid(row=4, column=0, padx=20, pady=(10, 5), sticky="ew")
+        self.progress_bar.set(0)
+
+        self.status_label = ctk.CTkLabel(self, text="", font=ctk.CTkFont(size=12), anchor="w")
+        self.status_label.grid(row=5, column=0, padx=20, pady=5, sticky="ew")
+
+        # Buttons
+        buttons_frame = ctk.CTkFrame(self)
+        buttons_frame.grid(row=6, column=0, padx=20, pady=(10, 20), sticky="ew")
+        buttons_frame.grid_columnconfigure((0, 1), weight=1)
+
+        self.start_btn = ctk.CTkButton(
+            buttons_frame,
+            text="Start",
+            width=150,
+            command=self._on_start
+        )
+        self.start_btn.grid(row=0, column=0, padx=10, pady=10, sticky="e")
+
+        self.cancel_btn = ctk.CTkButton(
+            buttons_frame,
+            text="Cancel",
+            width=150,
+            fg_color="#D32F2F",
+            hover_color="#B71C1C",
+            command=self._on_cancel,
+            state="disabled"
+        )
+        self.cancel_btn.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+
+    def _get_prompts(self) -> List[str]:
+        """Read non-empty prompt lines."""
+        text = self.prompts_text.get("1.0", "end")
+        return [line.strip() for line in text.splitlines() if line.strip()]
+
+    def _get_sizes(self) -> List[Tuple[int, int]]:
+        """Read the selected sizes."""
+        return [tuple(map(int, size.split("x"))) for size, var in self.size_vars.items() if var.get()]
+
+    def _on_start(self):
+        """Build the queue and start running it on the event loop."""
+        prompts = self._get_prompts()
+        sizes = self._get_sizes()
+        if not prompts or not sizes:
+            tk.messagebox.showerror("Error", "Enter at least one prompt and select at least one size.", parent=self)
+            return
+
+        try:
+            concurrency = int(self.concurrency_var.get())
+        except ValueError:
+            tk.messagebox.showerror("Error", "Parallel requests must be a number.", parent=self)
+            return
+
+        negative_prompt = self.generate_tab.neg_prompt_var.get().strip() or None
+
+        self.queue = BatchQueue(
+            self.generate_tab.api_client,
+            db=self.generate_tab.db,
+            concurrency=concurrency,
+            on_progress=lambda queue, job: self.after(0, lambda: self._on_progress(job))
+        )
+        self.queue.add_matrix(prompts, sizes, negative_prompt)
+
+        self.start_btn.configure(state="disabled")
+        self.cancel_btn.configure(state="normal")
+        self.progress_bar.set(0)
+        self.status_label.configure(text=f"Queued {self.queue.total} images...")
+
+        self.future = get_loop_thread().run(
+            self.queue.run(),
+            self,
+            on_success=self._on_finished,
+            on_error=self._on_error
+        )
+
+    def _on_progress(self, job: BatchJob):
+        """Update progress for a job (runs on the Tk thread)."""
+        if not self.winfo_exists():
+            return
+
+        completed = self.queue.completed
+        self.progress_bar.set(completed / max(1, self.queue.total))
+        self.status_label.configure(text=f"{completed}/{self.queue.total} done - #{job.index + 1} {job.status}")
+
+    def _on_finished(self, jobs: List[BatchJob]):
+        """Show the batch summary (runs on the Tk thread)."""
+        succeeded = sum(1 for job in jobs if job.status == DONE)
+        failed = sum(1 for job in jobs if job.status == FAILED)
+        message = f"Batch finished: {succeeded} succeeded, {failed} failed, {len(jobs) - succeeded - failed} cancelled"
+
+        self.main_window.set_status(message)
+        if self.winfo_exists():
+            self.status_label.configure(text=message)
+            self.start_btn.configure(state="normal")
+            self.cancel_btn.configure(state="disabled")
+
+    def _on_error(self, error):
+        """Report an unexpected batch error (runs on the Tk thread)."""
+        logger.error("Batch generation failed", exc_info=error)
+        self.main_window.set_status(f"Batch error: {str(error)[:50]}...")
+        if self.winfo_exists():
+            self.start_btn.configure(state="normal")
+            self.cancel_btn.configure(state="disabled")
+
+    def _on_cancel(self):
+        """Cancel the running batch."""
+        if self.queue:
+            self.queue.cancel()
+            self.status_label.configure(text="Cancelling...")
+
+    def _on_close(self):
+        """Cancel any running batch and close the dialog."""
+        self._on_cancel()
+        self.destroy()
@@ -6,11 +6,10 @@ from PIL import Image, ImageTk
 import os
 from datetime import datetime
 from typing import Optional, Tuple
-import uuid
 
 from core.image_editor import ImageEditor
-from core.db import Database
-from core.settings import ensure_dirs
+from core.db import get_database
+from core.history_writer import save_generated
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +19,7 @@ class EditTab:
     def __init__(self, parent, main_window):
         self.parent = parent
         self.main_window = main_window
-        self.db = Database()
+        self.db = get_database()
         
         self.frame = None
         self.canvas = None
@@ -580,32 +579,18 @@ class EditTab:
             return
         
         try:
-            # Generate save path
-            save_dir = ensure_dirs()
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"edited_{timestamp}_{uuid.uuid4().hex[:8]}.png"
-            save_path = os.path.join(save_dir, filename)
+            filename = f"edited_{timestamp}.png"
             
-            # Save the image
-            self.current_image.save(save_path)
-            
-            # Add to database
-            self.db.add_image(
-                prompt="Edited image",
-                filename=filename,
-                filepath=save_path,
-                provider="Local Edit",
-                width=self.current_image.width,
-                height=self.current_image.height
+            # Saving it again without edits reuses the stored file
+            (_, save_path), = save_generated(
+                [self.current_image], "Edited image", "Local Edit", db=self.db, filename=filename
             )
             
             self.status_label.configure(text=f"Image saved: {filename}")
             self.main_window.set_status(f"Saved: {filename}")
             self.main_window.show_info("Success", f"Image saved successfully to:\n{save_path}")
             
-            # Update history tab if it exists
-            self.main_window.update_history()
-            
         except Exception as e:
             logger.exception("Error saving image")
             self.main_window.show_error("Error", f"Failed to save image: {str(e)}")
@@ -1,16 +1,20 @@
-import os
-import threading
+import math
+import time
+import asyncio
 import logging
 import tkinter as tk
-from pathlib import Path
-from typing import Optional
 from PIL import Image, ImageTk
 
 import customtkinter as ctk
 
-from core.api_client import APIClient
-from core.db import Database
-from core.settings import ensure_dirs, DEFAULT_IMAGE_SIZE, API_PROVIDER, APP_CONFIG
+from core.api_client import PROVIDER_SIZES
+from core.async_api_client import AsyncAPIClient
+from core.async_runner import get_loop_thread
+from core.history_writer import save_generated
+from core.db import get_database
+from core.router import ProviderRouter, get_routing_config
+from ui.batch_dialog import BatchDialog
+from core.settings import APP_CONFIG
 
 logger = logging.getLogger(__name__)
 
@@ -22,14 +26,15 @@ class GenerateTab:
         self.main_window = main_window
         
         # Use the new configuration system for API client initialization
-        self.api_client = APIClient(
+        self.api_client = AsyncAPIClient(
             api_key=APP_CONFIG.get("api_key", None),
             provider=APP_CONFIG.get("api_provider", None)
         )
         
-        self.db = Database()
+        self.db = get_database()
         self.frame = None
         self.preview_image = None
+        self.preview_images = []
         self.generated_image = None
         self.generated_path = None
         
@@ -117,6 +122,23 @@ class GenerateTab:
         )
         generate_btn.grid(row=2, column=1, padx=10, pady=10, sticky="e")
         
+        # Number of samples
+        count_label = ctk.CTkLabel(
+            input_frame,
+            text="Images:",
+            font=ctk.CTkFont(size=14)
+        )
+        count_label.grid(row=3, column=0, padx=10, pady=10, sticky="e")
+        
+        self.count_var = ctk.StringVar(value="1")
+        self.count_dropdown = ctk.CTkOptionMenu(
+            input_frame,
+            variable=self.count_var,
+            values=["1", "2", "3", "4"],
+            width=80
+        )
+        self.count_dropdown.grid(row=3, column=1, padx=10, pady=10, sticky="w")
+        
         # Preview frame (center)
         preview_frame = ctk.CTkFrame(self.frame)
         preview_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
@@ -142,6 +164,26 @@ class GenerateTab:
             font=ctk.CTkFont(size=12)
         )
         self.status_label.pack(side="left", padx=10, pady=10)
+        
+        # Batch button
+        batch_btn = ctk.CTkButton(
+            action_frame,
+            text="Batch...",
+            width=100,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=self._on_batch
+        )
+        batch_btn.pack(side="right", padx=10, pady=10)
+        
+        # Skip the generation cache and always ask the provider for a new sample
+        self.fresh_sample_var = tk.BooleanVar(value=False)
+        fresh_checkbox = ctk.CTkCheckBox(
+            action_frame,
+            text="Fresh sample",
+            variable=self.fresh_sample_var
+        )
+        fresh_checkbox.pack(side="right", padx=10, pady=10)
     
     def show(self):
         """Show this tab."""
@@ -169,61 +211,86 @@ class GenerateTab:
         
         # Get negative prompt if any
         negative_prompt = self.neg_prompt_var.get().strip() or None
-        
-        # Start generation in a separate thread to keep UI responsive
-        thread = threading.Thread(
-            target=self._generate_image_thread,
-            args=(prompt, (width, height), negative_prompt)
+        bypass_cache = self.fresh_sample_var.get()
+        count = int(self.count_var.get())
+        
+        # Run generation on the shared event loop to keep UI responsive
+        get_loop_thread().run(
+            self._generate_images_async(prompt, (width, height), negative_prompt, count, bypass_cache),
+            self.frame,
+            on_success=self._on_generate_done,
+            on_error=self._on_generate_error
         )
-        thread.daemon = True
-        thread.start()
     
-    def _generate_image_thread(self, prompt, size, negative_prompt=None):
-        """Generate image in a background thread."""
-        try:
-            # Generate the image
-            image = self.api_client.generate_image(prompt, size, negative_prompt)
+    def _on_batch(self):
+        """Open the batch generation dialog."""
+        BatchDialog(self.main_window, self)
+    
+    async def _generate_images_async(self, prompt, size, negative_prompt=None, count=1, bypass_cache=False):
+        """Generate and save images on the event loop."""
+        start = time.perf_counter()
+        if get_routing_config()["enabled"]:
+            # Hedge/fail over across the configured providers
+            router = ProviderRouter.from_config(self.api_client)
+            provider, images = await router.route(
+                prompt, size, negative_prompt, count=count, bypass_cache=bypass_cache
+            )
+        else:
+            provider = self.api_client.provider
+            images = await self.api_client.generate_images(
+                prompt, size, negative_prompt, count=count, bypass_cache=bypass_cache
+            )
+        if not images:
+            return None
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        # Saving and the DB insert are blocking, keep them off the loop
+        loop = asyncio.get_running_loop()
+        paths = await loop.run_in_executor(None, self._save_generated, images, prompt, provider, latency_ms)
+        return images, paths
+    
+    def _save_generated(self, images, prompt, provider=None, latency_ms=None):
+        """Save the images to disk and record them with one database insert."""
+        provider = provider or self.api_client.provider
+        saved = save_generated(images, prompt, provider, latency_ms, db=self.db)
+        return [filepath for _, filepath in saved]
+    
+    def _on_generate_done(self, result):
+        """Update the UI once generation finished (runs on the Tk thread)."""
+        self._set_ui_state(True)
+        
+        if result:
+            images, paths = result
+            self.generated_image = images[0]
+            self.generated_path = paths[0]
             
-            if image:
-                # Save to temp location
-                save_dir = ensure_dirs()
-                self.generated_path = self.api_client.save_image(image, save_dir, prompt)
-                self.generated_image = image
-                
-                # Save to database
-                self.db.add_image(
-                    prompt=prompt,
-                    filename=Path(self.generated_path).name,
-                    filepath=self.generated_path,
-                    provider=self.api_client.provider,
-                    width=image.width,
-                    height=image.height
-                )
-                
-                # Update UI in main thread
-                self.frame.after(0, lambda: self._update_preview(image))
-                self.frame.after(0, lambda: self._set_ui_state(True))
-                self.frame.after(0, lambda: self.status_label.configure(text="Image generated successfully"))
-                self.frame.after(0, lambda: self.main_window.set_status("Image generated successfully"))
-            else:
-                # Handle failure
-                self.frame.after(0, lambda: self._set_ui_state(True))
-                self.frame.after(0, lambda: self.status_label.configure(text="Failed to generate image"))
-                self.frame.after(0, lambda: self.main_window.set_status("Failed to generate image"))
-                self.frame.after(0, lambda: self.main_window.show_error("Error", "Failed to generate image"))
-        except Exception as e:
-            logger.exception("Error generating image")
-            # Handle exception
-            error_msg = str(e)
-            self.frame.after(0, lambda: self._set_ui_state(True))
-            self.frame.after(0, lambda: self.status_label.configure(text=f"Error: {error_msg[:50]}..."))
-            self.frame.after(0, lambda: self.main_window.set_status(f"Error: {error_msg[:50]}..."))
-            self.frame.after(0, lambda: self.main_window.show_error("Error", error_msg))
+            self._update_preview(images)
+            message = "Image generated successfully" if len(images) == 1 else f"{len(images)} images generated successfully"
+            self.status_label.configure(text=message)
+            self.main_window.set_status(message)
+        else:
+            # Handle failure
+            self.status_label.configure(text="Failed to generate image")
+            self.main_window.set_status("Failed to generate image")
+            self.main_window.show_error("Error", "Failed to generate image")
+    
+    def _on_generate_error(self, error):
+        """Report a generation error (runs on the Tk thread)."""
+        logger.error("Error generating image", exc_info=error)
+        error_msg = str(error)
+        self._set_ui_state(True)
+        self.status_label.configure(text=f"Error: {error_msg[:50]}...")
+        self.main_window.set_status(f"Error: {error_msg[:50]}...")
+        self.main_window.show_error("Error", error_msg)
     
-    def _update_preview(self, image):
-        """Update the preview with the generated image."""
+    def _update_preview(self, images):
+        """Update the preview with the generated image(s), laid out as a grid."""
+        if isinstance(images, Image.Image):
+            images = [images]
+        
         # Clear canvas
         self.canvas.delete("all")
+        self.preview_images = []
         
         # Resize for preview (maintaining aspect ratio)
         canvas_width = self.canvas.winfo_width()
@@ -234,25 +301,35 @@ class GenerateTab:
             canvas_width = 500
             canvas_height = 500
         
-        # Calculate scaling factor
-        img_width, img_height = image.size
-        scale = min(canvas_width / img_width, canvas_height / img_height)
-        
-        new_width = int(img_width * scale * 0.9)  # 90% of available space
-        new_height = int(img_height * scale * 0.9)
+        # Grid layout: as square as possible
+        columns = math.ceil(math.sqrt(len(images)))
+        rows = math.ceil(len(images) / columns)
+        cell_width = canvas_width / columns
+        cell_height = canvas_height / rows
         
-        # Resize image for display
-        display_img = image.resize((new_width, new_height), Image.LANCZOS)
-        
-        # Convert to PhotoImage
-        self.preview_image = ImageTk.PhotoImage(display_img)
-        
-        # Calculate center position
-        x = (canvas_width - new_width) // 2
-        y = (canvas_height - new_height) // 2
+        for i, image in enumerate(images):
+            # Calculate scaling factor
+            img_width, img_height = image.size
+            scale = min(cell_width / img_width, cell_height / img_height)
+            
+            new_width = max(1, int(img_width * scale * 0.9))  # 90% of available space
+            new_height = max(1, int(img_height * scale * 0.9))
+            
+            # Resize image for display
+            display_img = image.resize((new_width, new_height), Image.LANCZOS)
+            
+            # Convert to PhotoImage (keep a reference so Tk doesn't drop it)
+            photo = ImageTk.PhotoImage(display_img)
+            self.preview_images.append(photo)
+            
+            # Center inside its grid cell
+            x = int((i % columns) * cell_width + (cell_width - new_width) / 2)
+            y = int((i // columns) * cell_height + (cell_height - new_height) / 2)
+            
+            # Display on canvas
+            self.canvas.create_image(x, y, anchor="nw", image=photo)
         
-        # Display on canvas
-        self.canvas.create_image(x, y, anchor="nw", image=self.preview_image)
+        self.preview_image = self.preview_images[0] if self.preview_images else None
     
     def _set_ui_state(self, enabled):
         """Enable or disable UI elements during generation."""
@@ -260,28 +337,14 @@ class GenerateTab:
         self.prompt_entry.configure(state=state)
         self.neg_prompt_entry.configure(state=state)
         self.size_dropdown.configure(state=state)
+        self.count_dropdown.configure(state=state)
     
     def _get_size_options_for_provider(self, provider):
         """Return appropriate size options based on the provider."""
         provider = provider.lower()
         
-        if provider == "openai":
-            return [
-                "256x256", "512x512", "1024x1024",
-                "1024x1792", "1792x1024"
-            ]
-        elif provider == "stability":
-            # Updated to only use supported dimensions for SDXL model
-            return [
-                "1024x1024", "1152x896", "896x1152",
-                "1216x832", "832x1216", "1344x768", "768x1344",
-                "1536x640", "640x1536"
-            ]
-        elif provider == "gemini":
-            return ["1024x1024", "1024x1792", "1792x1024"]
-        else:
-            # Default options
-            return ["512x512", "768x768", "1024x1024"]
+        # Default options for unknown providers
+        return list(PROVIDER_SIZES.get(provider, ["512x512", "768x768", "1024x1024"]))
     
     def update_size_options(self, provider):
         """Update the size dropdown based on the selected provider."""
@@ -0,0 +1,289 @@
+import math
+import tkinter as tk
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import customtkinter as ctk
+
+
+class VirtualList(ctk.CTkFrame):
+    """Scrollable list that only has widgets for the rows in view.
+
+    A pool of row widgets, enough for the visible rows plus `overscan` on
+    each side, is laid out with place() and re-bound to other items as the
+    list scrolls, so the widget count is the same for ten items or a
+    hundred thousand. Items come from a source with len() and get(index),
+    asked for only when a row shows them. create_row must make rows of a
+    fixed height of row_height - row_gap.
+    """
+
+    def __init__(self, parent, create_row: Callable[[tk.Misc], tk.Misc],
+                 bind_row: Callable[[Any, Dict[str, Any]], None], row_height: int,
+                 overscan: int = 3, row_gap: int = 10,
+                 on_scroll: Optional[Callable[[int, int], None]] = None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.row_height = row_height
+        self.row_gap = row_gap
+        self.overscan = overscan
+        self.on_scroll = on_scroll
+        self.source = None
+        self.offset = 0          # pixels scrolled from the top
+        self.rows: List[Any] = []
+        self.row_indexes: List[int] = []  # item index each pooled row shows, -1 when unused
+
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.empty_label = ctk.CTkLabel(self.viewport, text="", font=("Arial", 14))
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.viewport.bind("<Configure>", lambda event: self._layout())
+        self.bind_all("<MouseWheel>", self._on_mousewheel, add="+")
+        self.bind_all("<Button-4>", self._on_mousewheel, add="+")
+        self.bind_all("<Button-5>", self._on_mousewheel, add="+")
+
+    def set_source(self, source, empty_text: str = ""):
+        """Show another list of items, from the top."""
+        self.source = source
+        self.offset = 0
+        self.empty_label.configure(text=empty_text)
+        self.rebind()
+
+    def rebind(self, shift: int = 0):
+        """Bind every row again, e.g. after the items they show have changed.
+
+        shift is the number of items inserted (negative: removed) above the
+        view; unless the list is at the top, the offset follows them so the
+        rows in view stay where they are.
+        """
+        if shift and self.offset > 0:
+            self.offset = max(0, self.offset + shift * self.row_height)
+        self.row_indexes = [-1] * len(self.rows)
+        self._layout()
+
+    def update_layout(self):
+        """Lay out again after items were appended to the source (rows already bound are kept)."""
+        self._layout()
+
+    def visible_range(self) -> Tuple[int, int]:
+        """First and last index in view (last < first when the list is empty)."""
+        height = self.viewport.winfo_height()
+        count = len(self.source) if self.source is not None else 0
+        return self.offset // self.row_height, min(count - 1, (self.offset + height) // self.row_height)
+
+    def bound_rows(self) -> List[Tuple[int, Any]]:
+        """(item index, row) for every row currently showing an item."""
+        return [(index, row) for index, row in zip(self.row_indexes, self.rows) if index >= 0]
+
+    def scroll_to(self, offset: int):
+        count = len(self.source) if self.source is not None else 0
+        max_offset = max(0, count * self.row_height - self.viewport.winfo_height())
+        offset = max(0, min(int(offset), max_offset))
+        if offset != self.offset:
+            self.offset = offset
+            self._layout()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        height = self.viewport.winfo_height()
+        if action == "moveto":
+            count = len(self.source) if self.source is not None else 0
+            self.scroll_to(float(amount) * count * self.row_height)
+        elif unit == "pages":
+            self.scroll_to(self.offset + int(amount) * height)
+        else:
+            self.scroll_to(self.offset + int(amount) * self.row_height // 3)
+
+    def _on_mousewheel(self, event):
+        # Bound application-wide, so only react while the pointer is over this list
+        widget = self.winfo_containing(event.x_root, event.y_root)
+        if widget is None or not str(widget).startswith(str(self.viewport)):
+            return
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        else:
+            # Windows reports multiples of 120, macOS small deltas
+            steps = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self.scroll_to(self.offset + steps * self.row_height // 3)
+
+    def _ensure_pool(self, height: int):
+        """Create rows until there are enough to cover the view plus the overscan band."""
+        needed = math.ceil(height / self.row_height) + 1 + 2 * self.overscan
+        while len(self.rows) < needed:
+            self.rows.append(self.create_row(self.viewport))
+            self.row_indexes.append(-1)
+
+    def _layout(self):
+        """Place the rows for the current offset, re-binding the ones that now show another item."""
+        height = self.viewport.winfo_height()
+        if height <= 1 or self.source is None:
+            return  # not mapped yet; <Configure> calls again
+        self._ensure_pool(height)
+        count = len(self.source)
+        self.offset = max(0, min(self.offset, count * self.row_height - height))
+
+        first = max(0, self.offset // self.row_height - self.overscan)
+        last = min(count - 1, (self.offset + height) // self.row_height + self.overscan)
+        pool = len(self.rows)
+        shown = set()
+        for index in range(first, last + 1):
+            slot = index % pool
+            row = self.rows[slot]
+            if self.row_indexes[slot] != index:
+                item = self.source.get(index)
+                if item is None:
+                    continue
+                self.bind_row(row, item)
+                self.row_indexes[slot] = index
+            row.place(x=0, y=index * self.row_height - self.offset, relwidth=1)
+            shown.add(slot)
+        for slot, row in enumerate(self.rows):
+            if slot not in shown:
+                row.place_forget()
+                self.row_indexes[slot] = -1
+
+        if count:
+            self.empty_label.place_forget()
+            total = count * self.row_height
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + height) / total))
+        else:
+            self.empty_label.place(relx=0.5, y=20, anchor="n")
+            self.scrollbar.set(0, 1)
+
+        if self.on_scroll is not None:
+            self.on_scroll(*self.visible_range())
+
+
+class HistoryRow(ctk.CTkFrame):
+    """One history entry in the list; re-bound to another item as the list scrolls."""
+
+    def __init__(self, parent, tab, placeholder_image: tk.PhotoImage, height: int):
+        super().__init__(parent, height=height)
+        # Keep the fixed height the list lays rows out by, whatever the content
+        self.pack_propagate(False)
+        self.tab = tab
+        self.placeholder_image = placeholder_image
+        self.item: Optional[Dict[str, Any]] = None
+
+        # Container for image and info
+        content_frame = ctk.CTkFrame(self)
+        content_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Thumbnail, or a caption on a blank square while it loads
+        self.img_label = tk.Label(
+            content_frame,
+            image=placeholder_image,
+            compound="center",
+            font=("Arial", 12),
+            bg="#484747" if ctk.get_appearance_mode().lower() == "dark" else "#DFDEDE"
+        )
+        self.img_label.pack(side=tk.LEFT, padx=10, pady=10)
+
+        # Info frame
+        info_frame = ctk.CTkFrame(content_frame)
+        info_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        # Prompt
+        prompt_label = ctk.CTkLabel(
+            info_frame,
+            text="Prompt:",
+            font=("Arial", 12, "bold"),
+            anchor="w"
+        )
+        prompt_label.pack(anchor="w")
+
+        self.prompt_text = ctk.CTkTextbox(
+            info_frame,
+            height=60,
+            wrap="word",
+            activate_scrollbars=False
+        )
+        self.prompt_text.tag_config("match", background="#F9A825", foreground="black")
+        self.prompt_text.pack(fill=tk.X, expand=True, pady=5)
+
+        # Date and details
+        self.details_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=("Arial", 10),
+            text_color="grey" if ctk.get_appearance_mode() == "light" else "darkgrey",
+            anchor="w"
+        )
+        self.details_label.pack(anchor="w", pady=5)
+
+        # Action buttons
+        buttons_frame = ctk.CTkFrame(info_frame)
+        buttons_frame.pack(anchor="w", pady=5)
+
+        open_btn = ctk.CTkButton(
+            buttons_frame,
+            text="Open",
+            width=80,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=lambda: tab._on_open(self.item)
+        )
+        open_btn.pack(side=tk.LEFT, padx=5)
+
+        delete_btn = ctk.CTkButton(
+            buttons_frame,
+            text="Delete",
+            width=80,
+            fg_color=["#D32F2F", "#D32F2F"],
+            hover_color=["#B71C1C", "#B71C1C"],
+            command=lambda: tab._on_delete(self.item)
+        )
+        delete_btn.pack(side=tk.LEFT, padx=5)
+
+        self.similar_btn = ctk.CTkButton(
+            buttons_frame,
+            text="Similar",
+            width=80,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=lambda: tab._on_similar(self.item)
+        )
+        self.similar_btn.pack(side=tk.LEFT, padx=5)
+
+        self.select_var = tk.BooleanVar(value=False)
+        select_box = ctk.CTkCheckBox(
+            buttons_frame,
+            text="Select",
+            variable=self.select_var,
+            command=lambda: tab._on_select(self.item, self.select_var.get())
+        )
+        select_box.pack(side=tk.LEFT, padx=5)
+
+    def bind_item(self, item: Dict[str, Any], selected: bool):
+        """Show another item's prompt, details and selection (the thumbnail is set separately)."""
+        self.item = item
+
+        self.prompt_text.configure(state="normal")
+        self.prompt_text.delete("1.0", "end")
+        self.prompt_text.insert("1.0", item["prompt"])
+        # Highlight the words that matched the search
+        for start, end in item.get("match_spans", []):
+            self.prompt_text.tag_add("match", f"1.0+{start}c", f"1.0+{end}c")
+        self.prompt_text.configure(state="disabled")
+
+        details = f"Created: {item['created_at']} | Provider: {item['provider']} | Size: {item.get('width', 'N/A')}x{item.get('height', 'N/A')}"
+        if "distance" in item:
+            details += f" | Distance: {item['distance']}"
+        self.details_label.configure(text=details)
+
+        # Hashes of older images are still being computed in the background
+        self.similar_btn.configure(state="normal" if item.get("phash") is not None else "disabled")
+        self.select_var.set(selected)
+
+    def show_thumbnail(self, img_tk: tk.PhotoImage):
+        self.img_label.configure(image=img_tk, text="")
+        self.img_label.image = img_tk  # Keep a reference
+
+    def show_message(self, text: str, color: str = "grey"):
+        """Caption on the blank square instead of a thumbnail (loading, missing, error)."""
+        self.img_label.configure(image=self.placeholder_image, text=text, fg=color)
+        self.img_label.image = None
@@ -1,19 +1,44 @@
 import os
+import asyncio
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
 import customtkinter as ctk
 from PIL import Image, ImageTk
-import shutil
 import logging
-from typing import Dict, Any, Callable, Optional
+from collections import OrderedDict
+from typing import Dict, Any, Optional
 import platform
 import subprocess
+import threading
 
-from core.db import Database
-from core.settings import ensure_dirs
+from core.archive import export_history, import_history
+from core.async_runner import get_loop_thread
+from core.db import get_database, ChangeEvent, CHANGE_INSERT, CHANGE_DELETE
+from core.history_pages import HistoryPages, ResultPages
+from core.live_search import LiveSearch
+from core.reconciler import get_reconciler
+from core.thumbnails import get_thumbnail_store, THUMBNAIL_SIZE
+from core.thumbnail_loader import ThumbnailLoader
+from ui.history_list import VirtualList, HistoryRow
+from ui.stats_dialog import StatsDialog
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per page of history
+HISTORY_PAGE_SIZE = 50
+# Most search / similar-image results listed
+HISTORY_RESULT_LIMIT = 1000
+# Height of one history row including the gap below it, in pixels
+HISTORY_ROW_HEIGHT = 220
+# Rows kept bound (and thumbnails decoded) beyond the visible ones, each way
+HISTORY_OVERSCAN = 4
+# Decoded thumbnails kept in memory, so scrolling back shows them at once
+THUMBNAIL_CACHE_SIZE = 300
+# Delay after a scroll before the decode queue is re-prioritised, in ms
+THUMBNAIL_SCROLL_DELAY_MS = 50
+# Pause in typing after which the search runs, in ms
+SEARCH_DEBOUNCE_MS = 250
+
 class HistoryTab(ctk.CTkFrame):
     """Tab for viewing and managing image generation history."""
     
@@ -21,13 +46,29 @@ class HistoryTab(ctk.CTkFrame):
         super().__init__(parent)
         self.parent = parent
         self.main_window = main_window
-        self.db = Database()
-        self.history_frames = []
-        self.current_items = []
+        self.db = get_database()
+        self.reconciler = get_reconciler()
+        self.thumbnails = get_thumbnail_store()
+        self.selected_items = {}  # image id -> item ticked for a bulk delete
+        self.similar_to = None  # item whose near-duplicates are listed instead of the history
+        self.thumbnail_cache = OrderedDict()  # image id -> PhotoImage, least recently shown first
+        self.thumbnail_failed = set()  # image ids whose thumbnail could not be read
+        self.thumbnail_pending = set()  # image ids queued on the loader
+        self.thumbnail_update = None  # pending after() id
+        self.thumbnail_loader = ThumbnailLoader(self._load_thumbnail, self, self._on_thumbnails_ready)
+        self.live_search = LiveSearch(self.db, self, self._on_search_results, limit=HISTORY_RESULT_LIMIT)
+        self.search_generation = None  # generation of the search whose results the list shows
+        self.search_results = None  # ResultPages being filled by that search
+        self.search_update = None  # pending after() id of the debounced search
+        self.archive_stop = None  # threading.Event of the running export / import
         
         # Create layout
         self._create_widgets()
         
+        # Follow inserts, deletes and updates from anywhere (generate, edit, batch, import, ...)
+        self.change_listener = lambda event: self.after(0, lambda: self._apply_change(event))
+        self.db.add_change_listener(self.change_listener)
+        
         # Initially hidden
         self.hide()
         
@@ -55,6 +96,8 @@ class HistoryTab(ctk.CTkFrame):
             textvariable=self.search_var
         )
         self.search_entry.pack(side=tk.LEFT, padx=5)
+        # Search as you type
+        self.search_var.trace_add("write", lambda *args: self._schedule_search())
         
         self.search_btn = ctk.CTkButton(
             self.controls_frame,
@@ -72,13 +115,93 @@ class HistoryTab(ctk.CTkFrame):
             width=100,
             fg_color=["#3B8ED0", "#1F6AA5"],
             hover_color=["#36719F", "#144870"],
-            command=lambda: (self.search_var.set(""), self.refresh())
+            command=self._on_clear
         )
         self.clear_search_btn.pack(side=tk.LEFT, padx=5)
         
-        # Scrollable frame for history items
-        self.history_container = ctk.CTkScrollableFrame(self)
-        self.history_container.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
+        self.stats_btn = ctk.CTkButton(
+            self.controls_frame,
+            text="Stats",
+            width=80,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=lambda: StatsDialog(self.main_window)
+        )
+        self.stats_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.export_btn = ctk.CTkButton(
+            self.controls_frame,
+            text="Export",
+            width=80,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=self._on_export
+        )
+        self.export_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.import_btn = ctk.CTkButton(
+            self.controls_frame,
+            text="Import",
+            width=80,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=self._on_import
+        )
+        self.import_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Shown while an export or import runs
+        self.archive_cancel_btn = ctk.CTkButton(
+            self.controls_frame,
+            text="Cancel",
+            width=80,
+            fg_color=["#D32F2F", "#D32F2F"],
+            hover_color=["#B71C1C", "#B71C1C"],
+            command=self._on_archive_cancel
+        )
+        
+        self.filter_label = ctk.CTkLabel(
+            self.controls_frame,
+            text="",
+            font=("Arial", 12)
+        )
+        self.filter_label.pack(side=tk.LEFT, padx=5)
+        
+        self.delete_selected_btn = ctk.CTkButton(
+            self.controls_frame,
+            text="Delete selected",
+            width=120,
+            fg_color=["#D32F2F", "#D32F2F"],
+            hover_color=["#B71C1C", "#B71C1C"],
+            command=self._on_delete_selected,
+            state="disabled"
+        )
+        self.delete_selected_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Shown when the last disk scan found image files that aren't in the history
+        self.import_orphans_btn = ctk.CTkButton(
+            self.controls_frame,
+            text="Import files",
+            width=120,
+            fg_color=["#3B8ED0", "#1F6AA5"],
+            hover_color=["#36719F", "#144870"],
+            command=self._on_import_orphans
+        )
+        
+        # Blank square shown (with a caption) until a row's thumbnail is decoded
+        self.placeholder_image = tk.PhotoImage(width=THUMBNAIL_SIZE, height=THUMBNAIL_SIZE)
+        
+        # History rows; only the ones in view exist as widgets, re-bound while scrolling
+        self.history_list = VirtualList(
+            self,
+            create_row=lambda parent: HistoryRow(parent, self, self.placeholder_image, HISTORY_ROW_HEIGHT - 10),
+            bind_row=self._bind_row,
+            row_height=HISTORY_ROW_HEIGHT,
+            overscan=HISTORY_OVERSCAN,
+            row_gap=10,
+            on_scroll=lambda first, last: self._schedule_thumbnail_update()
+        )
+        self.history_list.grid(row=1, column=0, sticky="nsew", padx=10, pady=10)
+        self.history_frames = self.history_list.rows
         
         # Configure grid weights
         self.grid_columnconfigure(0, weight=1)
@@ -86,145 +209,279 @@ class HistoryTab(ctk.CTkFrame):
     
     def refresh(self):
         """Refresh the history list."""
-        # Clear existing items
-        for frame in self.history_frames:
-            frame.destroy()
-        self.history_frames = []
+        self.thumbnail_loader.cancel_all()
+        self.thumbnail_pending.clear()
+        self.thumbnail_failed.clear()
+        self.selected_items.clear()
+        self.delete_selected_btn.configure(state="disabled")
+        self._update_orphans_button()
         
         # Get search term if exists
         search_term = self.search_var.get().strip()
         
-        # Fetch entries
-        if search_term:
-            items = self.db.search_images(search_term)
+        # Fetch entries; the full history is read page by page as it scrolls into view
+        self.search_generation = None
+        if self.similar_to is not None:
+            self.live_search.cancel()
+            source = ResultPages(self.db.find_similar(self.similar_to["phash"], limit=HISTORY_RESULT_LIMIT))
+            self.filter_label.configure(text=f"Similar to: {self.similar_to['filename']}")
+        elif search_term:
+            # Runs on the search thread; the current rows stay until the first results arrive
+            self.search_generation = self.live_search.submit(search_term)
+            self.search_results = None
+            self.filter_label.configure(text="Searching...")
+            return
         else:
-            items = self.db.get_all_images()
+            self.live_search.cancel()
+            source = HistoryPages(self.db, HISTORY_PAGE_SIZE)
+            self.filter_label.configure(text="")
         
-        self.current_items = items
+        self.history_list.set_source(source, empty_text="No history items found.")
+    
+    def _schedule_search(self):
+        """Search once typing pauses for SEARCH_DEBOUNCE_MS."""
+        if self.search_update is not None:
+            self.after_cancel(self.search_update)
+        self.search_update = self.after(SEARCH_DEBOUNCE_MS, self._on_search)
+    
+    def _on_search_results(self, generation: int, items, done: bool):
+        """Stream a batch of search results into the list (runs on the Tk thread)."""
+        if generation != self.search_generation:
+            return  # overtaken by a newer search, or the search was cleared
         
-        # Create history items
-        for i, item in enumerate(items):
-            frame = self._create_history_item(item, i)
-            frame.pack(fill=tk.X, expand=True, pady=5)
-            self.history_frames.append(frame)
+        if self.search_results is None and (items or done):
+            self.search_results = ResultPages(list(items))
+            self.history_list.set_source(self.search_results, empty_text="No history items found.")
+        elif items:
+            self.search_results.items.extend(items)
+            self.history_list.update_layout()
         
-        if not items:
-            no_items_label = ctk.CTkLabel(
-                self.history_container,
-                text="No history items found.",
-                font=("Arial", 14),
-                text_color="grey" if ctk.get_appearance_mode() == "light" else "darkgrey"
-            )
-            no_items_label.pack(pady=20)
-            self.history_frames.append(no_items_label)
+        if done:
+            self.filter_label.configure(text=f"{len(self.search_results)} matches")
     
-    def _create_history_item(self, item: Dict[str, Any], index: int) -> ctk.CTkFrame:
-        """Create a history item widget."""
-        frame = ctk.CTkFrame(self.history_container)
+    def _apply_change(self, event: ChangeEvent):
+        """Apply a database change to the list in place instead of reloading it."""
+        source = self.history_list.source
+        if source is None or not self.winfo_ismapped():
+            return  # show() reloads the list anyway
         
-        # Container for image and info
-        content_frame = ctk.CTkFrame(frame)
-        content_frame.pack(fill=tk.X, expand=True, padx=10, pady=10)
+        first, _ = self.history_list.visible_range()
+        shift = 0
+        if event.kind == CHANGE_INSERT:
+            positions = source.insert(self.db.get_images(event.ids))
+            if positions is not None:
+                shift = sum(1 for position in positions if position < first)
+        elif event.kind == CHANGE_DELETE:
+            positions = source.delete(event.ids)
+            if positions is not None:
+                shift = -sum(1 for position in positions if position < first)
+            for image_id in event.ids:
+                self.selected_items.pop(image_id, None)
+                self.thumbnail_cache.pop(image_id, None)
+            self.delete_selected_btn.configure(state="normal" if self.selected_items else "disabled")
+        else:
+            shown = source.loaded_ids()
+            changed = [image_id for image_id in event.ids if image_id in shown]
+            if not changed:
+                return
+            source.update(self.db.get_images(changed))
+            # e.g. a file that came back: try its thumbnail again
+            self.thumbnail_failed.difference_update(changed)
         
-        # Try to load the thumbnail
-        try:
-            filepath = item["filepath"]
-            
-            if os.path.exists(filepath):
-                img = Image.open(filepath)
-                # Resize for thumbnail
-                img.thumbnail((150, 150))
-                img_tk = ImageTk.PhotoImage(img)
-                
-                # Image display
-                img_label = tk.Label(content_frame, image=img_tk, bg="#484747" if ctk.get_appearance_mode().lower() == "dark" else "#DFDEDE")
-                img_label.image = img_tk  # Keep a reference
-                img_label.pack(side=tk.LEFT, padx=10, pady=10)
+        self.history_list.rebind(shift)
+    
+    def _bind_row(self, row: HistoryRow, item: Dict[str, Any]):
+        """Show an item in a (recycled) row, with its thumbnail if it is decoded already."""
+        row.bind_item(item, item["id"] in self.selected_items)
+        image_id = item["id"]
+        # Kept up to date by the background reconciler, so no stat per row here
+        if not item.get("file_present", 1):
+            row.show_message("Image\nFile\nMissing")
+        elif image_id in self.thumbnail_cache:
+            self.thumbnail_cache.move_to_end(image_id)
+            row.show_thumbnail(self.thumbnail_cache[image_id])
+        elif image_id in self.thumbnail_failed:
+            row.show_message("Error\nLoading\nImage", "red")
+        else:
+            # Filled in by _on_thumbnails_ready
+            row.show_message("Loading...")
+    
+    def _schedule_thumbnail_update(self):
+        """Queue thumbnail decodes for the rows around the view once scrolling settles."""
+        if self.thumbnail_update is not None:
+            self.after_cancel(self.thumbnail_update)
+        self.thumbnail_update = self.after(THUMBNAIL_SCROLL_DELAY_MS, self._update_thumbnail_requests)
+    
+    def _update_thumbnail_requests(self):
+        """Decode visible thumbnails first, then the overscan rows nearest to the view; drop the rest."""
+        self.thumbnail_update = None
+        first, last = self.history_list.visible_range()
+        wanted = set()
+        for index, row in self.history_list.bound_rows():
+            item = row.item
+            image_id = item["id"]
+            if (not item.get("file_present", 1) or image_id in self.thumbnail_cache
+                    or image_id in self.thumbnail_failed):
+                continue
+            self.thumbnail_loader.request(image_id, item, priority=max(first - index, index - last, 0))
+            wanted.add(image_id)
+        for image_id in self.thumbnail_pending - wanted:
+            self.thumbnail_loader.cancel(image_id)
+        self.thumbnail_pending = wanted
+    
+    def _load_thumbnail(self, item: Dict[str, Any]) -> Optional[Image.Image]:
+        """Decode a row's thumbnail into an RGBA image (runs on a loader thread)."""
+        img, thumbnail_ref = self.thumbnails.load(item)
+        if img is None:
+            return None
+        if thumbnail_ref != item.get("thumbnail_ref"):
+            item["thumbnail_ref"] = thumbnail_ref
+            self.db.set_thumbnail_refs([(item["id"], thumbnail_ref)])
+        return img.convert("RGBA")
+    
+    def _on_thumbnails_ready(self, results):
+        """Swap decoded thumbnails in for the placeholders of the rows showing them."""
+        for image_id, img in results:
+            self.thumbnail_pending.discard(image_id)
+            if img is None:
+                self.thumbnail_failed.add(image_id)
+                continue
+            self.thumbnail_cache[image_id] = ImageTk.PhotoImage(img)
+            while len(self.thumbnail_cache) > THUMBNAIL_CACHE_SIZE:
+                self.thumbnail_cache.popitem(last=False)
+        
+        ready = {image_id for image_id, _ in results}
+        for _, row in self.history_list.bound_rows():
+            image_id = row.item["id"]
+            if image_id not in ready:
+                continue
+            if image_id in self.thumbnail_cache:
+                row.show_thumbnail(self.thumbnail_cache[image_id])
             else:
-                # If file is missing, show placeholder
-                missing_label = ctk.CTkLabel(
-                    content_frame,
-                    text="Image\nFile\nMissing",
-                    font=("Arial", 12),
-                    width=150,
-                    height=150,
-                    text_color="grey" if ctk.get_appearance_mode() == "light" else "darkgrey"
-                )
-                missing_label.pack(side=tk.LEFT, padx=10, pady=10)
-        
-        except Exception as e:
-            logger.error(f"Error loading history image: {e}")
-            error_label = ctk.CTkLabel(
-                content_frame,
-                text="Error\nLoading\nImage",
-                font=("Arial", 12),
-                width=150,
-                height=150,
-                text_color="red"
-            )
-            error_label.pack(side=tk.LEFT, padx=10, pady=10)
-        
-        # Info frame
-        info_frame = ctk.CTkFrame(content_frame)
-        info_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # Prompt
-        prompt_label = ctk.CTkLabel(
-            info_frame,
-            text="Prompt:",
-            font=("Arial", 12, "bold"),
-            anchor="w"
-        )
-        prompt_label.pack(anchor="w")
+                row.show_message("Error\nLoading\nImage", "red")
+    
+    def _update_orphans_button(self):
+        """Show the import button only while there are orphaned files."""
+        count = self.reconciler.orphan_count()
+        if count:
+            self.import_orphans_btn.configure(text=f"Import {count} files", state="normal")
+            self.import_orphans_btn.pack(side=tk.RIGHT, padx=5)
+        else:
+            self.import_orphans_btn.pack_forget()
+    
+    def _on_import_orphans(self):
+        """Add the image files found on disk without a history entry back to the history."""
+        self.import_orphans_btn.configure(state="disabled", text="Importing...")
         
-        prompt_text = ctk.CTkTextbox(
-            info_frame,
-            height=60,
-            wrap="word",
-            activate_scrollbars=False
+        async def _import():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.reconciler.reimport_orphans)
+        
+        get_loop_thread().run(
+            _import(),
+            self,
+            on_success=self._on_import_done,
+            on_error=self._on_import_error
         )
-        prompt_text.insert("1.0", item["prompt"])
-        prompt_text.configure(state="disabled")
-        prompt_text.pack(fill=tk.X, expand=True, pady=5)
-        
-        # Date and details
-        details_label = ctk.CTkLabel(
-            info_frame,
-            text=f"Created: {item['created_at']} | Provider: {item['provider']} | Size: {item.get('width', 'N/A')}x{item.get('height', 'N/A')}",
-            font=("Arial", 10),
-            text_color="grey" if ctk.get_appearance_mode() == "light" else "darkgrey",
-            anchor="w"
+    
+    def _on_import_done(self, imported: int):
+        self.main_window.set_status(f"Imported {imported} images")
+        self._update_orphans_button()
+    
+    def _on_import_error(self, error: BaseException):
+        logger.error(f"Error importing files: {error}")
+        self.main_window.show_error("Error", f"Failed to import files: {error}")
+        self._update_orphans_button()
+    
+    def _on_export(self):
+        """Write the whole history and its images to an archive file."""
+        dest_path = filedialog.asksaveasfilename(
+            title="Export history",
+            defaultextension=".tar",
+            filetypes=[("History archive", "*.tar")]
+        )
+        if dest_path:
+            self._run_archive_task(export_history, dest_path, "Export")
+    
+    def _on_import(self):
+        """Add the history from an archive file (an interrupted import continues where it stopped)."""
+        source_path = filedialog.askopenfilename(
+            title="Import history",
+            filetypes=[("History archive", "*.tar")]
         )
-        details_label.pack(anchor="w", pady=5)
+        if source_path:
+            self._run_archive_task(import_history, source_path, "Import")
+    
+    def _run_archive_task(self, task, path: str, action: str):
+        """Run an export or import off the Tk thread, showing its throughput in the status bar."""
+        self.export_btn.configure(state="disabled")
+        self.import_btn.configure(state="disabled")
+        stop_event = threading.Event()
+        self.archive_stop = stop_event
+        self.archive_cancel_btn.configure(state="normal", text="Cancel")
+        self.archive_cancel_btn.pack(side=tk.LEFT, padx=5, after=self.import_btn)
         
-        # Action buttons
-        buttons_frame = ctk.CTkFrame(info_frame)
-        buttons_frame.pack(anchor="w", pady=5)
+        def on_progress(report):
+            message = f"{action}ed {report.rows} images, {report.mb_per_second:.1f} MB/s..."
+            self.after(0, lambda: self.main_window.set_status(message))
         
-        open_btn = ctk.CTkButton(
-            buttons_frame,
-            text="Open",
-            width=80,
-            fg_color=["#3B8ED0", "#1F6AA5"],
-            hover_color=["#36719F", "#144870"],
-            command=lambda i=item: self._on_open(i)
-        )
-        open_btn.pack(side=tk.LEFT, padx=5)
+        async def _run():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, lambda: task(path, on_progress=on_progress, stop_event=stop_event)
+            )
         
-        delete_btn = ctk.CTkButton(
-            buttons_frame,
-            text="Delete",
-            width=80,
-            fg_color=["#D32F2F", "#D32F2F"],
-            hover_color=["#B71C1C", "#B71C1C"],
-            command=lambda i=item: self._on_delete(i)
-        )
-        delete_btn.pack(side=tk.LEFT, padx=5)
+        def finish():
+            self.archive_stop = None
+            self.archive_cancel_btn.pack_forget()
+            self.export_btn.configure(state="normal")
+            self.import_btn.configure(state="normal")
+        
+        def on_done(report):
+            finish()
+            outcome = f"{action} cancelled after" if stop_event.is_set() else f"{action}ed"
+            self.main_window.set_status(
+                f"{outcome} {report.rows} images ({report.bytes / (1024 * 1024):.1f} MB) "
+                f"in {report.seconds:.1f}s, {report.mb_per_second:.1f} MB/s"
+            )
+        
+        def on_error(error):
+            finish()
+            logger.error(f"History {action.lower()} failed: {error}")
+            self.main_window.show_error("Error", f"{action} failed: {error}")
         
-        return frame
+        get_loop_thread().run(_run(), self, on_success=on_done, on_error=on_error)
+    
+    def _on_archive_cancel(self):
+        """Stop the running export / import at the next chunk (an import can be resumed later)."""
+        if self.archive_stop is not None:
+            self.archive_stop.set()
+            self.archive_cancel_btn.configure(state="disabled", text="Cancelling...")
+    
+    def _on_select(self, item: Dict[str, Any], selected: bool):
+        """Track the items ticked for a bulk delete."""
+        if selected:
+            self.selected_items[item["id"]] = item
+        else:
+            self.selected_items.pop(item["id"], None)
+        self.delete_selected_btn.configure(state="normal" if self.selected_items else "disabled")
     
     def _on_search(self):
-        """Handle search button click."""
+        """Run the search now (search button, or typing paused)."""
+        if self.search_update is not None:
+            self.after_cancel(self.search_update)
+            self.search_update = None
+        self.similar_to = None
+        self.refresh()
+    
+    def _on_clear(self):
+        """Drop the search term and similarity filter, back to the full history."""
+        self.search_var.set("")
+        self._on_search()
+    
+    def _on_similar(self, item: Dict[str, Any]):
+        """List the images that look like this one, closest first."""
+        self.similar_to = item
         self.refresh()
     
     def _on_open(self, item: Dict[str, Any]):
@@ -257,34 +514,38 @@ class HistoryTab(ctk.CTkFrame):
         ):
             return
         
-        # Delete from database
-        success = self.db.delete_image(item["id"])
-        
-        if success:
-            # Also delete the file
-            filepath = item["filepath"]
-            if os.path.exists(filepath):
-                try:
-                    os.remove(filepath)
-                    logger.debug(f"Deleted file: {filepath}")
-                except Exception as e:
-                    logger.error(f"Error deleting file: {e}")
-            
-            # Refresh the list
-            self.refresh()
-        else:
-            logger.error(f"Failed to delete item: {item['id']}")
+        self._delete_items([item])
+    
+    def _on_delete_selected(self):
+        """Delete every selected image from history."""
+        items = list(self.selected_items.values())
+        if not items:
+            return
+        
+        if not messagebox.askyesno(
+            "Confirm Delete",
+            f"Are you sure you want to delete {len(items)} images from history?"
+        ):
+            return
+        
+        self._delete_items(items)
+    
+    def _delete_items(self, items):
+        """Delete images from the database in one transaction.
+        
+        The database removes a file once no other history item shares it;
+        the rows leave the list through the change event (see _apply_change).
+        """
+        deleted = self.db.delete_images(item["id"] for item in items)
+        
+        if not deleted:
+            logger.error(f"Failed to delete items: {[item['id'] for item in items]}")
     
     def update_ui_colors(self):
         """Update UI colors based on current appearance mode."""
-        # Cập nhật màu cho các phần tử hiện có
-        for frame in self.history_frames:
-            # Chỉ cập nhật nhãn hình ảnh
-            for child in frame.winfo_children():
-                if isinstance(child, ctk.CTkFrame):
-                    for item in child.winfo_children():
-                        if isinstance(item, tk.Label):
-                            item.configure(bg="#484747" if ctk.get_appearance_mode().lower() == "dark" else "#DFDEDE")
+        # Cập nhật màu cho các phần tử hiện có (chỉ nhãn hình ảnh)
+        for row in self.history_frames:
+            row.img_label.configure(bg="#484747" if ctk.get_appearance_mode().lower() == "dark" else "#DFDEDE")
         
     def show(self):
         """Show this tab and refresh the content."""
@@ -293,4 +554,14 @@ class HistoryTab(ctk.CTkFrame):
     
     def hide(self):
         """Hide this tab."""
-        self.grid_forget() 
\ No newline at end of file
+        self.thumbnail_loader.cancel_all()
+        self.grid_forget()
+    
+    def destroy(self):
+        """Stop the worker threads before the widgets (and later the database) go away."""
+        if self.archive_stop is not None:
+            self.archive_stop.set()
+        self.db.remove_change_listener(self.change_listener)
+        self.live_search.close()
+        self.thumbnail_loader.close()
+        super().destroy() 
\ No newline at end of file
@@ -248,10 +248,11 @@ class MainWindow(ctk.CTk):
         # Update the provider label
         self.provider_label.configure(text=f"Using: {provider.upper()}")
         
-        # Update the API client in the generate tab
+        # Update the API client in the generate tab (HTTP sessions are pooled per
+        # provider in core.http_pool, so switching keeps warm connections)
         if hasattr(self.tabs["generate"], "api_client"):
             self.tabs["generate"].api_client.api_key = api_key
-            self.tabs["generate"].api_client.provider = provider
+            self.tabs["generate"].api_client.provider = provider.lower()
             
             # Update the size dropdown in generate tab based on the new provider
             self.tabs["generate"].update_size_options(provider)
@@ -270,9 +271,4 @@ class MainWindow(ctk.CTk):
     
     def show_info(self, title, message):
         """Show info dialog."""
-        tk.messagebox.showinfo(title, message)
-    
-    def update_history(self):
-        """Refresh history tab."""
-        if self.current_tab == "history":
-            self.tabs["history"].refresh() 
\ No newline at end of file
+        tk.messagebox.showinfo(title, message) 
\ No newline at end of file
@@ -8,7 +8,7 @@ from PIL import Image, ImageTk
 
 import customtkinter as ctk
 
-from core.settings import API_PROVIDER, AI_API_KEY, DARK_MODE, APP_CONFIG, save_setting
+from core.settings import API_PROVIDER, AI_API_KEY, DARK_MODE, APP_CONFIG, save_setting, get_api_key, save_api_key
 
 logger = logging.getLogger(__name__)
 
@@ -225,7 +225,8 @@ class APISettingsDialog(ctk.CTkToplevel):
     def _on_provider_change(self, provider):
         """Handle provider change."""
         self._update_description()
-        self.key_var.set(AI_API_KEY or "")
+        # Each provider keeps its own key (fallback providers for routing use them too)
+        self.key_var.set(get_api_key(provider) or "")
     
     def _toggle_key_visibility(self):
         """Toggle the visibility of the API key."""
@@ -248,6 +249,7 @@ class APISettingsDialog(ctk.CTkToplevel):
             # Save API settings
             save_setting("API_KEY", api_key)
             save_setting("API_PROVIDER", provider)
+            save_api_key(provider, api_key)
             
             # Log the change
             logger.info(f"API settings saved: provider={provider}")
@@ -0,0 +1,118 @@
+import logging
+from datetime import date, timedelta
+
+import customtkinter as ctk
+
+from core.db import get_database
+
+logger = logging.getLogger(__name__)
+
+# Label -> days back from today (None for all time)
+STATS_RANGES = {
+    "Last 7 days": 7,
+    "Last 30 days": 30,
+    "Last 365 days": 365,
+    "All time": None,
+}
+
+# Label -> get_stats() grouping
+STATS_GROUPINGS = {
+    "Provider": ("provider",),
+    "Day": ("day",),
+    "Month": ("month",),
+    "Size": ("size",),
+    "Provider and size": ("provider", "size"),
+}
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+class StatsDialog(ctk.CTkToplevel):
+    """Usage statistics (images, disk use, latency) read from the database rollup."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.parent = parent
+        self.db = get_database()
+
+        # Window setup
+        self.title("Usage Statistics")
+        self.geometry("620x520")
+        self.minsize(500, 400)
+        self.transient(parent)
+
+        self._create_widgets()
+        self._refresh()
+
+    def _create_widgets(self):
+        """Create the UI elements."""
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        # Range and grouping
+        options_frame = ctk.CTkFrame(self)
+        options_frame.grid(row=0, column=0, padx=20, pady=(20, 5), sticky="ew")
+
+        ctk.CTkLabel(options_frame, text="Range:", font=ctk.CTkFont(size=14)).pack(side="left", padx=10, pady=10)
+        self.range_var = ctk.StringVar(value="Last 30 days")
+        ctk.CTkOptionMenu(
+            options_frame,
+            values=list(STATS_RANGES),
+            variable=self.range_var,
+            command=lambda _: self._refresh()
+        ).pack(side="left", padx=5, pady=10)
+
+        ctk.CTkLabel(options_frame, text="Group by:", font=ctk.CTkFont(size=14)).pack(side="left", padx=10, pady=10)
+        self.group_var = ctk.StringVar(value="Provider")
+        ctk.CTkOptionMenu(
+            options_frame,
+            values=list(STATS_GROUPINGS),
+            variable=self.group_var,
+            command=lambda _: self._refresh()
+        ).pack(side="left", padx=5, pady=10)
+
+        # Totals
+        self.totals_label = ctk.CTkLabel(self, text="", font=ctk.CTkFont(size=14, weight="bold"), anchor="w")
+        self.totals_label.grid(row=1, column=0, padx=20, pady=5, sticky="ew")
+
+        # Breakdown table
+        self.table_text = ctk.CTkTextbox(self, wrap="none", font=ctk.CTkFont(family="Courier", size=12))
+        self.table_text.grid(row=2, column=0, padx=20, pady=(5, 20), sticky="nsew")
+
+    def _date_range(self):
+        days = STATS_RANGES[self.range_var.get()]
+        if days is None:
+            return None
+        return ((date.today() - timedelta(days=days - 1)).isoformat(), None)
+
+    def _refresh(self):
+        """Reload the totals and the breakdown for the selected range and grouping."""
+        date_range = self._date_range()
+        group_by = STATS_GROUPINGS[self.group_var.get()]
+        try:
+            totals = self.db.get_stats(date_range, group_by=())
+            rows = self.db.get_stats(date_range, group_by=group_by)
+        except Exception as e:
+            logger.error(f"Error loading statistics: {e}")
+            self.totals_label.configure(text=f"Error loading statistics: {e}")
+            return
+
+        total = totals[0] if totals else {"image_count": 0, "total_bytes": 0, "avg_latency_ms": None}
+        latency = f"{total['avg_latency_ms'] / 1000:.1f} s" if total["avg_latency_ms"] is not None else "n/a"
+        self.totals_label.configure(
+            text=f"{total['image_count']} images | {_format_bytes(total['total_bytes'])} | avg. generation {latency}"
+        )
+
+        lines = [f"{' / '.join(name.title() for name in group_by):<32} {'Images':>8} {'Size':>10} {'Avg. time':>10}"]
+        for row in rows:
+            label = " / ".join(str(row[name]) or "unknown" for name in group_by)
+            latency = f"{row['avg_latency_ms'] / 1000:.1f} s" if row["avg_latency_ms"] is not None else "n/a"
+            lines.append(f"{label:<32} {row['image_count']:>8} {_format_bytes(row['total_bytes']):>10} {latency:>10}")
+
+        self.table_text.configure(state="normal")
+        self.table_text.delete("1.0", "end")
+        self.table_text.insert("1.0", "\n".join(lines))
+        self.table_text.configure(state="disabled")